@@ -1,87 +1,691 @@
 import subprocess
 import json
+import re
 import tempfile
 import os
+import hashlib
+import platform
+import shutil
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from importlib import metadata
+from typing import Dict, List, Any, Callable, Optional, Tuple
+from .engines import exceeded_limits, limit_process
+from .fast_analysis import check_source
+from .incremental import IncrementalPlan
+from . import project_configs
+
+# First module and line range in a pylint duplicate-code message
+DUPLICATE_CODE_LOCATION = re.compile(r"^==([\w.]+):\[(\d+):(\d+)\]", re.MULTILINE)
+
+# Prefix of every temporary file and directory created for an analysis
+TEMP_PREFIX = 'review_'
+
+def default_temp_dir() -> Optional[str]:
+    """Memory-backed directory for temporary sources, if the system has one"""
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK | os.X_OK):
+        return '/dev/shm'
+    return None
+
+def sweep_temp_files(temp_dir: str = None, max_age: int = 3600) -> int:
+    """Remove analysis temp files left behind by killed workers
+    
+    Only entries older than max_age seconds are removed, so analyses that
+    are still running are left alone. Returns the number of entries removed.
+    """
+    temp_dir = temp_dir or tempfile.gettempdir()
+    cutoff = time.time() - max_age
+    removed = 0
+    try:
+        entries = list(os.scandir(temp_dir))
+    except OSError:
+        return 0
+    
+    for entry in entries:
+        if not entry.name.startswith(TEMP_PREFIX):
+            continue
+        try:
+            if entry.stat(follow_symlinks=False).st_mtime > cutoff:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.unlink(entry.path)
+            removed += 1
+        except OSError:
+            pass
+    return removed
 
 class BaseAnalyzer(ABC):
     """Base class for code analyzers"""
     
+    # Bump when issue parsing changes so cached results are not reused
+    cache_version = 3
+    
+    # Tool name -> (python distribution, fallback version command)
+    tool_versions = {}
+    
+    # Config files the tools pick up from the working directory
+    config_files = []
+    
+    # Whether analyze_batch and analyze_project work, i.e. _batch_tool_runs
+    # is implemented
+    supports_batch = False
+    
+    # Resolved tool versions, shared by all instances in this process
+    _resolved_tool_versions = {}
+    
+    # Per-tool timeout caps in seconds, falling back to default_timeout
+    default_timeout = 300  # 5 minutes timeout
+    tool_timeouts = {}
+    
+    # Tool -> (base seconds, seconds per KB of analyzed source); the scaled
+    # timeout is kept between min_timeout and the tool's cap
+    timeout_profiles = {}
+    min_timeout = 10
+    
+    # Tool -> address space limit in MB for its child processes
+    memory_limits = {}
+    
+    # Span statuses of tools stopped by a timeout or a resource limit
+    STOPPED_STATUSES = ('timeout', 'killed')
+    
+    # How single sources reach the tools: 'stdin' pipes them, 'file' writes
+    # a temporary file (in temp_dir, e.g. a tmpfs, when given)
+    SOURCE_MODES = ('stdin', 'file')
+    
+    def __init__(self, concurrent: bool = False, tool_timeouts: Dict[str, int] = None, engine=None,
+                 source_mode: str = 'stdin', temp_dir: str = None,
+                 timeout_profiles: Dict[str, Tuple[float, float]] = None, memory_limits: Dict[str, int] = None,
+                 disabled_tools: List[str] = None):
+        if source_mode not in self.SOURCE_MODES:
+            raise ValueError(f"Unknown source mode: {source_mode}")
+        self.concurrent = concurrent
+        self.engine = engine
+        self.source_mode = source_mode
+        self.temp_dir = temp_dir
+        if tool_timeouts:
+            self.tool_timeouts = {**self.tool_timeouts, **tool_timeouts}
+        if timeout_profiles:
+            self.timeout_profiles = {**self.timeout_profiles, **timeout_profiles}
+        if memory_limits:
+            self.memory_limits = {**self.memory_limits, **memory_limits}
+        # Disabled tools are never run and are left out of the fingerprint
+        self.disabled_tools = set(disabled_tools or [])
+        if self.disabled_tools:
+            self.tool_versions = {
+                tool: spec for tool, spec in self.tool_versions.items() if tool not in self.disabled_tools
+            }
+        # Bytes of source the current analysis lints, for scaling timeouts
+        self.source_size = 0
+        self.tool_errors = []
+        # One span per tool command of the current analysis (see _run_command)
+        self.spans = []
+        # Durations of analyzer-side stages, e.g. writing temp sources
+        self.stage_timings = {}
+        # Optional callback(tool, issues) invoked as soon as each tool finishes
+        self.on_tool_complete = None
+        # Tool -> issues from an earlier attempt; analyze() uses them instead
+        # of running those tools again
+        self.checkpoints = {}
+        self._cancelled = threading.Event()
+        self._processes = set()
+        self._lock = threading.Lock()
+    
     @abstractmethod
     def analyze(self, code_content: str, filename: str) -> Dict[str, Any]:
         """Analyze code and return results"""
         pass
     
-    def _run_command(self, command: List[str], input_data: str = None) -> Dict[str, Any]:
-        """Run external command and return results"""
+    @classmethod
+    def sanitize_config(cls, path: str, content: str) -> Optional[str]:
+        """Safe content of one of config_files uploaded with a project, or None to ignore it
+        
+        The default accepts the declarative formats of project_configs.py.
+        Analyzers with other config formats override this; whatever it
+        returns is written into the lint tree.
+        """
+        return project_configs.sanitize_config(path, content)
+    
+    def cancel(self) -> None:
+        """Abandon the current analysis and kill any running tools"""
+        self._cancelled.set()
+        with self._lock:
+            processes = list(self._processes)
+        for process in processes:
+            process.kill()
+    
+    def release(self) -> None:
+        """Drop caller-set and per-analysis state so the instance can serve another task"""
+        self.on_tool_complete = None
+        self.checkpoints = {}
+        self._reset()
+    
+    def _reset(self, source_size: int = 0) -> None:
+        """Clear per-analysis state before a new analysis starts"""
+        self.source_size = source_size
+        self.tool_errors = []
+        self.spans = []
+        self.stage_timings = {}
+        self._cancelled.clear()
+    
+    def _run_tools(self, tool_runs: List[Tuple[Callable[..., List[Dict[str, Any]]], Any]]) -> List[Dict[str, Any]]:
+        """Run (tool function, *args) entries and merge their issues in order"""
+        tool_runs = [run for run in tool_runs if self._tool_name(run[0]) not in self.disabled_tools]
+        issues = []
+        if not self.concurrent or len(tool_runs) < 2:
+            for func, *args in tool_runs:
+                tool_issues, elapsed = self._call_tool(func, *args)
+                self._tool_completed(func, tool_issues, elapsed)
+                issues.extend(tool_issues)
+            return issues
+        
+        # Launch every tool at once; latency becomes that of the slowest tool
+        with ThreadPoolExecutor(max_workers=len(tool_runs)) as executor:
+            futures = {executor.submit(self._call_tool, func, *args): func for func, *args in tool_runs}
+            try:
+                for future in as_completed(futures):
+                    self._tool_completed(futures[future], *future.result())
+            except BaseException:
+                # Submission abandoned (e.g. soft time limit) or a tool crashed
+                self.cancel()
+                raise
+        
+        for future in futures:
+            issues.extend(future.result()[0])
+        return issues
+    
+    @property
+    def stopped_tools(self) -> List[str]:
+        """Tools of the current analysis stopped by a timeout or resource limit
+        
+        Their issues are missing from the results; the other tools' issues
+        are complete.
+        """
+        return sorted({span['tool'] for span in self.spans if span['status'] in self.STOPPED_STATUSES})
+    
+    @property
+    def completed_tools(self) -> List[str]:
+        """Tools whose issues are complete in the current analysis"""
+        incomplete = set(self.failed_tools) | set(self.stopped_tools)
+        return [tool for tool in self.tool_versions if tool not in incomplete]
+    
+    @property
+    def failed_tools(self) -> List[str]:
+        """Tools of the current analysis that failed for other reasons"""
+        return sorted({span['tool'] for span in self.spans if span['status'] in ('error', 'cancelled')})
+    
+    def tool_timeout(self, tool: str) -> float:
+        """Timeout for a tool run, scaled by the size of the analyzed source"""
+        cap = self.tool_timeouts.get(tool, self.default_timeout)
+        profile = self.timeout_profiles.get(tool)
+        if profile is None:
+            return cap
+        base, per_kb = profile
+        return min(cap, max(self.min_timeout, base + per_kb * self.source_size / 1024))
+    
+    def _call_tool(self, func: Callable, *args) -> Tuple[List[Any], float]:
+        """Run a tool function, returning its issues and the time it took"""
+        checkpoint = self.checkpoints.get(self._tool_name(func))
+        if checkpoint is not None:
+            return list(checkpoint), 0.0
+        start = time.perf_counter()
+        tool_issues = func(*args)
+        return tool_issues, time.perf_counter() - start
+    
+    def _tool_name(self, func: Callable) -> str:
+        tool = func.__name__[len('_run_'):]
+        if tool.endswith('_files'):
+            tool = tool[:-len('_files')]
+        return tool
+    
+    def _tool_completed(self, func: Callable, tool_issues: List[Any], elapsed: float) -> None:
+        tool = self._tool_name(func)
+        
+        # Complete the tool's span; the time beyond the command was parsing
+        with self._lock:
+            span = next((span for span in reversed(self.spans) if span['tool'] == tool and 'issues' not in span), None)
+            if span is not None:
+                span['issues'] = len(tool_issues)
+                span['parse_duration'] = round(max(0.0, elapsed - span['duration']), 4)
+        
+        if self.on_tool_complete is not None:
+            self.on_tool_complete(tool, tool_issues)
+    
+    def _run_command(self, command: List[str], input_data: str = None, timeout: int = None,
+                     cwd: str = None) -> Dict[str, Any]:
+        """Run external command and return results, recording a span for it
+        
+        A span holds the tool name, duration, exit code, outcome and output
+        size; the issue count and parse time are added once the tool's
+        output has been parsed.
+        """
+        tool = os.path.basename(command[0])
+        start = time.perf_counter()
+        result = self._execute_command(tool, command, input_data, timeout, cwd)
+        
+        if result['returncode'] != -1:
+            span_status = 'ok'
+        elif result['stderr'] == 'Analysis timeout':
+            span_status = 'timeout'
+        elif result['stderr'] == 'Analysis cancelled':
+            span_status = 'cancelled'
+        elif result['stderr'] == 'Resource limit exceeded':
+            span_status = 'killed'
+        else:
+            span_status = 'error'
+        with self._lock:
+            self.spans.append({
+                'tool': tool,
+                'duration': round(time.perf_counter() - start, 4),
+                'returncode': result['returncode'],
+                'status': span_status,
+                'output_size': len(result['stdout']),
+            })
+        return result
+    
+    def _execute_command(self, tool: str, command: List[str], input_data: str = None, timeout: int = None,
+                         cwd: str = None) -> Dict[str, Any]:
+        if timeout is None:
+            timeout = self.tool_timeout(tool)
+        
+        if self._cancelled.is_set():
+            return self._cancelled_result(tool)
+        
+        if self.engine is not None and self.engine.handles(command):
+            result = self._run_in_engine(tool, command, input_data, timeout, cwd)
+            if result is not None:
+                return result
+        
         try:
-            process = subprocess.run(
+            process = subprocess.Popen(
                 command,
-                input=input_data,
-                text=True,
-                capture_output=True,
-                timeout=300  # 5 minutes timeout
+                stdin=subprocess.PIPE if input_data is not None else subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                encoding='utf-8',
+                errors='replace',
+                cwd=cwd
             )
-            return {
-                'returncode': process.returncode,
-                'stdout': process.stdout,
-                'stderr': process.stderr
-            }
-        except subprocess.TimeoutExpired:
+        except Exception as e:
+            self.tool_errors.append(f"{tool}: {e}")
             return {
                 'returncode': -1,
                 'stdout': '',
-                'stderr': 'Analysis timeout'
+                'stderr': str(e)
             }
-        except Exception as e:
+        
+        # Past the timeout the process is killed anyway; the CPU limit stops
+        # it even if this worker dies first
+        limit_process(process.pid, memory_mb=self.memory_limits.get(tool), cpu_seconds=int(timeout) + 1)
+        
+        with self._lock:
+            self._processes.add(process)
+        try:
+            # cancel() may have run before the process was registered
+            if self._cancelled.is_set():
+                process.kill()
+            stdout, stderr = process.communicate(input_data, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            self.tool_errors.append(f"{tool}: Analysis timeout")
             return {
                 'returncode': -1,
                 'stdout': '',
-                'stderr': str(e)
+                'stderr': 'Analysis timeout'
             }
+        finally:
+            with self._lock:
+                self._processes.discard(process)
+        
+        if self._cancelled.is_set():
+            return self._cancelled_result(tool)
+        
+        # Killed by the CPU limit or out of address space
+        if exceeded_limits(process.returncode, stderr):
+            return self._limited_result(tool)
+        
+        return {
+            'returncode': process.returncode,
+            'stdout': stdout,
+            'stderr': stderr
+        }
+    
+    def _run_in_engine(self, tool: str, command: List[str], input_data: str, timeout: int,
+                       cwd: str = None) -> Dict[str, Any]:
+        """Run command on a warm engine worker instead of a new subprocess
 
-class PythonAnalyzer(BaseAnalyzer):
-    """Python code analyzer using pylint and flake8"""
+        Returns None when the engine is unavailable and the command should
+        be run as a subprocess instead.
+        """
+        with self.engine.worker() as worker:
+            with self._lock:
+                self._processes.add(worker)
+            try:
+                if self._cancelled.is_set():
+                    worker.kill()
+                result = worker.execute(command, input_data, timeout, cwd)
+            finally:
+                with self._lock:
+                    self._processes.discard(worker)
+        
+        if self._cancelled.is_set():
+            return self._cancelled_result(tool)
+        if result is None:
+            return None
+        if result['stderr'] == 'Resource limit exceeded':
+            return self._limited_result(tool)
+        if result['returncode'] == -1:
+            error = result['stderr'].strip().splitlines() or ['Engine error']
+            self.tool_errors.append(f"{tool}: {error[-1]}")
+        return result
     
-    def analyze(self, code_content: str, filename: str) -> Dict[str, Any]:
-        issues = []
+    def _limited_result(self, tool: str) -> Dict[str, Any]:
+        self.tool_errors.append(f"{tool}: Resource limit exceeded")
+        return {
+            'returncode': -1,
+            'stdout': '',
+            'stderr': 'Resource limit exceeded'
+        }
+    
+    def _cancelled_result(self, tool: str) -> Dict[str, Any]:
+        self.tool_errors.append(f"{tool}: Analysis cancelled")
+        return {
+            'returncode': -1,
+            'stdout': '',
+            'stderr': 'Analysis cancelled'
+        }
+    
+    def analyze_batch(self, files: Dict[str, Tuple[str, str]]) -> Dict[str, Dict[str, Any]]:
+        """Analyze many sources with a single run of each tool
+        
+        files maps a caller-chosen key to (code_content, filename). Every
+        source is written under one temporary directory and the tool output
+        is split back per key by file path. Results have the same shape as
+        analyze() results.
+        """
+        sources = {
+            os.path.join(str(index), self._source_name(filename)): (key, code_content)
+            for index, (key, (code_content, filename)) in enumerate(files.items())
+        }
+        return self._analyze_tree(sources, {}, set(files), cross_file=False)
+    
+    def analyze_project(self, files: Dict[str, Tuple[str, str]], config_files: Dict[str, str] = None,
+                        lint_keys: List[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Analyze the sources of one project in their directory layout
+        
+        Like analyze_batch, but files keep their relative paths and the
+        project's config files are written into the tree, so imports resolve
+        across files, tool configs apply as in the repository and cross-file
+        checks such as duplicate code detection run. Configs are sanitized
+        first, see sanitize_config(). When lint_keys is given only those
+        files are linted; the others are there for context.
+        """
+        sources = {}
+        for key, (code_content, filename) in files.items():
+            path = self._project_path(filename)
+            if path in sources:
+                raise ValueError(f"Duplicate file path in project: {path}")
+            sources[path] = (key, code_content)
         
-        # Create temporary file
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as temp_file:
-            temp_file.write(code_content)
-            temp_file_path = temp_file.name
+        lint_keys = set(files) if lint_keys is None else set(lint_keys)
+        return self._analyze_tree(sources, config_files or {}, lint_keys, cross_file=True)
+    
+    def _analyze_tree(self, sources: Dict[str, Tuple[str, str]], config_files: Dict[str, str],
+                      lint_keys: set, cross_file: bool) -> Dict[str, Dict[str, Any]]:
+        """Write sources (relative path -> (key, code)) to a temp tree and lint them"""
+        self._reset()
+        if not lint_keys:
+            return {}
+        temp_dir = os.path.realpath(tempfile.mkdtemp(prefix=f"{TEMP_PREFIX}batch_", dir=self.temp_dir))
+        keys_by_path = {}
         
         try:
-            # Run pylint
-            pylint_issues = self._run_pylint(temp_file_path)
-            issues.extend(pylint_issues)
-            
-            # Run flake8
-            flake8_issues = self._run_flake8(temp_file_path)
-            issues.extend(flake8_issues)
-            
-            # Run bandit for security issues
-            bandit_issues = self._run_bandit(temp_file_path)
-            issues.extend(bandit_issues)
+            with self._stage('write_source'):
+                for relative_path, (key, code_content) in sources.items():
+                    self._write_file(temp_dir, relative_path, code_content)
+                    if key in lint_keys:
+                        keys_by_path[relative_path] = key
+                        self.source_size += len(code_content.encode('utf-8'))
+                for relative_path, content in config_files.items():
+                    # Also covers projects stored before uploads were sanitized
+                    content = self.sanitize_config(relative_path, content)
+                    if content is not None:
+                        self._write_file(temp_dir, self._project_path(relative_path, keep_suffix=True), content)
             
+            pairs = self._run_tools(self._batch_tool_runs(sorted(keys_by_path), temp_dir, cross_file))
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        
+        issues_by_key = {key: [] for key in keys_by_path.values()}
+        for path, issue in pairs:
+            relative_path = os.path.relpath(os.path.join(temp_dir, path), temp_dir)
+            key = keys_by_path.get(os.path.normpath(relative_path))
+            if key is not None:
+                issues_by_key[key].append(issue)
+        
+        return {key: self._calculate_results(issues) for key, issues in issues_by_key.items()}
+    
+    def _stdin_path(self, filename: str) -> str:
+        """Path the tools report for a piped source
+        
+        It names a file in the temp directory, as in file mode, so imports
+        and configs resolve the same way and never against the worker's own
+        working directory. The file itself is never created.
+        """
+        temp_dir = os.path.realpath(self.temp_dir or tempfile.gettempdir())
+        return os.path.join(temp_dir, self._source_name(filename))
+    
+    @contextmanager
+    def _stage(self, name: str):
+        """Add the time spent in the block to stage_timings[name]"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_timings[name] = self.stage_timings.get(name, 0.0) + time.perf_counter() - start
+    
+    @contextmanager
+    def _temp_source(self, code_content: str, filename: str):
+        """Write a source to a temporary file for tools that need a path"""
+        with self._stage('write_source'):
+            with tempfile.NamedTemporaryFile(mode='w', suffix=self._source_suffix(filename), prefix=TEMP_PREFIX,
+                                             dir=self.temp_dir, delete=False) as temp_file:
+                temp_file.write(code_content)
+                temp_file_path = temp_file.name
+        try:
+            yield temp_file_path
         finally:
-            # Clean up temporary file
             os.unlink(temp_file_path)
+    
+    def _write_file(self, root: str, relative_path: str, content: str) -> None:
+        full_path = os.path.join(root, relative_path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'w') as f:
+            f.write(content)
+    
+    def analyze_incremental(self, code_content: str, filename: str, previous_content: str,
+                            previous_issues: List[Dict[str, Any]],
+                            max_changed_ratio: float = 0.5) -> Optional[Dict[str, Any]]:
+        """Analyze only what changed since a previous version of the file
+        
+        Returns None when an incremental analysis isn't possible or worth it
+        and the caller should run a full analysis instead.
+        """
+        return None
+    
+    def _batch_tool_runs(self, file_paths: List[str], cwd: str, cross_file: bool = False) -> List[Tuple[Any, ...]]:
+        """Tool runs for analyze_batch, each returning (path, issue) pairs
+        
+        cross_file is set when the files belong to one project, enabling
+        checks that compare files with each other. Analyzers that implement
+        it set supports_batch.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support batch analysis")
+    
+    def _source_suffix(self, filename: str) -> str:
+        """File extension the tools expect for this source"""
+        return os.path.splitext(filename)[1]
+    
+    def _source_name(self, filename: str) -> str:
+        """Safe file name for a submitted source inside a temp directory"""
+        name = os.path.basename(filename) or 'source'
+        suffix = self._source_suffix(filename)
+        if not name.endswith(suffix):
+            name += suffix
+        return name
+    
+    def _project_path(self, filename: str, keep_suffix: bool = False) -> str:
+        """Relative path of a project file inside a temp directory"""
+        path = os.path.normpath(filename.replace('\\', '/')).lstrip('/')
+        if path in ('', '.') or path.split('/')[0] == '..':
+            raise ValueError(f"Unsafe file path in project: {filename}")
+        if keep_suffix:
+            return path
+        return os.path.join(os.path.dirname(path), self._source_name(path))
+    
+    def get_tool_versions(self) -> Dict[str, str]:
+        """Return installed tool versions, resolved once per process"""
+        versions = {}
+        for tool, (distribution, version_command) in self.tool_versions.items():
+            if tool not in BaseAnalyzer._resolved_tool_versions:
+                BaseAnalyzer._resolved_tool_versions[tool] = self._resolve_tool_version(
+                    distribution, version_command
+                )
+            versions[tool] = BaseAnalyzer._resolved_tool_versions[tool]
+        return versions
+    
+    def _resolve_tool_version(self, distribution: str, version_command: List[str]) -> str:
+        """Look up a tool version from package metadata or its CLI"""
+        if distribution:
+            try:
+                return metadata.version(distribution)
+            except metadata.PackageNotFoundError:
+                pass
+        # Not part of any analysis, so no span is recorded
+        result = self._execute_command(os.path.basename(version_command[0]), version_command)
+        return (result['stdout'] or result['stderr']).strip()
+    
+    def get_fingerprint(self) -> Dict[str, Any]:
+        """Describe everything besides the source that affects the results"""
+        config = {}
+        for config_file in self.config_files:
+            if os.path.isfile(config_file):
+                with open(config_file, 'rb') as f:
+                    config[config_file] = hashlib.sha256(f.read()).hexdigest()
+        
+        return {
+            'analyzer': type(self).__name__,
+            'cache_version': self.cache_version,
+            'tools': self.get_tool_versions(),
+            'config': config
+        }
+
+class PythonAnalyzer(BaseAnalyzer):
+    """Python code analyzer using pylint and flake8"""
+    
+    tool_versions = {
+        'pylint': ('pylint', ['pylint', '--version']),
+        'flake8': ('flake8', ['flake8', '--version']),
+        'bandit': ('bandit', ['bandit', '--version']),
+    }
+    
+    config_files = ['.pylintrc', 'pylintrc', 'setup.cfg', 'tox.ini', '.flake8', 'pyproject.toml', '.bandit']
+    
+    supports_batch = True
+    
+    # pylint's inference is by far the slowest and most memory hungry
+    timeout_profiles = {
+        'pylint': (30, 0.5),
+        'flake8': (10, 0.05),
+        'bandit': (10, 0.05),
+    }
+    memory_limits = {
+        'pylint': 2048,
+        'flake8': 1024,
+        'bandit': 1024,
+    }
+    
+    def analyze(self, code_content: str, filename: str) -> Dict[str, Any]:
+        self._reset(len(code_content.encode('utf-8')))
+        
+        if self.source_mode == 'stdin':
+            # Pipe the source to every tool; nothing is written to disk
+            source_path = self._stdin_path(filename)
+            issues = self._run_tools([
+                (self._run_pylint, source_path, code_content),
+                (self._run_flake8, source_path, code_content),
+                (self._run_bandit, source_path, code_content),
+            ])
+            return self._calculate_results(issues)
+        
+        with self._temp_source(code_content, filename) as temp_file_path:
+            # Run pylint, flake8 and bandit (for security issues)
+            issues = self._run_tools([
+                (self._run_pylint, temp_file_path),
+                (self._run_flake8, temp_file_path),
+                (self._run_bandit, temp_file_path),
+            ])
         
         return self._calculate_results(issues)
     
-    def _run_pylint(self, file_path: str) -> List[Dict[str, Any]]:
-        """Run pylint analysis"""
-        command = ['pylint', '--output-format=json', '--reports=no', file_path]
-        result = self._run_command(command)
+    def analyze_incremental(self, code_content: str, filename: str, previous_content: str,
+                            previous_issues: List[Dict[str, Any]],
+                            max_changed_ratio: float = 0.5) -> Optional[Dict[str, Any]]:
+        plan = IncrementalPlan.build(previous_content, code_content)
+        if plan is None or plan.changed_ratio > max_changed_ratio:
+            return None
+        
+        if not plan.relint_lines:
+            self._reset()
+            return self._calculate_results(plan.merge(previous_issues, None))
         
+        # Lint the changed top-level statements in place, everything else stubbed out
+        relinted = self.analyze(plan.reduced_source(), filename)
+        if self.tool_errors:
+            return None
+        return self._calculate_results(plan.merge(previous_issues, relinted['issues']))
+    
+    def _source_suffix(self, filename: str) -> str:
+        return '.py'
+    
+    def _batch_tool_runs(self, file_paths: List[str], cwd: str, cross_file: bool = False) -> List[Tuple[Any, ...]]:
+        # Sources in a batch are unrelated, so don't compare them with each other
+        pylint_args = [] if cross_file else ['--disable=duplicate-code']
+        return [
+            (self._run_pylint_files, file_paths, cwd, pylint_args),
+            (self._run_flake8_files, file_paths, cwd),
+            (self._run_bandit_files, file_paths, cwd),
+        ]
+    
+    def _run_pylint(self, file_path: str, code_content: str = None) -> List[Dict[str, Any]]:
+        """Run pylint analysis, on code_content from stdin when given"""
+        if code_content is not None:
+            command = ['pylint', '--output-format=json', '--reports=no', '--from-stdin', file_path]
+            return [issue for _, issue in self._parse_pylint(self._run_command(command, input_data=code_content))]
+        return [issue for _, issue in self._run_pylint_files([file_path])]
+    
+    def _run_pylint_files(self, file_paths: List[str], cwd: str = None,
+                          extra_args: List[str] = ()) -> List[Tuple[str, Dict[str, Any]]]:
+        """Run pylint over several files, returning (path, issue) pairs"""
+        command = ['pylint', '--output-format=json', '--reports=no', *extra_args, *file_paths]
+        return self._parse_pylint(self._run_command(command, cwd=cwd), cwd)
+    
+    def _parse_pylint(self, result: Dict[str, Any], cwd: str = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """Parse pylint JSON output into (path, issue) pairs"""
         issues = []
         if result['returncode'] != 0 and result['stdout']:
             try:
                 pylint_output = json.loads(result['stdout'])
                 for issue in pylint_output:
-                    issues.append({
+                    if issue.get('symbol') == 'duplicate-code':
+                        self._locate_duplicate(issue, cwd)
+                    issues.append((issue.get('path', ''), {
+                        'tool': 'pylint',
                         'rule_id': issue.get('message-id', 'unknown'),
                         'rule_name': issue.get('symbol', 'Unknown'),
                         'severity': self._map_pylint_severity(issue.get('type', 'info')),
@@ -89,24 +693,34 @@ class PythonAnalyzer(BaseAnalyzer):
                         'line_number': issue.get('line', 0),
                         'column_number': issue.get('column', 0),
                         'suggestion': ''
-                    })
+                    }))
             except json.JSONDecodeError:
                 pass
         
         return issues
     
-    def _run_flake8(self, file_path: str) -> List[Dict[str, Any]]:
-        """Run flake8 analysis"""
-        command = ['flake8', '--format=json', file_path]
-        result = self._run_command(command)
-        
+    def _run_flake8(self, file_path: str, code_content: str = None) -> List[Dict[str, Any]]:
+        """Run flake8 analysis, on code_content from stdin when given"""
+        if code_content is not None:
+            command = ['flake8', '--format=json', f"--stdin-display-name={file_path}", '-']
+            return [issue for _, issue in self._parse_flake8(self._run_command(command, input_data=code_content))]
+        return [issue for _, issue in self._run_flake8_files([file_path])]
+    
+    def _run_flake8_files(self, file_paths: List[str], cwd: str = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """Run flake8 over several files, returning (path, issue) pairs"""
+        command = ['flake8', '--format=json', *file_paths]
+        return self._parse_flake8(self._run_command(command, cwd=cwd))
+    
+    def _parse_flake8(self, result: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+        """Parse flake8 JSON output into (path, issue) pairs"""
         issues = []
         if result['stdout']:
             try:
                 flake8_output = json.loads(result['stdout'])
                 for filename, file_issues in flake8_output.items():
                     for issue in file_issues:
-                        issues.append({
+                        issues.append((filename, {
+                            'tool': 'flake8',
                             'rule_id': issue.get('code', 'unknown'),
                             'rule_name': issue.get('code', 'Unknown'),
                             'severity': 'warning',
@@ -114,23 +728,33 @@ class PythonAnalyzer(BaseAnalyzer):
                             'line_number': issue.get('line_number', 0),
                             'column_number': issue.get('column_number', 0),
                             'suggestion': ''
-                        })
+                        }))
             except json.JSONDecodeError:
                 pass
         
         return issues
     
-    def _run_bandit(self, file_path: str) -> List[Dict[str, Any]]:
-        """Run bandit security analysis"""
-        command = ['bandit', '-f', 'json', file_path]
-        result = self._run_command(command)
-        
+    def _run_bandit(self, file_path: str, code_content: str = None) -> List[Dict[str, Any]]:
+        """Run bandit security analysis, on code_content from stdin when given"""
+        if code_content is not None:
+            command = ['bandit', '-f', 'json', '-']
+            return [issue for _, issue in self._parse_bandit(self._run_command(command, input_data=code_content))]
+        return [issue for _, issue in self._run_bandit_files([file_path])]
+    
+    def _run_bandit_files(self, file_paths: List[str], cwd: str = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """Run bandit over several files, returning (path, issue) pairs"""
+        command = ['bandit', '-f', 'json', *file_paths]
+        return self._parse_bandit(self._run_command(command, cwd=cwd))
+    
+    def _parse_bandit(self, result: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+        """Parse bandit JSON output into (path, issue) pairs"""
         issues = []
         if result['stdout']:
             try:
                 bandit_output = json.loads(result['stdout'])
                 for issue in bandit_output.get('results', []):
-                    issues.append({
+                    issues.append((issue.get('filename', ''), {
+                        'tool': 'bandit',
                         'rule_id': issue.get('test_id', 'unknown'),
                         'rule_name': issue.get('test_name', 'Security Issue'),
                         'severity': self._map_bandit_severity(issue.get('issue_severity', 'LOW')),
@@ -138,12 +762,29 @@ class PythonAnalyzer(BaseAnalyzer):
                         'line_number': issue.get('line_number', 0),
                         'column_number': 0,
                         'suggestion': issue.get('issue_confidence', '')
-                    })
+                    }))
             except json.JSONDecodeError:
                 pass
         
         return issues
     
+    def _locate_duplicate(self, issue: Dict[str, Any], cwd: str = None) -> None:
+        """Attribute a duplicate-code report to the first duplicated file
+        
+        pylint reports similarities against whichever module it checked
+        last; the message names the actual modules and line ranges.
+        """
+        match = DUPLICATE_CODE_LOCATION.search(issue.get('message', ''))
+        if not match:
+            return
+        module_path = match.group(1).replace('.', os.sep)
+        for path in (module_path + '.py', os.path.join(module_path, '__init__.py')):
+            if os.path.isfile(os.path.join(cwd or os.getcwd(), path)):
+                issue['path'] = path
+                issue['line'] = int(match.group(2)) + 1
+                issue['column'] = 0
+                return
+    
     def _map_pylint_severity(self, pylint_type: str) -> str:
         """Map pylint severity to our severity levels"""
         mapping = {
@@ -204,42 +845,74 @@ class PythonAnalyzer(BaseAnalyzer):
 class JavaScriptAnalyzer(BaseAnalyzer):
     """JavaScript/TypeScript analyzer using ESLint"""
     
+    tool_versions = {
+        'eslint': (None, ['eslint', '--version']),
+    }
+    
+    config_files = [
+        '.eslintrc', '.eslintrc.js', '.eslintrc.cjs', '.eslintrc.json',
+        '.eslintrc.yml', '.eslintrc.yaml', 'eslint.config.js', 'package.json'
+    ]
+    
+    supports_batch = True
+    
+    # No memory limit: V8 reserves far more address space than it uses
+    timeout_profiles = {
+        'eslint': (20, 0.1),
+    }
+    
     def analyze(self, code_content: str, filename: str) -> Dict[str, Any]:
-        issues = []
-        
-        # Determine file extension
-        extension = '.js'
-        if filename.endswith('.ts'):
-            extension = '.ts'
+        self._reset(len(code_content.encode('utf-8')))
         
-        # Create temporary file
-        with tempfile.NamedTemporaryFile(mode='w', suffix=extension, delete=False) as temp_file:
-            temp_file.write(code_content)
-            temp_file_path = temp_file.name
+        if self.source_mode == 'stdin':
+            # Pipe the source to ESLint; nothing is written to disk
+            issues = self._run_tools([
+                (self._run_eslint, self._stdin_path(filename), code_content),
+            ])
+            return self._calculate_results(issues)
         
-        try:
+        with self._temp_source(code_content, filename) as temp_file_path:
             # Run ESLint
-            eslint_issues = self._run_eslint(temp_file_path)
-            issues.extend(eslint_issues)
-            
-        finally:
-            # Clean up temporary file
-            os.unlink(temp_file_path)
+            issues = self._run_tools([
+                (self._run_eslint, temp_file_path),
+            ])
         
         return self._calculate_results(issues)
     
-    def _run_eslint(self, file_path: str) -> List[Dict[str, Any]]:
-        """Run ESLint analysis"""
-        command = ['eslint', '--format=json', file_path]
-        result = self._run_command(command)
-        
+    def _source_suffix(self, filename: str) -> str:
+        # Determine file extension
+        extension = '.js'
+        if filename.endswith('.ts'):
+            extension = '.ts'
+        return extension
+    
+    def _batch_tool_runs(self, file_paths: List[str], cwd: str, cross_file: bool = False) -> List[Tuple[Any, ...]]:
+        return [
+            (self._run_eslint_files, file_paths, cwd),
+        ]
+    
+    def _run_eslint(self, file_path: str, code_content: str = None) -> List[Dict[str, Any]]:
+        """Run ESLint analysis, on code_content from stdin when given"""
+        if code_content is not None:
+            command = ['eslint', '--format=json', '--stdin', '--stdin-filename', file_path]
+            return [issue for _, issue in self._parse_eslint(self._run_command(command, input_data=code_content))]
+        return [issue for _, issue in self._run_eslint_files([file_path])]
+    
+    def _run_eslint_files(self, file_paths: List[str], cwd: str = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """Run ESLint over several files, returning (path, issue) pairs"""
+        command = ['eslint', '--format=json', *file_paths]
+        return self._parse_eslint(self._run_command(command, cwd=cwd))
+    
+    def _parse_eslint(self, result: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+        """Parse ESLint JSON output into (path, issue) pairs"""
         issues = []
         if result['stdout']:
             try:
                 eslint_output = json.loads(result['stdout'])
                 for file_result in eslint_output:
                     for message in file_result.get('messages', []):
-                        issues.append({
+                        issues.append((file_result.get('filePath', ''), {
+                            'tool': 'eslint',
                             'rule_id': message.get('ruleId', 'unknown'),
                             'rule_name': message.get('ruleId', 'Unknown'),
                             'severity': self._map_eslint_severity(message.get('severity', 1)),
@@ -247,7 +920,7 @@ class JavaScriptAnalyzer(BaseAnalyzer):
                             'line_number': message.get('line', 0),
                             'column_number': message.get('column', 0),
                             'suggestion': message.get('fix', {}).get('text', '')
-                        })
+                        }))
             except json.JSONDecodeError:
                 pass
         
@@ -299,16 +972,197 @@ class JavaScriptAnalyzer(BaseAnalyzer):
             'info_issues': severity_counts['info']
         }
 
-# Analyzer registry
+class FastPythonAnalyzer(PythonAnalyzer):
+    """In-process Python analyzer using the ast rules of fast_analysis
+    
+    No tool process is started, so an analysis takes milliseconds. It finds
+    a subset of what PythonAnalyzer reports, under the same rule ids, and
+    is used for provisional results and for the fast mode of bulk uploads.
+    """
+    
+    tool_versions = {
+        'ast': (None, []),
+    }
+    
+    # The rules take no configuration from the analyzed project
+    config_files = []
+    
+    # Bump when the rules of fast_analysis change; their version is Python's
+    cache_version = 4
+    
+    max_line_length = 100
+    max_complexity = 10
+    
+    def analyze(self, code_content: str, filename: str) -> Dict[str, Any]:
+        self._reset(len(code_content.encode('utf-8')))
+        issues = self._run_tools([(self._run_ast, code_content)])
+        return self._calculate_results(issues)
+    
+    def analyze_incremental(self, code_content: str, filename: str, previous_content: str,
+                            previous_issues: List[Dict[str, Any]],
+                            max_changed_ratio: float = 0.5) -> Optional[Dict[str, Any]]:
+        # Module-wide rules such as unused imports need the whole source
+        return None
+    
+    def _analyze_tree(self, sources: Dict[str, Tuple[str, str]], config_files: Dict[str, str],
+                      lint_keys: set, cross_file: bool) -> Dict[str, Dict[str, Any]]:
+        """Check each linted source on its own; nothing is written to disk"""
+        self._reset()
+        results = {}
+        for key, code_content in sources.values():
+            if key in lint_keys:
+                self.source_size += len(code_content.encode('utf-8'))
+                results[key] = self._calculate_results(self._run_tools([(self._run_ast, code_content)]))
+        return results
+    
+    def _run_ast(self, code_content: str) -> List[Dict[str, Any]]:
+        """Run the fast rules, recording a span like a tool command"""
+        start = time.perf_counter()
+        issues = check_source(code_content, self.max_line_length, self.max_complexity)
+        for issue in issues:
+            issue['tool'] = 'ast'
+        with self._lock:
+            self.spans.append({
+                'tool': 'ast',
+                'duration': round(time.perf_counter() - start, 4),
+                'returncode': 0,
+                'status': 'ok',
+                'output_size': 0,
+            })
+        return issues
+    
+    def get_tool_versions(self) -> Dict[str, str]:
+        # The rules change with the ast module, i.e. the Python version
+        return {tool: platform.python_version() for tool in self.tool_versions}
+
+class CompositeAnalyzer(BaseAnalyzer):
+    """Several analyzers of one language run as a single analyzer
+    
+    The parts run one after the other, each with its own tools; their
+    issues are merged per source and scored as the first part scores them.
+    Spans, tool errors and stage timings are mirrored from the parts, also
+    while they run, so callbacks see the state of the whole analysis.
+    """
+    
+    def __init__(self, analyzer_classes: List[type], **options):
+        if not analyzer_classes:
+            raise ValueError("A composite analyzer needs at least one analyzer class")
+        self.parts = [analyzer_class(**options) for analyzer_class in analyzer_classes]
+        super().__init__(**options)
+        self.tool_versions = {tool: spec for part in self.parts for tool, spec in part.tool_versions.items()}
+        self.config_files = list(dict.fromkeys(name for part in self.parts for name in part.config_files))
+        self.supports_batch = all(part.supports_batch for part in self.parts)
+    
+    def sanitize_config(self, path: str, content: str) -> Optional[str]:
+        # The first part that reads the config decides
+        name = os.path.basename(path)
+        for part in self.parts:
+            if name in part.config_files:
+                return part.sanitize_config(path, content)
+        return None
+    
+    def analyze(self, code_content: str, filename: str) -> Dict[str, Any]:
+        return self._run_parts(lambda part: {None: part.analyze(code_content, filename)})[None]
+    
+    def analyze_batch(self, files: Dict[str, Tuple[str, str]]) -> Dict[str, Dict[str, Any]]:
+        return self._run_parts(lambda part: part.analyze_batch(files))
+    
+    def analyze_project(self, files: Dict[str, Tuple[str, str]], config_files: Dict[str, str] = None,
+                        lint_keys: List[str] = None) -> Dict[str, Dict[str, Any]]:
+        return self._run_parts(lambda part: part.analyze_project(files, config_files, lint_keys))
+    
+    def analyze_incremental(self, code_content: str, filename: str, previous_content: str,
+                            previous_issues: List[Dict[str, Any]],
+                            max_changed_ratio: float = 0.5) -> Optional[Dict[str, Any]]:
+        # Previous issues can't be told apart by part, so always run in full
+        return None
+    
+    def cancel(self) -> None:
+        super().cancel()
+        for part in self.parts:
+            part.cancel()
+    
+    def release(self) -> None:
+        super().release()
+        for part in self.parts:
+            part.release()
+    
+    def _run_parts(self, run: Callable[[BaseAnalyzer], Dict[Any, Dict[str, Any]]]) -> Dict[Any, Dict[str, Any]]:
+        """Run every part and merge the issues of their keyed results"""
+        self._reset()
+        for part in self.parts:
+            part._reset()
+        
+        issues_by_key = {}
+        for part in self.parts:
+            if self._cancelled.is_set():
+                break
+            part.checkpoints = self.checkpoints
+            part.on_tool_complete = self._part_tool_complete
+            results = run(part)
+            self._collect()
+            for key, result in results.items():
+                issues_by_key.setdefault(key, []).extend(result['issues'])
+        
+        return {key: self._calculate_results(issues) for key, issues in issues_by_key.items()}
+    
+    def _part_tool_complete(self, tool: str, tool_issues: List[Dict[str, Any]]) -> None:
+        self._collect()
+        if self.on_tool_complete is not None:
+            self.on_tool_complete(tool, tool_issues)
+    
+    def _collect(self) -> None:
+        """Mirror the per-analysis state of the parts"""
+        stage_timings = {}
+        for part in self.parts:
+            for stage, duration in part.stage_timings.items():
+                stage_timings[stage] = stage_timings.get(stage, 0.0) + duration
+        with self._lock:
+            self.spans = [span for part in self.parts for span in part.spans]
+            self.tool_errors = [error for part in self.parts for error in part.tool_errors]
+            self.stage_timings = stage_timings
+            self.source_size = max(part.source_size for part in self.parts)
+    
+    def _calculate_results(self, issues: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return self.parts[0]._calculate_results(issues)
+    
+    def get_tool_versions(self) -> Dict[str, str]:
+        versions = {}
+        for part in self.parts:
+            versions.update(part.get_tool_versions())
+        return versions
+    
+    def get_fingerprint(self) -> Dict[str, Any]:
+        fingerprint = super().get_fingerprint()
+        fingerprint['analyzer'] = '+'.join(type(part).__name__ for part in self.parts)
+        fingerprint['cache_version'] = [part.cache_version for part in self.parts]
+        return fingerprint
+
+# Built-in analyzers; see registry.py for how a language's analyzer is resolved
 ANALYZERS = {
     'python': PythonAnalyzer,
+    'python-fast': FastPythonAnalyzer,
     'javascript': JavaScriptAnalyzer,
     'typescript': JavaScriptAnalyzer,
 }
 
-def get_analyzer(language: str) -> BaseAnalyzer:
-    """Get analyzer instance for given language"""
-    analyzer_class = ANALYZERS.get(language.lower())
+# Language -> registry entry of its in-process analyzer, for provisional
+# results and fast mode
+FAST_ANALYZERS = {
+    'python': 'python-fast',
+}
+
+def get_analyzer(language: str, fast: bool = False, **options) -> BaseAnalyzer:
+    """Get a new built-in analyzer instance for given language
+    
+    With fast, the language's in-process analyzer is used if it has one.
+    Tasks use registry.get_analyzer instead, which also resolves configured
+    analyzers and reuses instances.
+    """
+    language = language.lower()
+    if fast:
+        language = FAST_ANALYZERS.get(language, language)
+    analyzer_class = ANALYZERS.get(language)
     if not analyzer_class:
         raise ValueError(f"No analyzer available for language: {language}")
-    return analyzer_class()
+    return analyzer_class(**options)
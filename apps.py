@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+class ReviewsConfig(AppConfig):
+    name = 'reviews'
+    verbose_name = 'Code Reviews'
+    
+    def ready(self):
+        # Register signal handlers
+        from . import signals  # noqa: F401
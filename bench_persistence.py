@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+"""
+Benchmark for writing analysis results to the database.
+
+Compares the old one-INSERT-per-issue write path with save_analysis_result
+(single transaction, bulk_create) for results of 10, 1k and 10k issues.
+Runs against a throwaway test database.
+
+Usage: python bench_persistence.py [--sizes 10 1000 10000] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+import django
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Setup Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'code_review_system.settings')
+django.setup()
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from reviews.models import SupportedLanguage, CodeSubmission, ReviewResult, Issue
+from reviews.rules import get_rule_catalog
+from reviews.tasks import save_analysis_result
+
+User = get_user_model()
+
+SEVERITIES = ['info', 'warning', 'error', 'critical']
+
+
+def make_analysis_result(issue_count):
+    """Build a synthetic analyzer result with issue_count issues"""
+    issues = [
+        {
+            'tool': 'pylint',
+            'rule_id': f"W{i % 50:04d}",
+            'rule_name': f"synthetic-rule-{i % 50}",
+            'severity': SEVERITIES[i % len(SEVERITIES)],
+            'message': f"Synthetic issue number {i}",
+            'line_number': i + 1,
+            'column_number': i % 80,
+            'suggestion': ''
+        }
+        for i in range(issue_count)
+    ]
+    return {
+        'issues': issues,
+        'overall_score': 0.0,
+        'total_issues': issue_count,
+        'critical_issues': issue_count // 4,
+        'error_issues': issue_count // 4,
+        'warning_issues': issue_count // 4,
+        'info_issues': issue_count - 3 * (issue_count // 4)
+    }
+
+
+def save_row_by_row(submission, analysis_result, analysis_duration):
+    """The write path before bulk inserts: one INSERT per issue, autocommit"""
+    review_result = ReviewResult.objects.create(
+        submission=submission,
+        overall_score=analysis_result['overall_score'],
+        total_issues=analysis_result['total_issues'],
+        critical_issues=analysis_result['critical_issues'],
+        error_issues=analysis_result['error_issues'],
+        warning_issues=analysis_result['warning_issues'],
+        info_issues=analysis_result['info_issues'],
+        analysis_duration=analysis_duration
+    )
+    rules = get_rule_catalog().resolve(analysis_result['issues'])
+    for issue_data, rule in zip(analysis_result['issues'], rules):
+        Issue.from_dict(review_result, issue_data, rule).save()
+    submission.status = 'completed'
+    submission.save()
+    return review_result
+
+
+def time_write(write, user, language, analysis_result):
+    submission = CodeSubmission.objects.create(
+        user=user,
+        filename='bench.py',
+        language=language,
+        code_content='',
+        file_size=0
+    )
+    start = time.perf_counter()
+    write(submission, analysis_result, 0.0)
+    elapsed = time.perf_counter() - start
+    submission.delete()
+    return elapsed
+
+
+def run_benchmark(sizes, repeat):
+    user = User.objects.create_user(email='bench@example.com', password='bench')
+    language, _ = SupportedLanguage.objects.get_or_create(
+        name='Python',
+        defaults={'extension': 'py', 'analyzer_class': 'reviews.analyzers.PythonAnalyzer'}
+    )
+
+    results = []
+    for size in sizes:
+        analysis_result = make_analysis_result(size)
+        for name, write in (('row_by_row', save_row_by_row), ('bulk', save_analysis_result)):
+            best = min(time_write(write, user, language, analysis_result) for _ in range(repeat))
+            results.append({
+                'method': name,
+                'issues': size,
+                'seconds': round(best, 4),
+                'rows_per_second': round(size / best) if best else None
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        results = run_benchmark(args.sizes, args.repeat)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    print(f"{'method':<12} {'issues':>8} {'seconds':>10} {'rows/sec':>12}")
+    for row in results:
+        print(f"{row['method']:<12} {row['issues']:>8} {row['seconds']:>10} {row['rows_per_second']:>12}")
+
+
+if __name__ == '__main__':
+    main()
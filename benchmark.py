@@ -0,0 +1,431 @@
+#!/usr/bin/env python
+"""
+Benchmark suite for the analyzers and the analysis pipeline.
+
+Generates a reproducible corpus of Python, JavaScript and TypeScript files
+of several sizes and issue densities, then measures:
+  analyzers   analyze() latency per corpus file, overall and per tool
+  pipeline    analyze_code_submission throughput (eager, result cache off)
+  ingestion   bulk_upload_view ingestion rate, analysis not queued
+  listing     submission list view time for user histories of several sizes
+Django runs against an in-memory SQLite database and local-memory cache
+unless --configured-db is given, in which case a throwaway test database of
+the configured backend is used.
+
+Results are written as JSON so runs can be compared across commits:
+  python benchmark.py --output before.json
+  python benchmark.py --output after.json --compare before.json
+
+Usage: python benchmark.py [--suites analyzers pipeline ingestion listing]
+       [--repeat 3] [--seed 1] [--output results.json] [--compare old.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from unittest import mock
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Setup Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'code_review_system.settings')
+
+SUITES = ('analyzers', 'pipeline', 'ingestion', 'listing')
+
+# Corpus dimensions: functions per file and the share of functions with issues
+SIZES = {'small': 5, 'medium': 50, 'large': 300}
+DENSITIES = {'clean': 0.0, 'typical': 0.2, 'noisy': 0.6}
+
+# Language name, extension and analyzer class as set up by setup_database.py
+LANGUAGES = {
+    'python': ('Python', 'py', 'reviews.analyzers.PythonAnalyzer'),
+    'javascript': ('JavaScript', 'js', 'reviews.analyzers.JavaScriptAnalyzer'),
+    'typescript': ('TypeScript', 'ts', 'reviews.analyzers.JavaScriptAnalyzer'),
+}
+
+PIPELINE_SUBMISSIONS = 20
+INGESTION_SIZES = [100, 1000]
+HISTORY_SIZES = [10, 100, 1000]
+
+
+def configure_django(configured_db):
+    import django
+    from django.conf import settings
+
+    if not configured_db:
+        settings.DATABASES = {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}}
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    # Every submission must really be analyzed
+    settings.REVIEW_RESULT_CACHE_ENABLED = False
+    django.setup()
+
+    from celery import current_app
+    current_app.conf.task_always_eager = True
+    current_app.conf.task_eager_propagates = True
+
+
+# Corpus generation
+
+PYTHON_ISSUES = [
+    "    unused_{i} = [x for x in values]\n",
+    "    result = eval(str(factor))\n",
+    "    try:\n        total = total / factor\n    except:\n        pass\n",
+    "    if values == None:\n        return 0\n",
+    "    l = '" + "x" * 100 + "'\n",
+]
+
+JAVASCRIPT_ISSUES = [
+    "  var unused{i} = {i};\n",
+    "  if (factor == '{i}') {{ total = 0; }}\n",
+    "  console.log(total);\n",
+    "  eval('total + ' + factor);\n",
+]
+
+
+def python_function(i, issue):
+    body = (
+        f"def func_{i}(values, factor={i}):\n"
+        f"    \"\"\"Scale values by factor {i}\"\"\"\n"
+        f"    total = 0\n"
+        f"    for value in values:\n"
+        f"        if value > factor:\n"
+        f"            total += value * factor\n"
+        f"        else:\n"
+        f"            total -= value\n"
+    )
+    if issue is not None:
+        body += issue.format(i=i)
+    return body + "    return total\n\n\n"
+
+
+def javascript_function(i, issue, typed):
+    signature = "(values: number[], factor: number): number" if typed else "(values, factor)"
+    body = (
+        f"function func{i}{signature} {{\n"
+        f"  let total = 0;\n"
+        f"  for (const value of values) {{\n"
+        f"    if (value > factor) {{\n"
+        f"      total += value * factor;\n"
+        f"    }} else {{\n"
+        f"      total -= value;\n"
+        f"    }}\n"
+        f"  }}\n"
+    )
+    if issue is not None:
+        body += issue.format(i=i)
+    return body + "  return total;\n}\n\n"
+
+
+def generate_source(language, functions, density, seed):
+    """Deterministic source with functions blocks, density of them with an issue"""
+    rng = random.Random(f"{language}:{functions}:{density}:{seed}")
+    issues = PYTHON_ISSUES if language == 'python' else JAVASCRIPT_ISSUES
+    blocks = []
+    if language == 'python':
+        blocks.append('"""Generated benchmark module"""\nimport os\nimport subprocess\n\n\n')
+    for i in range(functions):
+        issue = rng.choice(issues) if rng.random() < density else None
+        if language == 'python':
+            blocks.append(python_function(i, issue))
+        else:
+            blocks.append(javascript_function(i, issue, typed=language == 'typescript'))
+    if language != 'python':
+        blocks.append(f"module.exports = {{ {', '.join(f'func{i}' for i in range(functions))} }};\n")
+    return ''.join(blocks)
+
+
+def generate_corpus(seed):
+    """(language, size, density, filename, source) for every corpus file"""
+    return [
+        (language, size, density, f"{size}_{density}.{extension}",
+         generate_source(language, functions, DENSITIES[density], seed))
+        for language, (_, extension, _) in LANGUAGES.items()
+        for size, functions in SIZES.items()
+        for density in DENSITIES
+    ]
+
+
+# Suites
+
+def bench_analyzers(corpus, repeat):
+    """Best-of-repeat analyze() latency per corpus file and per tool"""
+    from reviews.registry import get_analyzer
+
+    results = []
+    for language, size, density, filename, source in corpus:
+        analyzer = get_analyzer(language)
+        best = None
+        tools = {}
+        for _ in range(repeat):
+            start = time.perf_counter()
+            analysis_result = analyzer.analyze(source, filename)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+            for span in analyzer.spans:
+                tools[span['tool']] = min(tools.get(span['tool'], span['duration']), span['duration'])
+        results.append({
+            'language': language,
+            'size': size,
+            'density': density,
+            'lines': source.count('\n'),
+            'issues': analysis_result['total_issues'],
+            'tool_errors': analyzer.tool_errors,
+            'seconds': round(best, 4),
+            'tools': {tool: round(duration, 4) for tool, duration in sorted(tools.items())},
+        })
+    return results
+
+
+def bench_pipeline(user, languages, corpus):
+    """End-to-end analyze_code_submission throughput per language"""
+    from reviews.models import CodeSubmission
+    from reviews.tasks import analyze_code_submission
+
+    results = []
+    for language_name, language in languages.items():
+        source = next(source for lang, size, density, _, source in corpus
+                      if lang == language_name and size == 'medium' and density == 'typical')
+        comment = '#' if language_name == 'python' else '//'
+        submissions = []
+        for i in range(PIPELINE_SUBMISSIONS):
+            # Distinct content so no two submissions share work
+            code_content = f"{source}{comment} submission {i}\n"
+            submissions.append(CodeSubmission.objects.create(
+                user=user,
+                filename=f"pipeline_{i}.{language.extension}",
+                language=language,
+                code_content=code_content,
+                file_size=len(code_content.encode('utf-8'))
+            ))
+        start = time.perf_counter()
+        for submission in submissions:
+            analyze_code_submission.apply(args=[str(submission.id)], kwargs={'incremental': False})
+        elapsed = time.perf_counter() - start
+        results.append({
+            'language': language_name,
+            'submissions': len(submissions),
+            'seconds': round(elapsed, 4),
+            'submissions_per_second': round(len(submissions) / elapsed, 3) if elapsed else None,
+        })
+    return results
+
+
+def bench_ingestion(user, corpus, repeat):
+    """bulk_upload_view ingestion rate for JSON uploads of several sizes"""
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from reviews.models import CodeSubmission
+    from reviews.views import bulk_upload_view
+
+    source = next(source for lang, size, density, _, source in corpus
+                  if lang == 'python' and size == 'small' and density == 'typical')
+    factory = APIRequestFactory()
+    results = []
+    for count in INGESTION_SIZES:
+        payload = {'files': [
+            {'filename': f"ingest/module_{i}.py", 'language': 'python', 'code_content': source}
+            for i in range(count)
+        ]}
+        best = None
+        for _ in range(repeat):
+            request = factory.post('/bulk-upload/', payload, format='json')
+            force_authenticate(request, user=user)
+            # Measure ingestion only; the analysis would run eagerly otherwise
+            with mock.patch('reviews.ingestion.schedule_submissions'):
+                start = time.perf_counter()
+                response = bulk_upload_view(request)
+                elapsed = time.perf_counter() - start
+            if response.status_code != 202:
+                raise RuntimeError(f"Bulk upload failed: {response.data}")
+            best = elapsed if best is None else min(best, elapsed)
+            CodeSubmission.objects.filter(batch_id=response.data['id']).delete()
+        results.append({
+            'files': count,
+            'seconds': round(best, 4),
+            'files_per_second': round(count / best) if best else None,
+        })
+    return results
+
+
+def bench_listing(languages, corpus, repeat):
+    """Submission list view time against user histories of several sizes"""
+    from django.contrib.auth import get_user_model
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from reviews.models import CodeSubmission, ReviewResult
+    from reviews.views import CodeSubmissionListCreateView
+
+    language = languages['python']
+    source = next(source for lang, size, density, _, source in corpus
+                  if lang == 'python' and size == 'small' and density == 'typical')
+    view = CodeSubmissionListCreateView.as_view()
+    factory = APIRequestFactory()
+    results = []
+    for history in HISTORY_SIZES:
+        user = get_user_model().objects.create_user(email=f"history{history}@example.com", password='bench')
+        submissions = CodeSubmission.objects.bulk_create([
+            CodeSubmission(
+                user=user,
+                filename=f"history_{i}.py",
+                language=language,
+                code_content=source,
+                file_size=len(source),
+                status='completed'
+            )
+            for i in range(history)
+        ])
+        ReviewResult.objects.bulk_create([
+            ReviewResult(submission=submission, overall_score=80.0, total_issues=5, warning_issues=5)
+            for submission in submissions
+        ])
+
+        best = None
+        for _ in range(repeat):
+            request = factory.get('/submissions/')
+            force_authenticate(request, user=user)
+            start = time.perf_counter()
+            response = view(request)
+            response.render()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results.append({
+            'history': history,
+            'seconds': round(best, 4),
+            'response_bytes': len(response.content),
+        })
+    return results
+
+
+def run_benchmark(suites, repeat, seed):
+    from django.contrib.auth import get_user_model
+    from reviews.models import SupportedLanguage
+
+    corpus = generate_corpus(seed)
+    user = get_user_model().objects.create_user(email='bench@example.com', password='bench')
+    languages = {
+        language_name: SupportedLanguage.objects.get_or_create(
+            name=name,
+            defaults={'extension': extension, 'analyzer_class': analyzer_class}
+        )[0]
+        for language_name, (name, extension, analyzer_class) in LANGUAGES.items()
+    }
+
+    results = {}
+    if 'analyzers' in suites:
+        results['analyzers'] = bench_analyzers(corpus, repeat)
+    if 'pipeline' in suites:
+        results['pipeline'] = bench_pipeline(user, languages, corpus)
+    if 'ingestion' in suites:
+        results['ingestion'] = bench_ingestion(user, corpus, repeat)
+    if 'listing' in suites:
+        results['listing'] = bench_listing(languages, corpus, repeat)
+    return results
+
+
+def environment_info(seed, repeat):
+    from reviews.registry import get_registry
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    registry = get_registry()
+    analyzer_classes = set()
+    for language in registry.languages():
+        try:
+            analyzer_classes.update(registry.classes(language))
+        except ValueError:
+            # Configured analyzers that aren't installed here
+            continue
+    tool_versions = {}
+    for analyzer_class in analyzer_classes:
+        tool_versions.update(analyzer_class().get_tool_versions())
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'repeat': repeat,
+        'tools': tool_versions,
+    }
+
+
+# Reporting
+
+# Result fields that identify a row, per suite, and the timing compared
+ROW_KEYS = {
+    'analyzers': ('language', 'size', 'density'),
+    'pipeline': ('language',),
+    'ingestion': ('files',),
+    'listing': ('history',),
+}
+
+
+def print_results(results, baseline=None):
+    for suite, rows in results.items():
+        print(f"\n{suite}")
+        previous = {}
+        if baseline:
+            previous = {
+                tuple(row[key] for key in ROW_KEYS[suite]): row['seconds']
+                for row in baseline.get('results', {}).get(suite, [])
+            }
+        for row in rows:
+            key = tuple(row[key] for key in ROW_KEYS[suite])
+            line = f"  {' '.join(str(part) for part in key):<32} {row['seconds']:>10.4f}s"
+            if 'tools' in row:
+                line += '  ' + ' '.join(f"{tool}={duration:.3f}" for tool, duration in row['tools'].items())
+            if row.get('tool_errors'):
+                line += '  [tool errors]'
+            if key in previous and previous[key]:
+                line += f"  ({(row['seconds'] - previous[key]) / previous[key]:+.1%} vs baseline)"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--suites', nargs='+', choices=SUITES, default=list(SUITES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare with')
+    parser.add_argument('--configured-db', action='store_true',
+                        help='use a test database of the configured backend instead of in-memory SQLite')
+    args = parser.parse_args()
+
+    configure_django(args.configured_db)
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        report = {
+            'environment': environment_info(args.seed, args.repeat),
+            'results': run_benchmark(args.suites, args.repeat, args.seed),
+        }
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(report['results'], baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,468 @@
+"""
+Execution engines for analyzer tools.
+
+By default every tool command is run in a fresh subprocess by
+BaseAnalyzer._run_command. The engines below keep tool state warm between
+submissions instead, while still isolating crashes in a separate process.
+An engine worker may return None from execute() to make the analyzer fall
+back to the one-shot CLI.
+
+This module must not import Django or other app modules: it is executed as a
+standalone script to start the in-process linter workers.
+"""
+import io
+import json
+import os
+import select
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from contextlib import contextmanager, redirect_stdout, redirect_stderr
+from queue import Queue
+from typing import Dict, List, Any, Optional
+
+
+# Return codes of processes stopped by the CPU limit of limit_process()
+LIMIT_RETURNCODES = frozenset(-getattr(signal, name) for name in ('SIGKILL', 'SIGXCPU') if hasattr(signal, name))
+
+
+def limit_process(pid: int, memory_mb: int = None, cpu_seconds: int = None) -> None:
+    """Apply address space and CPU time limits to a running child process
+
+    The limits are set right after the process starts, which unlike a
+    preexec_fn is safe while other threads are running. Platforms without
+    prlimit run the process unlimited.
+    """
+    try:
+        import resource
+        prlimit = resource.prlimit
+    except (ImportError, AttributeError):
+        return
+    try:
+        if memory_mb:
+            limit = memory_mb * 1024 * 1024
+            prlimit(pid, resource.RLIMIT_AS, (limit, limit))
+        if cpu_seconds:
+            # SIGXCPU at the soft limit, SIGKILL at the hard one
+            prlimit(pid, resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 5))
+    except (OSError, ValueError):
+        # The process already exited, or the limit exceeds the hard limit
+        pass
+
+
+def exceeded_limits(returncode: int, stderr: str) -> bool:
+    """Whether a process was stopped by the limits of limit_process()
+
+    Past the CPU limit the process is killed by a signal. Past the memory
+    limit a Python tool dies of an uncaught MemoryError; only the last line
+    of its traceback is checked, as the output may quote the linted source.
+    """
+    if returncode in LIMIT_RETURNCODES:
+        return True
+    lines = stderr.rstrip().splitlines()
+    return returncode == 1 and bool(lines) and lines[-1].startswith('MemoryError')
+
+
+class LinterWorker:
+    """Long-lived Python process that runs linters through their APIs
+
+    Requests and responses are exchanged as JSON lines over the worker's
+    stdin/stdout. The worker is restarted after it crashes, times out, runs
+    out of memory or has served max_tasks analyses, which bounds memory
+    growth from tool caches. memory_limit_mb caps the worker's address space.
+    """
+
+    def __init__(self, max_tasks: int = 200, memory_limit_mb: int = None):
+        self.max_tasks = max_tasks
+        self.memory_limit_mb = memory_limit_mb
+        self.tasks = 0
+        self.process = None
+
+    def start(self) -> None:
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True
+        )
+        limit_process(self.process.pid, memory_mb=self.memory_limit_mb)
+        self.tasks = 0
+
+    def kill(self) -> None:
+        """Stop the worker; it is restarted on the next request"""
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
+    def execute(self, command: List[str], input_data: str = None, timeout: int = None,
+                cwd: str = None) -> Dict[str, Any]:
+        """Run a tool command line inside the worker"""
+        if self.process is None or self.process.poll() is not None or self.tasks >= self.max_tasks:
+            self.kill()
+            self.start()
+
+        process = self.process
+        try:
+            process.stdin.write(json.dumps({'command': command, 'input': input_data, 'cwd': cwd}) + '\n')
+            process.stdin.flush()
+            ready, _, _ = select.select([process.stdout], [], [], timeout)
+            if not ready:
+                self.kill()
+                return self._error_result('Analysis timeout')
+            line = process.stdout.readline()
+        except (OSError, ValueError) as e:
+            # Worker was killed, e.g. by cancel()
+            self.kill()
+            return self._error_result(str(e) or 'Worker stopped')
+
+        if not line:
+            self.kill()
+            return self._error_result('Linter worker crashed')
+
+        self.tasks += 1
+        result = json.loads(line)
+        if result.pop('out_of_memory', False):
+            # Tool state may be inconsistent after running out of memory
+            self.kill()
+            return self._error_result('Resource limit exceeded')
+        return result
+
+    def _error_result(self, message: str) -> Dict[str, Any]:
+        return {
+            'returncode': -1,
+            'stdout': '',
+            'stderr': message
+        }
+
+
+class WorkerPool:
+    """Base engine: a fixed pool of long-lived workers for some tools"""
+
+    name = None
+    tools = ()
+
+    def __init__(self, workers: List[Any]):
+        self._idle = Queue()
+        for worker in workers:
+            self._idle.put(worker)
+
+    def handles(self, command: List[str]) -> bool:
+        return os.path.basename(command[0]) in self.tools and '--version' not in command
+
+    @contextmanager
+    def worker(self):
+        """Borrow an idle worker, blocking while all are busy"""
+        worker = self._idle.get()
+        try:
+            yield worker
+        finally:
+            self._idle.put(worker)
+
+    def shutdown(self) -> None:
+        while not self._idle.empty():
+            self._idle.get().kill()
+
+
+class InProcessEngine(WorkerPool):
+    """Pool of LinterWorkers for pylint, flake8 and bandit"""
+
+    name = 'inprocess'
+    tools = ('pylint', 'flake8', 'bandit')
+
+    def __init__(self, workers: int = 3, max_tasks: int = 200, memory_limit_mb: int = None):
+        super().__init__([
+            LinterWorker(max_tasks=max_tasks, memory_limit_mb=memory_limit_mb) for _ in range(workers)
+        ])
+
+
+class ESLintDaemon:
+    """Long-lived Node process running eslint_daemon.js
+
+    Source text is sent over stdin and ESLint's JSON results come back on
+    stdout, so Node startup and config/plugin resolution are paid once. The
+    daemon is restarted after a crash, a timeout or when its RSS exceeds
+    memory_limit_mb. While it cannot be started, execute() returns None and
+    the analyzer runs the eslint CLI instead.
+    """
+
+    # CLI options the daemon reproduces; anything else goes to the CLI
+    supported_options = ('--format=json', '--stdin')
+
+    def __init__(self, node: str = 'node', script: str = None, memory_limit_mb: int = 512,
+                 startup_timeout: int = 15, retry_interval: int = 60):
+        self.node = node
+        self.script = script or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'eslint_daemon.js')
+        self.memory_limit = memory_limit_mb * 1024 * 1024
+        self.startup_timeout = startup_timeout
+        self.retry_interval = retry_interval
+        self.process = None
+        self.request_id = 0
+        self.unavailable_until = 0.0
+
+    def start(self) -> bool:
+        if time.monotonic() < self.unavailable_until:
+            return False
+        try:
+            self.process = subprocess.Popen(
+                [self.node, self.script],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True
+            )
+            ready, _, _ = select.select([self.process.stdout], [], [], self.startup_timeout)
+            handshake = json.loads(self.process.stdout.readline() or '{}') if ready else {}
+        except (OSError, ValueError):
+            handshake = {}
+
+        if not handshake.get('ready'):
+            self.kill()
+            self.unavailable_until = time.monotonic() + self.retry_interval
+            return False
+        return True
+
+    def kill(self) -> None:
+        """Stop the daemon; it is restarted on the next request"""
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
+    def execute(self, command: List[str], input_data: str = None, timeout: int = None,
+                cwd: str = None) -> Optional[Dict[str, Any]]:
+        """Lint the files or stdin text named by an eslint command line"""
+        sources = self._sources(command, input_data)
+        if sources is None:
+            return None
+        if self.process is None or self.process.poll() is not None:
+            if not self.start():
+                return None
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        results = []
+        for file_path, text in sources:
+            self.request_id += 1
+            request = {'id': self.request_id, 'text': text, 'filePath': file_path, 'cwd': cwd or os.getcwd()}
+            try:
+                self.process.stdin.write(json.dumps(request) + '\n')
+                self.process.stdin.flush()
+                remaining = None if deadline is None else max(0, deadline - time.monotonic())
+                ready, _, _ = select.select([self.process.stdout], [], [], remaining)
+                if not ready:
+                    self.kill()
+                    return {
+                        'returncode': -1,
+                        'stdout': '',
+                        'stderr': 'Analysis timeout'
+                    }
+                line = self.process.stdout.readline()
+            except (OSError, ValueError, AttributeError):
+                line = ''
+
+            response = json.loads(line) if line else {}
+            if 'results' not in response:
+                # Crash or internal error: restart later and use the CLI now
+                self.kill()
+                return None
+            results.extend(response['results'])
+            if response.get('rss', 0) > self.memory_limit:
+                self.kill()
+
+        has_errors = any(result.get('errorCount', 0) for result in results)
+        return {
+            'returncode': 1 if has_errors else 0,
+            'stdout': json.dumps(results),
+            'stderr': ''
+        }
+
+    def _sources(self, command: List[str], input_data: Optional[str]):
+        """Return (file path, text) pairs to lint, or None if unsupported"""
+        args = iter(command[1:])
+        paths = []
+        stdin_filename = None
+        use_stdin = False
+        for arg in args:
+            if arg == '--stdin-filename':
+                stdin_filename = next(args, None)
+            elif arg == '--stdin':
+                use_stdin = True
+            elif arg.startswith('-'):
+                if arg not in self.supported_options:
+                    return None
+            else:
+                paths.append(arg)
+
+        if use_stdin:
+            return [(os.path.abspath(stdin_filename or 'stdin.js'), input_data or '')]
+
+        sources = []
+        for path in paths:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    sources.append((os.path.abspath(path), f.read()))
+            except OSError:
+                return None
+        return sources
+
+
+class ESLintDaemonEngine(WorkerPool):
+    """Pool of ESLintDaemons for eslint commands"""
+
+    name = 'eslint_daemon'
+    tools = ('eslint',)
+
+    def __init__(self, workers: int = 1, **options):
+        super().__init__([ESLintDaemon(**options) for _ in range(workers)])
+
+
+ENGINES = {
+    'inprocess': InProcessEngine,
+    'eslint_daemon': ESLintDaemonEngine,
+}
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(name: Optional[str], **options):
+    """Get the process-wide engine instance for name (None means subprocess)"""
+    if not name or name == 'subprocess':
+        return None
+    engine_class = ENGINES.get(name)
+    if not engine_class:
+        raise ValueError(f"Unknown analyzer engine: {name}")
+    with _engines_lock:
+        if name not in _engines:
+            _engines[name] = engine_class(**options)
+        return _engines[name]
+
+
+# --- Worker side -------------------------------------------------------------
+
+def _run_pylint(argv: List[str]) -> int:
+    from pylint.lint import Run
+    run = Run(argv, exit=False)
+    return run.linter.msg_status
+
+
+def _run_flake8(argv: List[str]) -> int:
+    from flake8 import utils
+    from flake8.main.application import Application
+    # flake8 caches what it read from stdin for the life of the process
+    utils.stdin_get_value.cache_clear()
+    app = Application()
+    app.run(argv)
+    return app.exit_code()
+
+
+def _run_bandit(argv: List[str]) -> int:
+    from bandit.cli.main import LOG, main
+    # Every run adds a handler writing to that run's captured stderr
+    LOG.handlers = []
+    sys.argv = ['bandit'] + argv
+    main()
+    return 0
+
+
+class _CaptureBuffer(io.BytesIO):
+    """Output buffer that survives tools closing their output stream"""
+
+    name = '<stdout>'
+
+    def close(self) -> None:
+        pass
+
+
+def _stdin_file(input_data: Optional[str]):
+    """Binary file with the tool input and a real descriptor
+
+    Some tools (bandit) read stdin through its file descriptor, so an
+    in-memory buffer is not enough. memfd keeps the input off the disk.
+    """
+    try:
+        stdin_file = os.fdopen(os.memfd_create('review_stdin'), 'w+b')
+    except (AttributeError, OSError):
+        stdin_file = tempfile.TemporaryFile()
+    stdin_file.write((input_data or '').encode('utf-8'))
+    stdin_file.seek(0)
+    return stdin_file
+
+
+TOOL_RUNNERS = {
+    'pylint': _run_pylint,
+    'flake8': _run_flake8,
+    'bandit': _run_bandit,
+}
+
+
+def _run_tool(command: List[str], input_data: Optional[str], cwd: Optional[str] = None) -> Dict[str, Any]:
+    """Run a tool with captured stdio, as if it had been spawned"""
+    runner = TOOL_RUNNERS[os.path.basename(command[0])]
+    stdout = io.TextIOWrapper(_CaptureBuffer(), encoding='utf-8')
+    stderr = io.StringIO()
+    stdin = sys.stdin
+    stdin_file = _stdin_file(input_data)
+    sys.stdin = io.TextIOWrapper(stdin_file, encoding='utf-8')
+    previous_cwd = os.getcwd()
+    if cwd:
+        os.chdir(cwd)
+
+    out_of_memory = False
+    try:
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            try:
+                returncode = runner(command[1:])
+            except SystemExit as e:
+                returncode = e.code if isinstance(e.code, int) else 1
+            except MemoryError:
+                # Flagged apart from stderr, which may quote the linted source
+                out_of_memory = True
+                returncode = -1
+            except Exception:
+                traceback.print_exc()
+                returncode = -1
+    finally:
+        sys.stdin = stdin
+        stdin_file.close()
+        os.chdir(previous_cwd)
+
+    stdout.flush()
+    return {
+        'returncode': returncode,
+        'stdout': stdout.buffer.getvalue().decode('utf-8'),
+        'stderr': stderr.getvalue(),
+        'out_of_memory': out_of_memory
+    }
+
+
+def _worker_main() -> None:
+    # Keep the protocol channel private so stray writes to fd 1 can't corrupt it
+    protocol = os.fdopen(os.dup(1), 'w')
+    os.dup2(2, 1)
+    sys.stdout = sys.__stdout__ = os.fdopen(1, 'w')
+
+    # Import the tools once; their module-level caches stay warm between requests
+    for tool in ('pylint.lint', 'flake8.main.application', 'bandit.cli.main'):
+        try:
+            __import__(tool)
+        except ImportError:
+            pass
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        try:
+            result = _run_tool(request['command'], request.get('input'), request.get('cwd'))
+        except Exception:
+            result = {'returncode': -1, 'stdout': '', 'stderr': traceback.format_exc()}
+        protocol.write(json.dumps(result) + '\n')
+        protocol.flush()
+
+
+if __name__ == '__main__':
+    _worker_main()
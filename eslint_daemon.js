@@ -0,0 +1,66 @@
+#!/usr/bin/env node
+// Persistent ESLint server for JavaScriptAnalyzer.
+//
+// Reads one JSON request per line on stdin ({ id, text, filePath, cwd }) and
+// answers with one JSON line per request ({ id, results, rss } or { id, error }).
+// The first line written is a handshake: { ready: true, version } when ESLint
+// could be loaded, otherwise { ready: false, error }.
+const readline = require("readline")
+
+function loadESLint() {
+  const paths = [process.cwd()]
+  try {
+    return require(require.resolve("eslint", { paths }))
+  } catch (error) {
+    return require("eslint")
+  }
+}
+
+function write(message) {
+  process.stdout.write(JSON.stringify(message) + "\n")
+}
+
+let eslintModule
+try {
+  eslintModule = loadESLint()
+} catch (error) {
+  write({ ready: false, error: String(error && error.message) })
+  process.exit(1)
+}
+
+const { ESLint } = eslintModule
+// One instance per working directory so resolved configs and plugins stay cached
+const instances = new Map()
+
+function getInstance(cwd) {
+  const key = cwd || process.cwd()
+  if (!instances.has(key)) {
+    instances.set(key, new ESLint({ cwd: key }))
+  }
+  return instances.get(key)
+}
+
+async function handle(request) {
+  try {
+    const eslint = getInstance(request.cwd)
+    const results = await eslint.lintText(request.text, {
+      filePath: request.filePath,
+      warnIgnored: true,
+    })
+    write({ id: request.id, results, rss: process.memoryUsage().rss })
+  } catch (error) {
+    write({ id: request.id, error: String(error && error.stack) })
+  }
+}
+
+// Requests are handled one at a time so responses stay in request order
+let queue = Promise.resolve()
+const input = readline.createInterface({ input: process.stdin })
+input.on("line", (line) => {
+  if (!line.trim()) return
+  const request = JSON.parse(line)
+  queue = queue.then(() => handle(request))
+})
+input.on("close", () => queue.then(() => process.exit(0)))
+
+write({ ready: true, version: ESLint.version })
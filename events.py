@@ -0,0 +1,90 @@
+from typing import Dict, List, Any, Tuple
+from django.conf import settings
+from django.core.cache import caches
+
+
+class SubmissionEventLog:
+    """Per-submission event log kept in the Django cache
+
+    Analysis workers append status transitions and issue batches as they
+    happen; streaming views follow the log by sequence number, so clients
+    receive progress without polling the database.
+    """
+
+    KEY_PREFIX = 'submission_events'
+
+    def __init__(self, alias: str = 'default', timeout: int = 3600, batch_size: int = 200):
+        self.alias = alias
+        self.timeout = timeout
+        self.batch_size = batch_size
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def reset(self, submission_id) -> None:
+        """Start a new log for a fresh analysis run"""
+        self.backend.set(self._seq_key(submission_id), 0, self.timeout)
+
+    def publish(self, submission_id, event: str, data: Dict[str, Any]) -> int:
+        """Append an event and return its sequence number"""
+        seq_key = self._seq_key(submission_id)
+        self.backend.add(seq_key, 0, self.timeout)
+        try:
+            seq = self.backend.incr(seq_key)
+        except ValueError:
+            # Sequence expired between add() and incr()
+            seq = 1
+            self.backend.set(seq_key, seq, self.timeout)
+        self.backend.set(
+            self._event_key(submission_id, seq),
+            {'id': seq, 'event': event, 'data': data},
+            self.timeout
+        )
+        return seq
+
+    def publish_status(self, submission_id, status: str, **data) -> int:
+        return self.publish(submission_id, 'status', {'status': status, **data})
+
+    def publish_issues(self, submission_id, tool: str, issues: List[Dict[str, Any]]) -> None:
+        """Append issues in batches of batch_size"""
+        for i in range(0, len(issues), self.batch_size):
+            self.publish(submission_id, 'issues', {
+                'tool': tool,
+                'issues': issues[i:i + self.batch_size]
+            })
+
+    def read(self, submission_id, after: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """Events with a sequence number above after, plus the new position"""
+        last = self.backend.get(self._seq_key(submission_id)) or 0
+        if last < after:
+            # The log was reset for a new analysis run
+            after = 0
+        if last == after:
+            return [], after
+
+        keys = [self._event_key(submission_id, seq) for seq in range(after + 1, last + 1)]
+        found = self.backend.get_many(keys)
+        events = [found[key] for key in keys if key in found]
+        return events, last
+
+    def _seq_key(self, submission_id) -> str:
+        return f"{self.KEY_PREFIX}:{submission_id}:seq"
+
+    def _event_key(self, submission_id, seq: int) -> str:
+        return f"{self.KEY_PREFIX}:{submission_id}:{seq}"
+
+
+_event_log = None
+
+
+def get_event_log() -> SubmissionEventLog:
+    """Get the process-wide submission event log configured from settings"""
+    global _event_log
+    if _event_log is None:
+        _event_log = SubmissionEventLog(
+            alias=getattr(settings, 'REVIEW_EVENTS_CACHE_ALIAS', 'default'),
+            timeout=getattr(settings, 'REVIEW_EVENTS_TIMEOUT', 3600),
+            batch_size=getattr(settings, 'REVIEW_EVENTS_BATCH_SIZE', 200),
+        )
+    return _event_log
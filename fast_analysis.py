@@ -0,0 +1,239 @@
+"""
+Fast in-process checks for Python sources.
+
+The source is parsed once with ast (and tokenized once for comments), and a
+small set of rules runs over the tree in milliseconds:
+  syntax errors, unused imports and variables, bare except, eval/exec,
+  subprocess calls with shell=True, long lines and cyclomatic complexity.
+Rule ids match the pylint, bandit and mccabe rules that report the same
+problems, so a first-pass result reads like the full one. Lines with a
+`# noqa` comment are skipped.
+"""
+import ast
+import io
+import tokenize
+from typing import Dict, List, Any, Set, Tuple
+
+SUBPROCESS_FUNCTIONS = {'call', 'run', 'Popen', 'check_call', 'check_output', 'getoutput', 'getstatusoutput'}
+
+# Nodes that add a decision point to a function's cyclomatic complexity
+BRANCH_NODES = (ast.If, ast.For, ast.AsyncFor, ast.While, ast.ExceptHandler, ast.IfExp, ast.Assert)
+
+
+def check_source(code_content: str, max_line_length: int = 100, max_complexity: int = 10) -> List[Dict[str, Any]]:
+    """Issues found in a Python source, in the analyzers' issue dict shape"""
+    try:
+        tree = ast.parse(code_content)
+    except (SyntaxError, ValueError) as e:
+        return [_issue('E0001', 'syntax-error', 'error', f"Parsing failed: '{getattr(e, 'msg', str(e))}'",
+                       getattr(e, 'lineno', None) or 1, getattr(e, 'offset', None) or 0)]
+
+    checker = _Checker(max_complexity, *_subprocess_names(tree))
+    checker.visit(tree)
+    issues = checker.issues
+    issues.extend(_unused_imports(tree))
+    issues.extend(_long_lines(code_content, max_line_length))
+
+    noqa = _noqa_lines(code_content)
+    issues = [issue for issue in issues if issue['line_number'] not in noqa]
+    issues.sort(key=lambda issue: (issue['line_number'], issue['column_number']))
+    return issues
+
+
+def _issue(rule_id: str, rule_name: str, severity: str, message: str, line: int, column: int = 0,
+           suggestion: str = '') -> Dict[str, Any]:
+    return {
+        'rule_id': rule_id,
+        'rule_name': rule_name,
+        'severity': severity,
+        'message': message,
+        'line_number': line,
+        'column_number': column,
+        'suggestion': suggestion
+    }
+
+
+class _Checker(ast.NodeVisitor):
+    """Rules that look at single nodes or single function bodies"""
+
+    def __init__(self, max_complexity: int, subprocess_modules: Set[str] = frozenset(),
+                 subprocess_functions: Set[str] = frozenset()):
+        self.max_complexity = max_complexity
+        # Names the source binds to the subprocess module and its functions
+        self.subprocess_modules = subprocess_modules
+        self.subprocess_functions = subprocess_functions
+        self.issues = []
+
+    def visit_ExceptHandler(self, node: ast.ExceptHandler) -> None:
+        if node.type is None:
+            self.issues.append(_issue('W0702', 'bare-except', 'warning', "No exception type(s) specified",
+                                      node.lineno, node.col_offset))
+        self.generic_visit(node)
+
+    def visit_Call(self, node: ast.Call) -> None:
+        if isinstance(node.func, ast.Name) and node.func.id in ('eval', 'exec'):
+            rule_id = 'W0123' if node.func.id == 'eval' else 'W0122'
+            self.issues.append(_issue(rule_id, f"{node.func.id}-used", 'warning', f"Use of {node.func.id}",
+                                      node.lineno, node.col_offset))
+        elif self._is_subprocess_call(node.func) and self._uses_shell(node):
+            self.issues.append(_issue(
+                'B602', 'subprocess_popen_with_shell_equals_true', 'critical',
+                "subprocess call with shell=True identified, security issue.",
+                node.lineno, node.col_offset, 'HIGH'
+            ))
+        self.generic_visit(node)
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> None:
+        self._check_function(node)
+        self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def _check_function(self, node) -> None:
+        complexity = _complexity(node)
+        if complexity > self.max_complexity:
+            self.issues.append(_issue('C901', 'too-complex', 'info',
+                                      f"'{node.name}' is too complex ({complexity})", node.lineno, node.col_offset))
+
+        declared = set()
+        loaded = set()
+        assigned = {}
+        for child in ast.walk(node):
+            if isinstance(child, (ast.Global, ast.Nonlocal)):
+                declared.update(child.names)
+            elif isinstance(child, ast.Name) and isinstance(child.ctx, ast.Load):
+                loaded.add(child.id)
+        for statement in _own_statements(node):
+            if isinstance(statement, ast.Assign):
+                targets = statement.targets
+            elif isinstance(statement, ast.AnnAssign) and statement.value is not None:
+                targets = [statement.target]
+            else:
+                continue
+            for target in targets:
+                if isinstance(target, ast.Name):
+                    assigned.setdefault(target.id, target)
+
+        for name, target in assigned.items():
+            if name in loaded or name in declared or name.startswith('_'):
+                continue
+            self.issues.append(_issue('W0612', 'unused-variable', 'warning', f"Unused variable '{name}'",
+                                      target.lineno, target.col_offset))
+
+    def _is_subprocess_call(self, func: ast.expr) -> bool:
+        if isinstance(func, ast.Attribute):
+            return (func.attr in SUBPROCESS_FUNCTIONS and isinstance(func.value, ast.Name)
+                    and func.value.id in self.subprocess_modules)
+        return isinstance(func, ast.Name) and func.id in self.subprocess_functions
+
+    def _uses_shell(self, node: ast.Call) -> bool:
+        return any(
+            keyword.arg == 'shell' and isinstance(keyword.value, ast.Constant) and keyword.value.value is True
+            for keyword in node.keywords
+        )
+
+
+def _subprocess_names(tree: ast.Module) -> Tuple[Set[str], Set[str]]:
+    """Names bound to the subprocess module and to its functions by the source's imports"""
+    modules = {'subprocess'}
+    functions = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules.update(alias.asname for alias in node.names if alias.name == 'subprocess' and alias.asname)
+        elif isinstance(node, ast.ImportFrom) and node.module == 'subprocess' and not node.level:
+            functions.update(
+                alias.asname or alias.name for alias in node.names if alias.name in SUBPROCESS_FUNCTIONS
+            )
+    return modules, functions
+
+
+def _own_statements(function) -> List[ast.stmt]:
+    """Statements of a function body, not those of nested functions or classes"""
+    statements = []
+    pending = list(function.body)
+    while pending:
+        statement = pending.pop()
+        statements.append(statement)
+        if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        for field in ('body', 'orelse', 'finalbody', 'handlers'):
+            pending.extend(getattr(statement, field, []))
+        for case in getattr(statement, 'cases', []):
+            pending.extend(case.body)
+    return statements
+
+
+def _complexity(function) -> int:
+    """McCabe complexity of a function, nested functions excluded"""
+    complexity = 1
+    pending = list(function.body)
+    while pending:
+        node = pending.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+            continue
+        if isinstance(node, BRANCH_NODES):
+            complexity += 1
+        elif isinstance(node, ast.BoolOp):
+            complexity += len(node.values) - 1
+        elif isinstance(node, ast.comprehension):
+            complexity += 1 + len(node.ifs)
+        elif hasattr(ast, 'match_case') and isinstance(node, ast.match_case):
+            complexity += 1
+        pending.extend(ast.iter_child_nodes(node))
+    return complexity
+
+
+def _unused_imports(tree: ast.Module) -> List[Dict[str, Any]]:
+    """Imports whose bound name is never used anywhere in the module"""
+    used = _used_names(tree)
+    issues = []
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.Import, ast.ImportFrom)):
+            continue
+        if isinstance(node, ast.ImportFrom) and node.module == '__future__':
+            continue
+        for alias in node.names:
+            if alias.name == '*':
+                continue
+            bound = alias.asname or alias.name.split('.')[0]
+            if bound in used:
+                continue
+            if isinstance(node, ast.ImportFrom):
+                message = f"Unused {alias.name} imported from {node.module or '.'}"
+            else:
+                message = f"Unused import {alias.name}"
+            if alias.asname:
+                message += f" as {alias.asname}"
+            issues.append(_issue('W0611', 'unused-import', 'warning', message, node.lineno, node.col_offset))
+    return issues
+
+
+def _used_names(tree: ast.Module) -> Set[str]:
+    used = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+            used.add(node.id)
+        elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+            # Names listed in __all__ or used in string annotations
+            used.add(node.value)
+    return used
+
+
+def _long_lines(code_content: str, max_line_length: int) -> List[Dict[str, Any]]:
+    return [
+        _issue('C0301', 'line-too-long', 'info', f"Line too long ({len(line)}/{max_line_length})", number)
+        for number, line in enumerate(code_content.splitlines(), start=1)
+        if len(line) > max_line_length
+    ]
+
+
+def _noqa_lines(code_content: str) -> Set[int]:
+    """Lines carrying a `# noqa` comment"""
+    lines = set()
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(code_content).readline):
+            if token.type == tokenize.COMMENT and 'noqa' in token.string.lower():
+                lines.add(token.start[0])
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        pass
+    return lines
@@ -0,0 +1,270 @@
+"""
+Bulk ingestion of source files for analysis.
+
+Files arrive as a JSON list, as multipart file fields or inside a zip/tar
+archive. Every file is checked before any row is written, so an upload is
+either accepted as a whole or rejected with all of its problems listed.
+Accepted files are stored with one bulk insert and queued for batch
+analysis once the transaction commits.
+"""
+import posixpath
+import tarfile
+import zipfile
+from typing import Dict, List, Any, Optional, Tuple
+from django.conf import settings
+from django.db import transaction
+from .models import CodeSubmission, ProjectSubmission, SubmissionBatch, SupportedLanguage
+from .registry import get_registry
+from .scheduling import schedule_project, schedule_submissions
+
+
+class IngestionError(Exception):
+    """Raised when an upload is rejected; errors lists every problem found"""
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__('; '.join(errors))
+
+
+def language_maps() -> Tuple[Dict[str, SupportedLanguage], Dict[str, SupportedLanguage]]:
+    """Active languages keyed by lowercase name and by extension, from one query"""
+    by_name = {}
+    by_extension = {}
+    for language in SupportedLanguage.objects.filter(is_active=True):
+        by_name[language.name.lower()] = language
+        by_extension[language.extension.lower().lstrip('.')] = language
+    return by_name, by_extension
+
+
+def clean_filename(name: str) -> Optional[str]:
+    """Normalized relative path of an uploaded file, or None if unsafe"""
+    path = posixpath.normpath(name.replace('\\', '/')).lstrip('/')
+    if not path or path == '.' or path.split('/')[0] == '..' or len(path) > 255:
+        return None
+    return path
+
+
+class BulkUpload:
+    """Validated set of files for one bulk upload"""
+
+    # Archive entries that are never source files
+    IGNORED_PREFIXES = ('__MACOSX/', '.git/')
+
+    def __init__(self, source: str):
+        self.source = source
+        self.max_files = getattr(settings, 'REVIEW_BULK_MAX_FILES', 5000)
+        self.max_file_size = getattr(settings, 'REVIEW_MAX_FILE_SIZE', 1024 * 1024)
+        self.max_total_size = getattr(settings, 'REVIEW_BULK_MAX_TOTAL_SIZE', 200 * 1024 * 1024)
+        # Archives may contain docs and assets; explicitly uploaded files may not
+        self.skip_unsupported = source == 'archive'
+        self.languages_by_name, self.languages_by_extension = language_maps()
+        self.files = []
+        self.errors = []
+        self.skipped = 0
+        self.total_size = 0
+
+    def add(self, filename: str, content: Any, language_name: str = None) -> None:
+        """Add one file, recording any problem with it as an error
+
+        Without a language name the language is taken from the file
+        extension. Files of an archive with an unsupported extension are
+        skipped.
+        """
+        path = clean_filename(filename)
+        if path is None:
+            self.errors.append(f"Invalid filename: {filename}")
+            return
+
+        if language_name is not None:
+            language = self.languages_by_name.get(language_name.lower())
+            if language is None:
+                self.errors.append(f"{path}: unsupported language: {language_name}")
+                return
+        else:
+            extension = posixpath.splitext(path)[1].lower().lstrip('.')
+            language = self.languages_by_extension.get(extension)
+            if language is None:
+                if self.skip_unsupported:
+                    self.skipped += 1
+                else:
+                    self.errors.append(f"{path}: unsupported file extension")
+                return
+
+        if isinstance(content, bytes):
+            try:
+                content = content.decode('utf-8')
+            except UnicodeDecodeError:
+                self.errors.append(f"{path}: not valid UTF-8 text")
+                return
+        if not self._check_size(path, len(content.encode('utf-8'))):
+            return
+
+        if len(self.files) >= self.max_files:
+            raise IngestionError(self.errors + [f"Too many files, the limit is {self.max_files}"])
+        self.files.append((path, language, content))
+
+    def add_uploaded_file(self, uploaded_file, language_name: str = None) -> None:
+        """Add a multipart upload without reading it if it is too large"""
+        if uploaded_file.size > self.max_file_size:
+            self.errors.append(f"{uploaded_file.name}: file size exceeds {self.max_file_size} bytes")
+            return
+        self.add(uploaded_file.name, uploaded_file.read(), language_name)
+
+    def add_archive(self, archive) -> None:
+        """Add every regular file of a zip or tar archive"""
+        if zipfile.is_zipfile(archive):
+            archive.seek(0)
+            try:
+                with zipfile.ZipFile(archive) as zf:
+                    for info in zf.infolist():
+                        if info.is_dir() or self._ignored(info.filename):
+                            continue
+                        # Check the declared size before decompressing anything
+                        if self._accepts(info.filename, info.file_size):
+                            self.add(info.filename, zf.read(info))
+            except zipfile.BadZipFile as e:
+                self.errors.append(f"Corrupt zip archive: {str(e)}")
+            return
+
+        archive.seek(0)
+        try:
+            with tarfile.open(fileobj=archive, mode='r:*') as tf:
+                for member in tf:
+                    # Links and devices are never read
+                    if not member.isfile() or self._ignored(member.name):
+                        continue
+                    if self._accepts(member.name, member.size):
+                        self.add(member.name, tf.extractfile(member).read())
+        except tarfile.TarError:
+            self.errors.append("Unsupported archive format, expected zip or tar")
+
+    def save(self, user) -> SubmissionBatch:
+        """Store the submissions and queue their analysis, or reject the upload"""
+        if not self.files and not self.errors:
+            self.errors.append("No supported source files found")
+        if self.errors:
+            raise IngestionError(self.errors)
+
+        # Very large uploads only get the fast in-process analyzers
+        fast_min_files = getattr(settings, 'REVIEW_FAST_MODE_MIN_FILES', 1000)
+        fast = fast_min_files is not None and len(self.files) >= fast_min_files
+        
+        with transaction.atomic():
+            batch = SubmissionBatch.objects.create(
+                user=user,
+                source=self.source,
+                total_files=len(self.files),
+                skipped_files=self.skipped,
+                analysis_mode='fast' if fast else 'full'
+            )
+            submissions = self._create_submissions(user, batch=batch)
+            transaction.on_commit(lambda: schedule_submissions(submissions, 'bulk', fast=fast))
+        return batch
+
+    def _create_submissions(self, user, **fields) -> List[CodeSubmission]:
+        batch_size = getattr(settings, 'REVIEW_BULK_CREATE_BATCH_SIZE', 500)
+        return CodeSubmission.objects.bulk_create(
+            [
+                CodeSubmission(
+                    user=user,
+                    filename=path,
+                    language=language,
+                    code_content=content,
+                    file_size=len(content.encode('utf-8')),
+                    **fields
+                )
+                for path, language, content in self.files
+            ],
+            batch_size=batch_size
+        )
+
+    def _accepts(self, filename: str, size: int) -> bool:
+        """Whether an archive entry is worth reading"""
+        extension = posixpath.splitext(filename)[1].lower().lstrip('.')
+        if extension not in self.languages_by_extension:
+            self.skipped += 1
+            return False
+        if size > self.max_file_size:
+            self.errors.append(f"{filename}: file size exceeds {self.max_file_size} bytes")
+            return False
+        return True
+
+    def _check_size(self, filename: str, size: int) -> bool:
+        if size > self.max_file_size:
+            self.errors.append(f"{filename}: file size exceeds {self.max_file_size} bytes")
+            return False
+        self.total_size += size
+        if self.total_size > self.max_total_size:
+            # Stop reading right away, e.g. for a decompression bomb
+            raise IngestionError(self.errors + [f"Upload exceeds {self.max_total_size} bytes in total"])
+        return True
+
+    def _ignored(self, filename: str) -> bool:
+        return filename.startswith(self.IGNORED_PREFIXES)
+
+
+class ProjectUpload(BulkUpload):
+    """Files of one source tree, kept together for project analysis"""
+
+    def __init__(self, name: str):
+        super().__init__('archive')
+        self.name = name
+        self.config_files = {}
+        # Configs of the analyzers of the active languages, however configured
+        self.config_readers = get_registry().config_readers(self.languages_by_name)
+        self.config_names = set(self.config_readers)
+        self.paths = set()
+
+    def add(self, filename: str, content: Any, language_name: str = None) -> None:
+        path = clean_filename(filename)
+        if path is not None:
+            if posixpath.basename(path) in self.config_names:
+                self._add_config(path, content)
+                return
+            if path in self.paths:
+                self.errors.append(f"{path}: duplicate file path")
+                return
+            self.paths.add(path)
+        super().add(filename, content, language_name)
+
+    def save(self, user) -> ProjectSubmission:
+        """Store the project and its files and queue the analysis"""
+        if not self.files and not self.errors:
+            self.errors.append("No supported source files found")
+        if self.errors:
+            raise IngestionError(self.errors)
+
+        with transaction.atomic():
+            project = ProjectSubmission.objects.create(
+                user=user,
+                name=self.name,
+                config_files=self.config_files,
+                total_files=len(self.files)
+            )
+            self._create_submissions(user, project=project)
+            transaction.on_commit(lambda: schedule_project(project))
+        return project
+
+    def _accepts(self, filename: str, size: int) -> bool:
+        if posixpath.basename(filename) in self.config_names:
+            if size > self.max_file_size:
+                self.errors.append(f"{filename}: file size exceeds {self.max_file_size} bytes")
+                return False
+            return True
+        return super()._accepts(filename, size)
+
+    def _add_config(self, path: str, content: Any) -> None:
+        if isinstance(content, bytes):
+            try:
+                content = content.decode('utf-8')
+            except UnicodeDecodeError:
+                self.errors.append(f"{path}: not valid UTF-8 text")
+                return
+        if not self._check_size(path, len(content.encode('utf-8'))):
+            return
+        # Configs that could run code on the worker are ignored
+        for analyzer_class in self.config_readers[posixpath.basename(path)]:
+            sanitized = analyzer_class.sanitize_config(path, content)
+            if sanitized is not None:
+                self.config_files[path] = sanitized
+                return
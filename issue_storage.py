@@ -0,0 +1,225 @@
+"""
+Compact storage for the issues of large results.
+
+All issues of a result are packed into one zlib-compressed blob: numeric
+columns (line, column, severity code and indexes into string tables) plus
+string tables in which every distinct rule, message and suggestion is
+stored once. Issues are kept in source order. PackedIssues decodes the
+columns on first use and builds issue dicts only for the positions asked
+for, so paging through a large result never materializes all of it.
+
+Layout after decompression, little-endian:
+  magic 'RVI2', issue count (u32)
+  columns: line (i32), column (i32), severity (u8), rule (u32),
+           message (u32), suggestion (u32), one value per issue each
+  string tables: rule ids, rule names, rule tools (same indexes),
+                 messages, suggestions; each is a count (u32), count + 1
+                 offsets (u32) and the UTF-8 bytes
+Blobs written before rules were keyed by tool ('RVI1') have no rule tools
+table and read with a tool of ''.
+"""
+import struct
+import sys
+import zlib
+from array import array
+from typing import Dict, List, Any, Iterable, Optional
+
+MAGIC = b'RVI2'
+
+# Earlier layout without the rule tools table
+MAGIC_V1 = b'RVI1'
+
+# Severity codes, in the order of increasing severity
+SEVERITIES = ('info', 'warning', 'error', 'critical')
+
+# (name, array typecode) of the numeric columns, in storage order
+COLUMNS = (
+    ('line_number', 'i'),
+    ('column_number', 'i'),
+    ('severity', 'B'),
+    ('rule', 'I'),
+    ('message', 'I'),
+    ('suggestion', 'I'),
+)
+
+
+def pack_issues(issues: List[Dict[str, Any]], level: int = 6) -> bytes:
+    """Pack issue dicts into a compressed blob, sorted by line number"""
+    issues = sorted(issues, key=lambda issue: issue['line_number'])
+    rules = _StringTable()
+    rule_ids = []
+    rule_names = []
+    rule_tools = []
+    messages = _StringTable()
+    suggestions = _StringTable()
+    columns = {name: array(typecode) for name, typecode in COLUMNS}
+
+    for issue in issues:
+        # Tools report some fields as null, e.g. ESLint's fatal parse errors
+        # have no ruleId; rule ids are normalized as by rules.rule_key
+        tool = issue.get('tool') or ''
+        rule_id = issue.get('rule_id') or 'unknown'
+        rule = rules.index((tool, rule_id))
+        if rule == len(rule_names):
+            rule_ids.append(rule_id)
+            rule_names.append(issue.get('rule_name') or '')
+            rule_tools.append(tool)
+        columns['line_number'].append(issue['line_number'])
+        columns['column_number'].append(issue.get('column_number') or 0)
+        columns['severity'].append(SEVERITIES.index(issue['severity']))
+        columns['rule'].append(rule)
+        columns['message'].append(messages.index(issue.get('message') or ''))
+        columns['suggestion'].append(suggestions.index(issue.get('suggestion') or ''))
+
+    parts = [MAGIC, struct.pack('<I', len(issues))]
+    for name, _ in COLUMNS:
+        parts.append(_to_bytes(columns[name]))
+    for strings in (rule_ids, rule_names, rule_tools, messages.strings, suggestions.strings):
+        parts.append(_pack_strings(strings))
+    return zlib.compress(b''.join(parts), level)
+
+
+class PackedIssues:
+    """Lazily decoded view of a packed issues blob"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self._raw = None
+        self._columns = None
+        self._tables = None
+
+    def __len__(self) -> int:
+        self._load()
+        return self._count
+
+    def positions(self, severities: Iterable[str] = None, rule_ids: Iterable[str] = None) -> List[int]:
+        """Positions of the issues matching the filters, in source order"""
+        self._load()
+        positions = range(self._count)
+        if severities is not None:
+            codes = {SEVERITIES.index(severity) for severity in severities if severity in SEVERITIES}
+            column = self._columns['severity']
+            positions = [position for position in positions if column[position] in codes]
+        if rule_ids is not None:
+            wanted = set(rule_ids)
+            rule_table = self._tables[0]
+            indexes = {index for index in range(len(rule_table)) if rule_table.get(index) in wanted}
+            column = self._columns['rule']
+            positions = [position for position in positions if column[position] in indexes]
+        return list(positions)
+
+    def issues(self, positions: Optional[Iterable[int]] = None) -> List[Dict[str, Any]]:
+        """Issue dicts at the given positions, or all of them"""
+        self._load()
+        if positions is None:
+            positions = range(self._count)
+        rule_ids, rule_names, rule_tools, messages, suggestions = self._tables
+        columns = self._columns
+        return [
+            {
+                'tool': rule_tools.get(columns['rule'][position]),
+                'rule_id': rule_ids.get(columns['rule'][position]),
+                'rule_name': rule_names.get(columns['rule'][position]),
+                'severity': SEVERITIES[columns['severity'][position]],
+                'message': messages.get(columns['message'][position]),
+                'line_number': columns['line_number'][position],
+                'column_number': columns['column_number'][position],
+                'suggestion': suggestions.get(columns['suggestion'][position]),
+            }
+            for position in positions
+        ]
+
+    def _load(self) -> None:
+        if self._raw is not None:
+            return
+        raw = zlib.decompress(bytes(self.data))
+        if raw[:4] not in (MAGIC, MAGIC_V1):
+            raise ValueError("Not a packed issues blob")
+        count, = struct.unpack_from('<I', raw, 4)
+        offset = 8
+
+        columns = {}
+        for name, typecode in COLUMNS:
+            column = array(typecode)
+            size = column.itemsize * count
+            column.frombytes(raw[offset:offset + size])
+            if sys.byteorder == 'big':
+                column.byteswap()
+            columns[name] = column
+            offset += size
+
+        tables = []
+        for _ in range(5 if raw[:4] == MAGIC else 4):
+            table = _StringTableView(raw, offset)
+            tables.append(table)
+            offset = table.end
+        if raw[:4] == MAGIC_V1:
+            tables.insert(2, _EmptyStringTable())
+
+        self._count = count
+        self._columns = columns
+        self._tables = tables
+        self._raw = raw
+
+
+class _StringTable:
+    """Interning table of distinct values"""
+
+    def __init__(self):
+        self.strings = []
+        self._indexes = {}
+
+    def index(self, value) -> int:
+        index = self._indexes.get(value)
+        if index is None:
+            index = self._indexes[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+
+class _StringTableView:
+    """String table inside a decompressed blob, decoding entries on access"""
+
+    def __init__(self, raw: bytes, offset: int):
+        count, = struct.unpack_from('<I', raw, offset)
+        self.offsets = array('I')
+        self.offsets.frombytes(raw[offset + 4:offset + 4 + 4 * (count + 1)])
+        if sys.byteorder == 'big':
+            self.offsets.byteswap()
+        self.raw = raw
+        self.start = offset + 4 + 4 * (count + 1)
+        self.end = self.start + self.offsets[-1]
+        self._cache = {}
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def get(self, index: int) -> str:
+        value = self._cache.get(index)
+        if value is None:
+            value = self._cache[index] = self.raw[
+                self.start + self.offsets[index]:self.start + self.offsets[index + 1]
+            ].decode('utf-8')
+        return value
+
+
+class _EmptyStringTable:
+    """Stand-in for a table missing from older blobs, '' at every index"""
+
+    def get(self, index: int) -> str:
+        return ''
+
+
+def _pack_strings(strings: List[str]) -> bytes:
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = array('I', [0])
+    for value in encoded:
+        offsets.append(offsets[-1] + len(value))
+    return struct.pack('<I', len(strings)) + _to_bytes(offsets) + b''.join(encoded)
+
+
+def _to_bytes(column: array) -> bytes:
+    if sys.byteorder == 'big':
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
@@ -0,0 +1,243 @@
+"""
+Timing metrics for the analysis pipeline.
+
+Analysis tasks time each stage of their work (loading the submission, the
+result cache lookup, incremental planning, the tool runs and persisting the
+result) and analyzers record a span per tool command. Both are stored with
+the result and aggregated into Prometheus-style histograms kept in the
+Django cache, so all workers add to the same series. /metrics serves them in
+the Prometheus text format, together with the lane and result cache
+counters, for latency percentiles per language, stage and tool.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Any, Iterable, Tuple
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages timed by the analysis tasks, in order
+STAGES = ('load', 'cache_lookup', 'incremental', 'write_source', 'tools', 'persist')
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Outcomes of a tool run, as recorded in tool spans
+TOOL_STATUSES = ('ok', 'error', 'timeout', 'killed', 'cancelled')
+
+
+class StageTimer:
+    """Wall-clock durations of named pipeline stages"""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, duration: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + duration
+
+    def split(self, parent: str, stages: Dict[str, float]) -> None:
+        """Record stages that ran inside parent and take their time out of it"""
+        for name, duration in stages.items():
+            self.add(name, duration)
+            self.add(parent, -duration)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {name: round(duration, 4) for name, duration in self.stages.items()}
+
+
+class PipelineMetrics:
+    """Histograms and counters of pipeline timings shared through the cache
+
+    Each histogram series keeps one counter per bucket (not cumulative), a
+    count and a sum in milliseconds; they are made cumulative when rendered.
+    Recording is best effort and never fails an analysis.
+    """
+
+    KEY_PREFIX = 'review_metrics'
+
+    def __init__(self, alias: str = 'default', buckets: Iterable[float] = DEFAULT_BUCKETS,
+                 enabled: bool = True):
+        self.alias = alias
+        self.buckets = tuple(sorted(buckets))
+        self.enabled = enabled
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def observe_stages(self, language: str, stages: Dict[str, float]) -> None:
+        """Record the stage durations of one analysis"""
+        for stage, duration in stages.items():
+            self.observe('stage_duration', (stage, language), duration)
+
+    def observe_tools(self, language: str, spans: List[Dict[str, Any]]) -> None:
+        """Record the tool spans of one analysis"""
+        for span in spans:
+            tool = span['tool']
+            self.observe('tool_duration', (tool, language), span['duration'])
+            self._incr(self._key('tool_runs', (tool, language, span['status'])), 1)
+            self._incr(self._key('tool_issues', (tool, language)), span.get('issues', 0))
+
+    def observe(self, metric: str, labels: Tuple[str, ...], value: float) -> None:
+        """Add one observation in seconds to a histogram series"""
+        if not self.enabled:
+            return
+        bucket = next((index for index, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        self._incr(self._key(metric, labels, f"b{bucket}"), 1)
+        self._incr(self._key(metric, labels, 'count'), 1)
+        self._incr(self._key(metric, labels, 'sum_ms'), int(value * 1000))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        from .registry import get_registry
+
+        # Languages added through settings, the database or entry points too
+        registry = get_registry()
+        tool_series = []
+        languages = registry.languages()
+        for language in languages:
+            tools = set()
+            # Spans of the fast analyzer are recorded under the language too
+            for name in {registry.name(language), registry.name(language, fast=True)}:
+                try:
+                    tools.update(registry.tool_names(name))
+                except ValueError:
+                    continue
+            tool_series.extend((tool, language) for tool in sorted(tools))
+
+        lines = []
+        lines += self._render_histogram(
+            'stage_duration', 'Duration of analysis pipeline stages', ('stage', 'language'),
+            [(stage, language) for stage in STAGES for language in languages]
+        )
+        lines += self._render_histogram(
+            'tool_duration', 'Duration of analysis tool runs', ('tool', 'language'),
+            tool_series
+        )
+        lines += self._render_counter(
+            'tool_runs', 'Analysis tool runs by outcome', ('tool', 'language', 'status'),
+            [(tool, language, status) for tool, language in tool_series for status in TOOL_STATUSES]
+        )
+        lines += self._render_counter(
+            'tool_issues', 'Issues reported by analysis tools', ('tool', 'language'),
+            tool_series
+        )
+        lines += self._render_lanes()
+        lines += self._render_result_cache()
+        return '\n'.join(lines) + '\n'
+
+    def _render_histogram(self, metric: str, help_text: str, label_names: Tuple[str, ...],
+                          series: List[Tuple[str, ...]]) -> List[str]:
+        fields = [f"b{index}" for index in range(len(self.buckets) + 1)] + ['count', 'sum_ms']
+        values = self.backend.get_many([self._key(metric, labels, field) for labels in series for field in fields])
+
+        name = f"review_{metric}_seconds"
+        lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for labels in series:
+            count = values.get(self._key(metric, labels, 'count'), 0)
+            if not count:
+                continue
+            label_text = self._labels(label_names, labels)
+            cumulative = 0
+            for index, bound in enumerate(self.buckets):
+                cumulative += values.get(self._key(metric, labels, f"b{index}"), 0)
+                lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{label_text},le="+Inf"}} {count}')
+            lines.append(f"{name}_sum{{{label_text}}} {values.get(self._key(metric, labels, 'sum_ms'), 0) / 1000}")
+            lines.append(f"{name}_count{{{label_text}}} {count}")
+        return lines
+
+    def _render_counter(self, metric: str, help_text: str, label_names: Tuple[str, ...],
+                        series: List[Tuple[str, ...]]) -> List[str]:
+        values = self.backend.get_many([self._key(metric, labels) for labels in series])
+
+        name = f"review_{metric}_total"
+        lines = [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for labels in series:
+            value = values.get(self._key(metric, labels))
+            if value:
+                lines.append(f"{name}{{{self._labels(label_names, labels)}}} {value}")
+        return lines
+
+    def _render_lanes(self) -> List[str]:
+        from .scheduling import get_scheduler
+
+        try:
+            stats = get_scheduler().stats()
+        except Exception as exc:
+            logger.warning(f"Could not read lane stats: {str(exc)}")
+            return []
+
+        gauges = (
+            ('depth', 'Submissions queued and not yet started per lane'),
+            ('avg_wait_seconds', 'Average queue wait per lane'),
+            ('max_wait_seconds', 'Longest queue wait per lane'),
+        )
+        lines = []
+        for field, help_text in gauges:
+            name = f"review_lane_{field}"
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            for lane, lane_stats in stats.items():
+                lines.append(f'{name}{{lane="{lane}"}} {lane_stats[field]}')
+        return lines
+
+    def _render_result_cache(self) -> List[str]:
+        from .result_cache import get_result_cache
+
+        result_cache = get_result_cache()
+        try:
+            stats = result_cache.stats()
+        except Exception as exc:
+            logger.warning(f"Could not read result cache stats: {str(exc)}")
+            return []
+
+        name = 'review_result_cache_events_total'
+        lines = [f"# HELP {name} Result cache lookups and stores", f"# TYPE {name} counter"]
+        for field in result_cache.STATS_FIELDS:
+            lines.append(f'{name}{{event="{field}"}} {stats[field]}')
+        return lines
+
+    def _labels(self, names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+        return ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+
+    def _incr(self, key: str, delta: int) -> None:
+        if not self.enabled or not delta:
+            return
+        try:
+            try:
+                self.backend.incr(key, delta)
+            except ValueError:
+                # First observation of this series; add() loses no race with other workers
+                if not self.backend.add(key, delta, None):
+                    self.backend.incr(key, delta)
+        except Exception as exc:
+            logger.warning(f"Could not update metric {key}: {str(exc)}")
+
+    def _key(self, metric: str, labels: Tuple[str, ...], field: str = None) -> str:
+        key = f"{self.KEY_PREFIX}:{metric}:{'|'.join(labels)}"
+        return f"{key}:{field}" if field else key
+
+
+_metrics = None
+
+
+def get_metrics() -> PipelineMetrics:
+    """Get the process-wide pipeline metrics configured from settings"""
+    global _metrics
+    if _metrics is None:
+        _metrics = PipelineMetrics(
+            alias=getattr(settings, 'REVIEW_METRICS_CACHE_ALIAS', 'default'),
+            buckets=getattr(settings, 'REVIEW_METRICS_BUCKETS', DEFAULT_BUCKETS),
+            enabled=getattr(settings, 'REVIEW_METRICS_ENABLED', True),
+        )
+    return _metrics
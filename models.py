@@ -1,6 +1,9 @@
 from django.db import models
+from django.db.models import F, Q, Case, When, Value, Max, ExpressionWrapper
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 import uuid
+from .issue_storage import PackedIssues
 
 User = get_user_model()
 
@@ -18,6 +21,98 @@ class SupportedLanguage(models.Model):
     def __str__(self):
         return self.name
 
+class SubmissionBatch(models.Model):
+    """A group of submissions created by one bulk upload"""
+    STATUS_CHOICES = [
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+    ]
+    
+    SOURCE_CHOICES = [
+        ('json', 'JSON'),
+        ('multipart', 'Multipart'),
+        ('archive', 'Archive'),
+    ]
+    
+    # 'fast' analyzes with the in-process analyzers only, for very large uploads
+    ANALYSIS_MODE_CHOICES = [
+        ('full', 'Full'),
+        ('fast', 'Fast'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='submission_batches')
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    total_files = models.IntegerField(default=0)
+    skipped_files = models.IntegerField(default=0)
+    analysis_mode = models.CharField(max_length=10, choices=ANALYSIS_MODE_CHOICES, default='full')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='processing')
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'submission_batches'
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Batch {self.id} ({self.total_files} files)"
+    
+    def get_status_counts(self):
+        """Number of the batch's submissions in each status"""
+        counts = {status: 0 for status, _ in CodeSubmission.STATUS_CHOICES}
+        rows = self.submissions.values('status').annotate(count=models.Count('id'))
+        for row in rows:
+            counts[row['status']] = row['count']
+        return counts
+    
+    def update_status(self, counts):
+        """Mark the batch completed once none of its submissions are waiting"""
+        if self.status == 'completed' or counts['pending'] or counts['processing']:
+            return
+        self.status = 'completed'
+        self.completed_at = timezone.now()
+        self.save(update_fields=['status', 'completed_at'])
+
+class ProjectSubmission(models.Model):
+    """A source tree analyzed as a whole; its files are CodeSubmissions"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='projects')
+    name = models.CharField(max_length=255)
+    # Tool config files found in the tree, relative path -> content
+    config_files = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    total_files = models.IntegerField(default=0)
+    shard_count = models.IntegerField(default=0)
+    shards_done = models.IntegerField(default=0)
+    # Project totals, filled in once every shard has finished
+    overall_score = models.FloatField(null=True, blank=True)
+    total_issues = models.IntegerField(default=0)
+    critical_issues = models.IntegerField(default=0)
+    error_issues = models.IntegerField(default=0)
+    warning_issues = models.IntegerField(default=0)
+    info_issues = models.IntegerField(default=0)
+    failed_files = models.IntegerField(default=0)
+    submitted_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'project_submissions'
+        indexes = [
+            models.Index(fields=['user', 'submitted_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.total_files} files)"
+
 class CodeSubmission(models.Model):
     """Code submissions for analysis"""
     STATUS_CHOICES = [
@@ -36,6 +131,15 @@ class CodeSubmission(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     submitted_at = models.DateTimeField(auto_now_add=True)
     processed_at = models.DateTimeField(null=True, blank=True)
+    previous_version = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, null=True, blank=True, related_name='next_versions'
+    )
+    batch = models.ForeignKey(
+        SubmissionBatch, on_delete=models.SET_NULL, null=True, blank=True, related_name='submissions'
+    )
+    project = models.ForeignKey(
+        ProjectSubmission, on_delete=models.CASCADE, null=True, blank=True, related_name='files'
+    )
     
     class Meta:
         db_table = 'code_submissions'
@@ -43,10 +147,22 @@ class CodeSubmission(models.Model):
             models.Index(fields=['user', 'status']),
             models.Index(fields=['submitted_at']),
             models.Index(fields=['language']),
+            models.Index(fields=['user', 'filename']),
         ]
     
     def __str__(self):
         return f"{self.filename} - {self.user.email}"
+    
+    def find_previous_version(self):
+        """Latest earlier analyzed submission of the same file by the same user"""
+        return CodeSubmission.objects.filter(
+            user_id=self.user_id,
+            filename=self.filename,
+            language_id=self.language_id,
+            submitted_at__lt=self.submitted_at,
+            status='completed',
+            result__isnull=False
+        ).exclude(id=self.id).order_by('-submitted_at').first()
 
 class ReviewResult(models.Model):
     """Analysis results for code submissions"""
@@ -57,6 +173,11 @@ class ReviewResult(models.Model):
         ('critical', 'Critical'),
     ]
     
+    ISSUE_STORAGE_CHOICES = [
+        ('relational', 'Relational'),
+        ('compact', 'Compact'),
+    ]
+    
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     submission = models.OneToOneField(CodeSubmission, on_delete=models.CASCADE, related_name='result')
     overall_score = models.FloatField(default=0.0)
@@ -66,6 +187,16 @@ class ReviewResult(models.Model):
     warning_issues = models.IntegerField(default=0)
     info_issues = models.IntegerField(default=0)
     analysis_duration = models.FloatField(default=0.0)  # in seconds
+    # Number of incremental analyses since the last full one (0 = full analysis)
+    incremental_depth = models.PositiveSmallIntegerField(default=0)
+    # Per-stage durations and per-tool spans of the analysis, see metrics.py
+    stage_timings = models.JSONField(default=dict, blank=True)
+    # Tools whose issues are included; any others failed or were stopped
+    tools = models.JSONField(default=list, blank=True)
+    # First-pass result of the fast analyzer, replaced by the final one
+    is_provisional = models.BooleanField(default=False)
+    # 'compact' results keep their issues in CompactIssues, not in Issue rows
+    issue_storage = models.CharField(max_length=20, choices=ISSUE_STORAGE_CHOICES, default='relational')
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -77,6 +208,70 @@ class ReviewResult(models.Model):
     
     def __str__(self):
         return f"Result for {self.submission.filename}"
+    
+    def get_issue_dicts(self):
+        """Issues in the dict shape produced by the analyzers"""
+        if self.issue_storage == 'compact':
+            return self.compact_issues.unpack().issues()
+        return [
+            {
+                'tool': row.pop('rule__tool'),
+                'rule_id': row.pop('rule__rule_id'),
+                'rule_name': row.pop('rule__name'),
+                **row
+            }
+            for row in self.issues.values('rule__tool', 'rule__rule_id', 'rule__name', *Issue.DATA_FIELDS)
+        ]
+
+class CompactIssues(models.Model):
+    """All issues of a large result packed into one blob, see issue_storage.py"""
+    result = models.OneToOneField(
+        ReviewResult, on_delete=models.CASCADE, primary_key=True, related_name='compact_issues'
+    )
+    data = models.BinaryField()
+    issue_count = models.IntegerField(default=0)
+    
+    class Meta:
+        db_table = 'compact_issues'
+    
+    def __str__(self):
+        return f"{self.issue_count} packed issues of result {self.result_id}"
+    
+    def unpack(self):
+        """Lazily decoded view of the issues"""
+        return PackedIssues(self.data)
+
+class Rule(models.Model):
+    """Catalog entry for a rule reported by an analysis tool
+    
+    Issues reference their rule by this small integer key instead of
+    repeating its id and name on every row. Entries are added as tools
+    report new rules, see rules.py.
+    """
+    SEVERITY_CHOICES = [
+        ('info', 'Info'),
+        ('warning', 'Warning'),
+        ('error', 'Error'),
+        ('critical', 'Critical'),
+    ]
+    
+    id = models.AutoField(primary_key=True)
+    tool = models.CharField(max_length=50)
+    rule_id = models.CharField(max_length=100)
+    name = models.CharField(max_length=200)
+    # Severity of the first issue reported for the rule
+    default_severity = models.CharField(max_length=20, choices=SEVERITY_CHOICES)
+    docs_url = models.URLField(max_length=500, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'rules'
+        constraints = [
+            models.UniqueConstraint(fields=['tool', 'rule_id'], name='unique_tool_rule'),
+        ]
+    
+    def __str__(self):
+        return f"{self.tool} {self.rule_id} ({self.name})"
 
 class Issue(models.Model):
     """Individual issues found in code analysis"""
@@ -89,29 +284,51 @@ class Issue(models.Model):
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     result = models.ForeignKey(ReviewResult, on_delete=models.CASCADE, related_name='issues')
-    rule_id = models.CharField(max_length=100)
-    rule_name = models.CharField(max_length=200)
+    rule = models.ForeignKey(Rule, on_delete=models.PROTECT, related_name='issues')
     severity = models.CharField(max_length=20, choices=SEVERITY_CHOICES)
     message = models.TextField()
     line_number = models.IntegerField()
     column_number = models.IntegerField(default=0)
     suggestion = models.TextField(blank=True)
     
+    # Fields carried by analyzer issue dicts besides the rule's tool, id and name
+    DATA_FIELDS = (
+        'severity', 'message', 'line_number', 'column_number', 'suggestion'
+    )
+    
     class Meta:
         db_table = 'issues'
         indexes = [
             models.Index(fields=['result', 'severity']),
-            models.Index(fields=['rule_id']),
         ]
     
     def __str__(self):
-        return f"{self.rule_name} - Line {self.line_number}"
+        return f"{self.rule.name} - Line {self.line_number}"
+    
+    @classmethod
+    def from_dict(cls, result, issue_data, rule):
+        """Unsaved issue of a result from an analyzer issue dict and its rule"""
+        return cls(
+            result=result,
+            rule=rule,
+            severity=issue_data['severity'],
+            message=issue_data['message'],
+            line_number=issue_data['line_number'],
+            column_number=issue_data.get('column_number', 0),
+            suggestion=issue_data.get('suggestion') or ''
+        )
 
 class UserStats(models.Model):
-    """Aggregated statistics for users"""
+    """Aggregated statistics for users
+    
+    Maintained as running totals: every ReviewResult created or deleted
+    applies a delta (see signals.py), and update_user_stats /
+    reconcile_user_stats recompute them from scratch to correct drift.
+    """
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='stats')
     total_submissions = models.IntegerField(default=0)
     total_issues_found = models.IntegerField(default=0)
+    score_sum = models.FloatField(default=0.0)
     average_score = models.FloatField(default=0.0)
     last_submission = models.DateTimeField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -121,3 +338,141 @@ class UserStats(models.Model):
     
     def __str__(self):
         return f"Stats for {self.user.email}"
+    
+    @classmethod
+    def apply_result_delta(cls, user_id, sign, score, issues, submitted_at, submission_id=None):
+        """Add (sign=1) or remove (sign=-1) one result from a user's totals"""
+        if sign > 0:
+            cls.objects.get_or_create(user_id=user_id)
+        
+        stats = cls.objects.filter(user_id=user_id)
+        cls._add_totals(stats, sign, sign * score, sign * issues)
+        
+        if sign > 0:
+            stats.filter(
+                Q(last_submission__isnull=True) | Q(last_submission__lt=submitted_at)
+            ).update(last_submission=submitted_at)
+        elif stats.filter(last_submission=submitted_at).exists():
+            # The latest submission went away; look up the new latest one
+            cls._refresh_last_submission(stats, user_id, submission_id)
+    
+    @classmethod
+    def remove_results(cls, user_id, count, score_sum, issues, last_submitted_at):
+        """Take many deleted results out of a user's totals in one update
+        
+        last_submitted_at is the latest submission time among them. Call it
+        once the results are gone, as deletes that bypass the signals do.
+        """
+        stats = cls.objects.filter(user_id=user_id)
+        cls._add_totals(stats, -count, -score_sum, -issues)
+        if stats.filter(last_submission__lte=last_submitted_at).exists():
+            cls._refresh_last_submission(stats, user_id)
+    
+    @classmethod
+    def _add_totals(cls, stats, count, score_sum, issues):
+        stats.update(
+            total_submissions=F('total_submissions') + count,
+            score_sum=F('score_sum') + score_sum,
+            total_issues_found=F('total_issues_found') + issues,
+            updated_at=timezone.now()
+        )
+        stats.update(
+            average_score=Case(
+                When(total_submissions__gt=0, then=ExpressionWrapper(
+                    F('score_sum') / F('total_submissions'),
+                    output_field=models.FloatField()
+                )),
+                default=Value(0.0),
+                output_field=models.FloatField()
+            )
+        )
+    
+    @classmethod
+    def _refresh_last_submission(cls, stats, user_id, exclude_id=None):
+        latest = CodeSubmission.objects.filter(
+            user_id=user_id,
+            status='completed',
+            result__isnull=False
+        ).exclude(id=exclude_id).aggregate(latest=Max('submitted_at'))['latest']
+        stats.update(last_submission=latest)
+
+class RetentionPolicy(models.Model):
+    """How long finished submissions of a user and/or language are kept
+    
+    The most specific policy applies: user and language, then user, then
+    language. A policy with neither sets the default, which is otherwise
+    REVIEW_RETENTION_DAYS. A null retention_days keeps them forever.
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, null=True, blank=True, related_name='retention_policies'
+    )
+    language = models.ForeignKey(SupportedLanguage, on_delete=models.CASCADE, null=True, blank=True)
+    retention_days = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'retention_policies'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'language'], name='unique_retention_policy'),
+        ]
+    
+    def __str__(self):
+        days = 'forever' if self.retention_days is None else f"{self.retention_days} days"
+        return f"Retention for {self.user or 'everyone'} / {self.language or 'all languages'}: {days}"
+
+class ResultRollup(models.Model):
+    """Results and issue totals of one user and language per hour or day
+    
+    Updated as results are saved and deleted, see rollups.py.
+    """
+    GRANULARITY_CHOICES = [
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='result_rollups')
+    language = models.ForeignKey(SupportedLanguage, on_delete=models.CASCADE, related_name='result_rollups')
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES)
+    period_start = models.DateTimeField()
+    results = models.IntegerField(default=0)
+    score_sum = models.FloatField(default=0.0)
+    total_issues = models.IntegerField(default=0)
+    critical_issues = models.IntegerField(default=0)
+    error_issues = models.IntegerField(default=0)
+    warning_issues = models.IntegerField(default=0)
+    info_issues = models.IntegerField(default=0)
+    analysis_duration_sum = models.FloatField(default=0.0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'result_rollups'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'granularity', 'period_start', 'language'],
+                name='unique_result_rollup'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} {self.language_id} {self.granularity} {self.period_start}"
+
+class RuleRollup(models.Model):
+    """Issues of one rule found for a user and language per hour or day"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='rule_rollups')
+    language = models.ForeignKey(SupportedLanguage, on_delete=models.CASCADE, related_name='rule_rollups')
+    rule = models.ForeignKey(Rule, on_delete=models.PROTECT, related_name='rollups')
+    granularity = models.CharField(max_length=10, choices=ResultRollup.GRANULARITY_CHOICES)
+    period_start = models.DateTimeField()
+    issues = models.IntegerField(default=0)
+    
+    class Meta:
+        db_table = 'rule_rollups'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'granularity', 'period_start', 'language', 'rule'],
+                name='unique_rule_rollup'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} {self.language_id} {self.rule_id} {self.granularity} {self.period_start}"
@@ -0,0 +1,146 @@
+"""
+Sanitizing of tool configs uploaded with projects.
+
+Uploaded configs are written into the lint tree, so anything in them that
+makes a tool import or run code would run it on the worker. Only
+declarative formats are accepted, and the options that load code are
+removed:
+  INI files (.pylintrc, pylintrc, setup.cfg, tox.ini, .flake8, .bandit) are
+    parsed and rewritten without init-hook, load-plugins, the C extension
+    options and flake8's local-plugins sections.
+  pyproject.toml is kept only if none of its tool tables sets such an option;
+    without a TOML parser it is ignored.
+  ESLint configs in JSON (and YAML, when PyYAML is installed) are rewritten as
+    JSON without plugins, parser, processor and shareable configs. Configs
+    that are JavaScript (.eslintrc.js, eslint.config.js, ...) are ignored.
+"""
+import configparser
+import io
+import json
+import posixpath
+from typing import Dict, Any, Optional
+
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+INI_CONFIGS = {'.pylintrc', 'pylintrc', 'setup.cfg', 'tox.ini', '.flake8', '.bandit'}
+
+# Options that make pylint import modules, in their normalized spelling
+UNSAFE_OPTIONS = {
+    'init-hook', 'load-plugins', 'extension-pkg-allow-list', 'extension-pkg-whitelist',
+    'unsafe-load-any-extension',
+}
+
+# flake8 sections that import plugin modules from the project
+UNSAFE_SECTIONS = {'flake8:local-plugins', 'flake8.local-plugins'}
+
+ESLINT_CONFIGS = {'.eslintrc', '.eslintrc.json', '.eslintrc.yml', '.eslintrc.yaml'}
+
+# ESLint keys that load modules by name
+ESLINT_UNSAFE_KEYS = {'plugins', 'parser', 'processor'}
+
+
+def sanitize_config(path: str, content: str) -> Optional[str]:
+    """Safe content for an uploaded config, or None if it must be ignored"""
+    name = posixpath.basename(path)
+    try:
+        if name in INI_CONFIGS:
+            return _sanitize_ini(content)
+        if name == 'pyproject.toml':
+            return _check_pyproject(content)
+        if name in ESLINT_CONFIGS:
+            return _sanitize_eslintrc(content)
+        if name == 'package.json':
+            return _sanitize_package_json(content)
+    except (ValueError, configparser.Error):
+        # Configs the tools would fail to parse anyway
+        return None
+    return None
+
+
+def _normalize(option: str) -> str:
+    return option.strip().lower().replace('_', '-')
+
+
+def _sanitize_ini(content: str) -> str:
+    parser = configparser.RawConfigParser(interpolation=None, strict=False, allow_no_value=True)
+    parser.optionxform = str
+    parser.read_string(content)
+    defaults = parser[parser.default_section]
+    for option in list(defaults):
+        if _normalize(option) in UNSAFE_OPTIONS:
+            del defaults[option]
+    for section in parser.sections():
+        if _normalize(section) in UNSAFE_SECTIONS:
+            parser.remove_section(section)
+            continue
+        for option in parser.options(section):
+            if _normalize(option) in UNSAFE_OPTIONS:
+                parser.remove_option(section, option)
+    output = io.StringIO()
+    parser.write(output)
+    return output.getvalue()
+
+
+def _check_pyproject(content: str) -> Optional[str]:
+    if tomllib is None:
+        return None
+    tools = tomllib.loads(content).get('tool', {})
+    return None if _has_unsafe_option(tools) else content
+
+
+def _has_unsafe_option(table: Dict[str, Any]) -> bool:
+    for key, value in table.items():
+        if _normalize(key) in UNSAFE_OPTIONS or _normalize(key) in UNSAFE_SECTIONS:
+            return True
+        if isinstance(value, dict) and _has_unsafe_option(value):
+            return True
+    return False
+
+
+def _sanitize_eslintrc(content: str) -> Optional[str]:
+    try:
+        config = json.loads(content)
+    except ValueError:
+        if yaml is None:
+            return None
+        try:
+            config = yaml.safe_load(content)
+        except yaml.YAMLError as exc:
+            raise ValueError(str(exc))
+    if not isinstance(config, dict):
+        return None
+    # JSON is valid YAML, so the .yml/.yaml names keep working
+    return json.dumps(_sanitize_eslint_config(config), indent=2)
+
+
+def _sanitize_package_json(content: str) -> Optional[str]:
+    package = json.loads(content)
+    if not isinstance(package, dict) or not isinstance(package.get('eslintConfig'), dict):
+        return None
+    # Only the ESLint section matters for linting
+    return json.dumps({'eslintConfig': _sanitize_eslint_config(package['eslintConfig'])}, indent=2)
+
+
+def _sanitize_eslint_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    config = {key: value for key, value in config.items() if key not in ESLINT_UNSAFE_KEYS}
+    if 'extends' in config:
+        extends = config['extends']
+        extends = [extends] if isinstance(extends, str) else extends
+        # Only ESLint's built-in configs; others are modules
+        config['extends'] = [
+            name for name in (extends if isinstance(extends, list) else [])
+            if isinstance(name, str) and name.startswith('eslint:')
+        ]
+    if isinstance(config.get('overrides'), list):
+        config['overrides'] = [
+            _sanitize_eslint_config(override) for override in config['overrides'] if isinstance(override, dict)
+        ]
+    return config
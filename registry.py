@@ -0,0 +1,266 @@
+"""
+Analyzer registry.
+
+The analyzer of a language is resolved, in order, from the REVIEW_ANALYZERS
+setting, the language's SupportedLanguage.analyzer_class, the
+'reviews.analyzers' entry point group and the built-in ANALYZERS. Settings
+and the database hold dotted class paths; several comma-separated paths (or
+a list in settings) make a CompositeAnalyzer that runs all of them. Classes
+are imported on first use, so a worker only loads the analyzers of the
+languages it actually analyzes, and a language whose analyzer is installed
+as a package can be added with a database row instead of a deploy.
+
+Analyzer instances are cached per worker thread and reused by later tasks.
+Saving or deleting a SupportedLanguage bumps a generation counter in the
+Django cache; every process compares it on the next get() and resolves its
+classes again, so analyzer_class changes apply without a worker restart.
+REVIEW_DISABLED_TOOLS turns off single tools per language.
+"""
+import logging
+import threading
+from importlib import import_module, metadata
+from typing import Dict, Iterable, List, Any, Optional, Union
+from django.conf import settings
+from django.core.cache import caches
+from .analyzers import ANALYZERS, FAST_ANALYZERS, BaseAnalyzer, CompositeAnalyzer, default_temp_dir
+from .engines import get_engine
+from .models import SupportedLanguage
+
+logger = logging.getLogger(__name__)
+
+# Entry point group under which packages register analyzers by language name
+ENTRY_POINT_GROUP = 'reviews.analyzers'
+
+
+def get_analyzer_options(language: str) -> Dict[str, Any]:
+    """Analyzer constructor options configured in settings"""
+    engine_name = getattr(settings, 'REVIEW_ANALYZER_ENGINES', {}).get(language)
+    engine_options = getattr(settings, 'REVIEW_ENGINE_OPTIONS', {}).get(engine_name, {})
+    return {
+        'concurrent': getattr(settings, 'REVIEW_CONCURRENT_TOOLS', True),
+        'tool_timeouts': getattr(settings, 'REVIEW_TOOL_TIMEOUTS', None),
+        'timeout_profiles': getattr(settings, 'REVIEW_TOOL_TIMEOUT_PROFILES', None),
+        'memory_limits': getattr(settings, 'REVIEW_TOOL_MEMORY_LIMITS', None),
+        'engine': get_engine(engine_name, **engine_options),
+        'source_mode': getattr(settings, 'REVIEW_SOURCE_MODE', 'stdin'),
+        'temp_dir': get_temp_dir(),
+        'disabled_tools': getattr(settings, 'REVIEW_DISABLED_TOOLS', {}).get(language),
+    }
+
+
+def get_temp_dir() -> Optional[str]:
+    """Directory for analysis temp files, memory-backed where available"""
+    return getattr(settings, 'REVIEW_TEMP_DIR', None) or default_temp_dir()
+
+
+class AnalyzerRegistry:
+    """Resolves the analyzer classes of languages and caches their instances"""
+
+    GENERATION_KEY = 'analyzer_registry_generation'
+
+    def __init__(self, overrides: Dict[str, Union[str, List[str]]] = None, use_database: bool = True,
+                 alias: str = 'default'):
+        self.overrides = {name.lower(): paths for name, paths in (overrides or {}).items()}
+        self.use_database = use_database
+        self.alias = alias
+        self._classes = {}
+        self._entry_points = None
+        self._generation = 0
+        self._shared_generation = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def get(self, language: str, fast: bool = False) -> BaseAnalyzer:
+        """Analyzer for a language, reused by later calls in the same thread
+
+        The instance is created with the options from settings on first use
+        and released of the previous caller's state on every later call.
+        """
+        name = self.name(language, fast)
+        self._sync()
+        if getattr(self._local, 'generation', None) != self._generation:
+            self._local.generation = self._generation
+            self._local.instances = {}
+
+        analyzer = self._local.instances.get(name)
+        if analyzer is None:
+            analyzer = self.create(name, **get_analyzer_options(language.lower()))
+            self._local.instances[name] = analyzer
+        else:
+            analyzer.release()
+        return analyzer
+
+    def name(self, language: str, fast: bool = False) -> str:
+        """Registry name of a language's analyzer"""
+        language = language.lower()
+        if fast:
+            return FAST_ANALYZERS.get(language, language)
+        return language
+
+    def create(self, name: str, **options) -> BaseAnalyzer:
+        """New analyzer instance for a registry name"""
+        classes = self.classes(name)
+        if len(classes) == 1:
+            return classes[0](**options)
+        return CompositeAnalyzer(classes, **options)
+
+    def classes(self, name: str) -> List[type]:
+        """Analyzer classes of a registry name, imported on first use"""
+        name = name.lower()
+        classes = self._classes.get(name)
+        if classes is None:
+            classes = self._resolve(name)
+            with self._lock:
+                self._classes[name] = classes
+        return classes
+
+    def tool_names(self, name: str) -> List[str]:
+        """Tools the analyzer of a registry name runs"""
+        return [tool for analyzer_class in self.classes(name) for tool in analyzer_class.tool_versions]
+
+    def config_readers(self, names: Iterable[str]) -> Dict[str, List[type]]:
+        """Config file name -> analyzer classes of the given registry names that read it
+
+        Names whose analyzer can't be resolved are left out.
+        """
+        readers = {}
+        for name in names:
+            try:
+                classes = self.classes(name)
+            except ValueError as exc:
+                logger.warning(f"No config files for {name}: {str(exc)}")
+                continue
+            for analyzer_class in classes:
+                for config_name in analyzer_class.config_files:
+                    if analyzer_class not in readers.setdefault(config_name, []):
+                        readers[config_name].append(analyzer_class)
+        return readers
+
+    def clear(self) -> None:
+        """Forget resolved classes and cached instances, e.g. after a language changed
+
+        Other threads drop their instances on their next get().
+        """
+        with self._lock:
+            self._classes = {}
+            self._entry_points = None
+            self._generation += 1
+
+    def invalidate(self) -> None:
+        """Make every process resolve its analyzers again, e.g. after a language changed"""
+        if self.use_database:
+            backend = caches[self.alias]
+            try:
+                backend.add(self.GENERATION_KEY, 0, None)
+                backend.incr(self.GENERATION_KEY)
+            except ValueError:
+                # Counter was evicted between add() and incr()
+                backend.set(self.GENERATION_KEY, 1, None)
+        self.clear()
+
+    def languages(self) -> List[str]:
+        """Registry names of every language with a configured or built-in analyzer"""
+        names = set(self.overrides) | set(ANALYZERS)
+        if self.use_database:
+            names.update(name.lower() for name in SupportedLanguage.objects.values_list('name', flat=True))
+        names.update(self._load_entry_points())
+        return sorted(names - set(FAST_ANALYZERS.values()))
+
+    def _sync(self) -> None:
+        """Clear the resolved classes when another process invalidated them"""
+        if not self.use_database:
+            return
+        try:
+            generation = caches[self.alias].get(self.GENERATION_KEY)
+        except Exception as exc:
+            # The classes resolved so far stay in use
+            logger.warning(f"Could not check the analyzer registry generation: {str(exc)}")
+            return
+        if generation != self._shared_generation:
+            self._shared_generation = generation
+            self.clear()
+
+    def _resolve(self, name: str) -> List[type]:
+        paths = self.overrides.get(name)
+        if paths is not None:
+            return self._import_all(paths)
+
+        if self.use_database:
+            path = (
+                SupportedLanguage.objects.filter(name__iexact=name)
+                .values_list('analyzer_class', flat=True).first()
+            )
+            if path:
+                try:
+                    return self._import_all(path)
+                except ValueError as exc:
+                    # Rows may name analyzers that were never installed here
+                    logger.warning(f"Ignoring analyzer_class of {name}: {str(exc)}")
+
+        entry_point = self._entry_point(name)
+        if entry_point is not None:
+            try:
+                return [self._check(entry_point.load(), entry_point.value)]
+            except ImportError as exc:
+                raise ValueError(f"Cannot import analyzer {entry_point.value}: {str(exc)}")
+
+        analyzer_class = ANALYZERS.get(name)
+        if analyzer_class is None:
+            raise ValueError(f"No analyzer available for language: {name}")
+        return [analyzer_class]
+
+    def _import_all(self, paths: Union[str, List[str]]) -> List[type]:
+        if isinstance(paths, str):
+            paths = paths.split(',')
+        paths = [path.strip() for path in paths if path.strip()]
+        if not paths:
+            raise ValueError("No analyzer class path given")
+        return [self._import(path) for path in paths]
+
+    def _import(self, path: str) -> type:
+        module_path, _, class_name = path.rpartition('.')
+        if not module_path:
+            raise ValueError(f"Not a dotted class path: {path}")
+        try:
+            analyzer_class = getattr(import_module(module_path), class_name)
+        except (ImportError, AttributeError) as exc:
+            raise ValueError(f"Cannot import analyzer {path}: {str(exc)}")
+        return self._check(analyzer_class, path)
+
+    def _check(self, analyzer_class: Any, path: str) -> type:
+        if not isinstance(analyzer_class, type) or not issubclass(analyzer_class, BaseAnalyzer):
+            raise ValueError(f"{path} is not an analyzer class")
+        return analyzer_class
+
+    def _entry_point(self, name: str):
+        return self._load_entry_points().get(name)
+
+    def _load_entry_points(self) -> Dict[str, Any]:
+        if self._entry_points is None:
+            try:
+                points = metadata.entry_points(group=ENTRY_POINT_GROUP)
+            except TypeError:
+                # Python < 3.10 returns a dict of groups
+                points = metadata.entry_points().get(ENTRY_POINT_GROUP, [])
+            self._entry_points = {point.name.lower(): point for point in points}
+        return self._entry_points
+
+
+_registry = None
+
+
+def get_registry() -> AnalyzerRegistry:
+    """Get the process-wide analyzer registry configured from settings"""
+    global _registry
+    if _registry is None:
+        _registry = AnalyzerRegistry(
+            overrides=getattr(settings, 'REVIEW_ANALYZERS', None),
+            use_database=getattr(settings, 'REVIEW_ANALYZERS_FROM_DATABASE', True),
+            alias=getattr(settings, 'REVIEW_REGISTRY_CACHE_ALIAS', 'default'),
+        )
+    return _registry
+
+
+def get_analyzer(language: str, fast: bool = False) -> BaseAnalyzer:
+    """Analyzer for a language from the registry, reused within this thread"""
+    return get_registry().get(language, fast)
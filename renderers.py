@@ -0,0 +1,53 @@
+import json
+from rest_framework.renderers import BaseRenderer
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Render submission events as Server-Sent Events"""
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Non-streamed responses (e.g. 404s) are sent as a single error event
+        return self.frame({'event': 'error', 'data': data}).encode(self.charset)
+
+    def frame(self, event):
+        lines = []
+        if event.get('id') is not None:
+            lines.append(f"id: {event['id']}")
+        lines.append(f"event: {event['event']}")
+        lines.append(f"data: {json.dumps(event['data'], default=str)}")
+        return '\n'.join(lines) + '\n\n'
+
+    def keepalive(self):
+        return ': keepalive\n\n'
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Render submission events as newline-delimited JSON"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return self.frame({'event': 'error', 'data': data}).encode(self.charset)
+
+    def frame(self, event):
+        return json.dumps(event, default=str) + '\n'
+
+    def keepalive(self):
+        return json.dumps({'event': 'keepalive'}) + '\n'
+
+
+class PrometheusRenderer(BaseRenderer):
+    """Render metrics in the Prometheus text exposition format"""
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, str):
+            return data.encode(self.charset)
+        # Errors such as failed authentication
+        return ''.join(f"# {key}: {value}\n" for key, value in data.items()).encode(self.charset)
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import uuid
+from typing import Dict, Any, Iterable, Optional, Tuple
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+def payload_etag(data: Any) -> str:
+    """Strong ETag of a JSON payload"""
+    payload = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder)
+    return f'"{hashlib.sha256(payload.encode()).hexdigest()[:32]}"'
+
+
+class SubmissionResponseCache:
+    """Serialized API payloads of submissions, kept until the submission changes
+
+    Each submission has a version token, and its payloads are stored under
+    keys that include it. invalidate() replaces the token, which orphans
+    every payload cached before. Views read the token before they read the
+    database, so a payload built from rows that changed meanwhile is stored
+    under the old token and never served. Payloads of submissions still in
+    progress expire after pending_timeout as a safety net.
+    """
+
+    KEY_PREFIX = 'submission_response'
+    VERSION_KEY_PREFIX = 'submission_response_version'
+
+    def __init__(self, alias: str = 'default', timeout: int = 3600, pending_timeout: int = 60,
+                 enabled: bool = True):
+        self.alias = alias
+        self.timeout = timeout
+        self.pending_timeout = pending_timeout
+        self.enabled = enabled
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def get(self, submission_id, view: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """(cached entry or None, version token to pass to set())"""
+        if not self.enabled:
+            return None, None
+        version = self.backend.get(self._version_key(submission_id))
+        if version is None:
+            return None, None
+        return self.backend.get(self._key(submission_id, view, version)), version
+
+    def set(self, submission_id, view: str, version: Optional[str], user_id, data: Dict[str, Any],
+            final: bool) -> Dict[str, Any]:
+        """Entry for a freshly serialized payload, cached if still current
+
+        version is the token get() returned before the payload was read.
+        """
+        entry = {'user_id': user_id, 'etag': payload_etag(data), 'data': data}
+        if not self.enabled:
+            return entry
+        if version is None:
+            # First payload of this submission; lose to a concurrent invalidate()
+            version = uuid.uuid4().hex
+            if not self.backend.add(self._version_key(submission_id), version, self.timeout):
+                return entry
+        self.backend.set(
+            self._key(submission_id, view, version),
+            entry,
+            self.timeout if final else self.pending_timeout
+        )
+        return entry
+
+    def invalidate(self, submission_ids: Iterable) -> None:
+        """Stop serving the cached payloads of changed submissions"""
+        if not self.enabled:
+            return
+        self.backend.set_many(
+            {self._version_key(submission_id): uuid.uuid4().hex for submission_id in submission_ids},
+            self.timeout
+        )
+
+    def _version_key(self, submission_id) -> str:
+        return f"{self.VERSION_KEY_PREFIX}:{submission_id}"
+
+    def _key(self, submission_id, view: str, version: str) -> str:
+        return f"{self.KEY_PREFIX}:{view}:{submission_id}:{version}"
+
+
+_response_cache = None
+
+
+def get_response_cache() -> SubmissionResponseCache:
+    """Get the process-wide submission response cache configured from settings"""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = SubmissionResponseCache(
+            alias=getattr(settings, 'REVIEW_RESPONSE_CACHE_ALIAS', 'default'),
+            timeout=getattr(settings, 'REVIEW_RESPONSE_CACHE_TIMEOUT', 3600),
+            pending_timeout=getattr(settings, 'REVIEW_RESPONSE_CACHE_PENDING_TIMEOUT', 60),
+            enabled=getattr(settings, 'REVIEW_RESPONSE_CACHE_ENABLED', True),
+        )
+    return _response_cache
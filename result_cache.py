@@ -0,0 +1,187 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from django.conf import settings
+from django.core.cache import caches
+
+
+class ResultCache:
+    """Content-addressed cache of analyzer results
+
+    Results are keyed on a digest of the source, the language and the
+    analyzer fingerprint (tool versions and configuration), so a hit is only
+    possible when re-running the tools would produce the same output. A small
+    in-process LRU/TTL layer sits in front of a Django cache alias, which can
+    be any configured backend (Redis, memcached or the on-disk FileBasedCache).
+    """
+
+    KEY_PREFIX = 'review_result'
+    STATS_KEY_PREFIX = 'review_result_cache_stats'
+    STATS_FIELDS = ('local_hits', 'shared_hits', 'misses', 'stores', 'evictions')
+
+    def __init__(self, alias: str = 'default', timeout: int = 86400,
+                 local_max_entries: int = 256, local_ttl: int = 300,
+                 enabled: bool = True):
+        self.alias = alias
+        self.timeout = timeout
+        self.local_max_entries = local_max_entries
+        self.local_ttl = local_ttl
+        self.enabled = enabled
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def make_key(self, code_content: str, language: str, analyzer) -> str:
+        """Build the cache key for a submission analyzed by the given analyzer"""
+        digest = hashlib.sha256()
+        digest.update(language.lower().encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(json.dumps(analyzer.get_fingerprint(), sort_keys=True).encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(code_content.encode('utf-8'))
+        return f"{self.KEY_PREFIX}:{digest.hexdigest()}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached analysis result for key, or None on a miss"""
+        if not self.enabled:
+            return None
+
+        value = self._get_local(key)
+        if value is not None:
+            self._incr('local_hits')
+            return value
+
+        value = self.backend.get(key)
+        if value is not None:
+            self._set_local(key, value)
+            self._incr('shared_hits')
+            return value
+
+        self._incr('misses')
+        return None
+
+    def set(self, key: str, analysis_result: Dict[str, Any]) -> None:
+        """Store an analysis result in both cache layers"""
+        if not self.enabled:
+            return
+        self.backend.set(key, analysis_result, self.timeout)
+        self._set_local(key, analysis_result)
+        self._incr('stores')
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters aggregated across all workers"""
+        keys = [f"{self.STATS_KEY_PREFIX}:{field}" for field in self.STATS_FIELDS]
+        values = self.backend.get_many(keys)
+        stats = {
+            field: values.get(key, 0)
+            for field, key in zip(self.STATS_FIELDS, keys)
+        }
+        lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+        hits = stats['local_hits'] + stats['shared_hits']
+        stats['hit_ratio'] = round(hits / lookups, 4) if lookups else 0.0
+        stats['local_entries'] = len(self._local)
+        stats['enabled'] = self.enabled
+        return stats
+
+    def _get_local(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return value
+
+    def _set_local(self, key: str, value: Dict[str, Any]) -> None:
+        if self.local_max_entries <= 0:
+            return
+        evicted = 0
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.local_ttl, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_max_entries:
+                self._local.popitem(last=False)
+                evicted += 1
+        if evicted:
+            self._incr('evictions', evicted)
+
+    def _incr(self, field: str, delta: int = 1) -> None:
+        key = f"{self.STATS_KEY_PREFIX}:{field}"
+        try:
+            self.backend.add(key, 0, None)
+            self.backend.incr(key, delta)
+        except ValueError:
+            # Counter was evicted between add() and incr()
+            self.backend.set(key, delta, None)
+
+
+class ToolCheckpoints:
+    """Parsed output of single tools, kept while an analysis is retried
+
+    Checkpoints are keyed on the result cache key, so they only apply to the
+    same source analyzed with the same tool versions and configuration. A
+    retried analysis reuses them and only reruns the tools that failed.
+    """
+
+    KEY_PREFIX = 'review_checkpoint'
+
+    def __init__(self, alias: str = 'default', timeout: int = 3600):
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def get(self, cache_key: str, tools) -> Dict[str, Any]:
+        """Stored issues of the given tools, for those that have a checkpoint"""
+        keys = {self._key(cache_key, tool): tool for tool in tools}
+        found = self.backend.get_many(list(keys))
+        return {keys[key]: issues for key, issues in found.items()}
+
+    def set(self, cache_key: str, tool: str, issues) -> None:
+        self.backend.set(self._key(cache_key, tool), issues, self.timeout)
+
+    def clear(self, cache_key: str, tools) -> None:
+        self.backend.delete_many([self._key(cache_key, tool) for tool in tools])
+
+    def _key(self, cache_key: str, tool: str) -> str:
+        return f"{self.KEY_PREFIX}:{cache_key}:{tool}"
+
+
+_result_cache = None
+_tool_checkpoints = None
+
+
+def get_result_cache() -> ResultCache:
+    """Get the process-wide result cache configured from settings"""
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = ResultCache(
+            alias=getattr(settings, 'REVIEW_RESULT_CACHE_ALIAS', 'default'),
+            timeout=getattr(settings, 'REVIEW_RESULT_CACHE_TIMEOUT', 86400),
+            local_max_entries=getattr(settings, 'REVIEW_RESULT_CACHE_LOCAL_SIZE', 256),
+            local_ttl=getattr(settings, 'REVIEW_RESULT_CACHE_LOCAL_TTL', 300),
+            enabled=getattr(settings, 'REVIEW_RESULT_CACHE_ENABLED', True),
+        )
+    return _result_cache
+
+
+def get_tool_checkpoints() -> ToolCheckpoints:
+    """Get the process-wide tool checkpoint store configured from settings"""
+    global _tool_checkpoints
+    if _tool_checkpoints is None:
+        _tool_checkpoints = ToolCheckpoints(
+            alias=getattr(settings, 'REVIEW_RESULT_CACHE_ALIAS', 'default'),
+            timeout=getattr(settings, 'REVIEW_CHECKPOINT_TIMEOUT', 3600),
+        )
+    return _tool_checkpoints
@@ -0,0 +1,195 @@
+"""
+Retention of finished submissions.
+
+Expired submissions are deleted in chunks of REVIEW_RETENTION_CHUNK_SIZE,
+walked by keyset over (submitted_at, id) so no chunk rescans the rows
+before it, and each chunk is deleted in a short transaction of its own.
+Issues have no relations or signals of their own, so Django deletes them
+with single DELETE statements. Results and submissions are removed with
+plain DELETE statements too, rather than through Django's cascade collector,
+which loads every row into memory and runs the result signals. What the
+collector and the signals would have done is done explicitly: later
+versions lose their previous_version link and the owners' UserStats drop
+the deleted results. The analytics rollups keep them on purpose.
+
+Retention periods come from RetentionPolicy rows per user and/or language.
+REVIEW_RETENTION_CHUNK_DELAY pauses between chunks to leave room for other
+writers, and REVIEW_RETENTION_MAX_DURATION bounds one run; the next run
+carries on where it stopped.
+"""
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+from .models import CodeSubmission, CompactIssues, Issue, ReviewResult, RetentionPolicy, UserStats
+from .response_cache import get_response_cache
+
+logger = logging.getLogger(__name__)
+
+# Only submissions in these statuses are ever deleted
+FINAL_STATUSES = ('completed', 'failed')
+
+
+class RetentionEngine:
+    """Deletes expired submissions in bounded chunks"""
+
+    def __init__(self, default_days: Optional[int] = 30, chunk_size: int = 500, chunk_delay: float = 0.1,
+                 max_duration: Optional[float] = None):
+        self.default_days = default_days
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.max_duration = max_duration
+
+    def scopes(self, now: datetime = None) -> List[Tuple[Q, Optional[datetime]]]:
+        """(submission filter, cutoff) per policy, most specific first
+
+        Each filter leaves out the submissions of the policies before it,
+        the last one covers everything else. A cutoff of None means nothing
+        in that scope expires.
+        """
+        now = now or timezone.now()
+        policies = sorted(
+            RetentionPolicy.objects.all(),
+            key=lambda policy: (policy.user_id is None, policy.language_id is None)
+        )
+
+        scopes = []
+        covered = None
+        default_days = self.default_days
+        for policy in policies:
+            if policy.user_id is None and policy.language_id is None:
+                default_days = policy.retention_days
+                continue
+            scope = Q()
+            if policy.user_id is not None:
+                scope &= Q(user_id=policy.user_id)
+            if policy.language_id is not None:
+                scope &= Q(language_id=policy.language_id)
+            scopes.append((scope if covered is None else scope & ~covered, self._cutoff(now, policy.retention_days)))
+            covered = scope if covered is None else covered | scope
+
+        scopes.append((Q() if covered is None else ~covered, self._cutoff(now, default_days)))
+        return scopes
+
+    def run(self, now: datetime = None) -> Dict[str, int]:
+        """Delete every expired submission, or as many as max_duration allows"""
+        deadline = time.monotonic() + self.max_duration if self.max_duration else None
+        totals = {'submissions': 0, 'results': 0, 'issues': 0, 'chunks': 0, 'finished': True}
+
+        for scope, cutoff in self.scopes(now):
+            if cutoff is None:
+                continue
+            expired = CodeSubmission.objects.filter(scope, submitted_at__lt=cutoff, status__in=FINAL_STATUSES)
+            position = None
+
+            while True:
+                if deadline is not None and time.monotonic() >= deadline:
+                    totals['finished'] = False
+                    return totals
+
+                chunk = expired
+                if position is not None:
+                    chunk = chunk.filter(
+                        Q(submitted_at__gt=position[0]) | Q(submitted_at=position[0], id__gt=position[1])
+                    )
+                rows = list(chunk.order_by('submitted_at', 'id').values_list('submitted_at', 'id')[:self.chunk_size])
+                if not rows:
+                    break
+                position = rows[-1]
+
+                counts = self.delete_chunk([submission_id for _, submission_id in rows])
+                for key, count in counts.items():
+                    totals[key] += count
+                totals['chunks'] += 1
+
+                if len(rows) < self.chunk_size:
+                    break
+                if self.chunk_delay:
+                    time.sleep(self.chunk_delay)
+
+        return totals
+
+    def delete_chunk(self, submission_ids: List) -> Dict[str, int]:
+        """Delete finished submissions with their results and issues"""
+        with transaction.atomic():
+            # Lock the rows; skip any that were queued for reanalysis meanwhile
+            submission_ids = list(
+                CodeSubmission.objects.select_for_update()
+                .filter(id__in=submission_ids, status__in=FINAL_STATUSES)
+                .values_list('id', flat=True)
+            )
+            if not submission_ids:
+                return {'submissions': 0, 'results': 0, 'issues': 0}
+
+            results = ReviewResult.objects.filter(submission_id__in=submission_ids)
+            result_ids = list(results.values_list('id', flat=True))
+            # The result signals don't run for raw deletes, so collect their deltas
+            removed = list(
+                results.filter(is_provisional=False)
+                .values('submission__user_id')
+                .annotate(
+                    count=Count('id'),
+                    score_sum=Sum('overall_score'),
+                    issues=Sum('total_issues'),
+                    last_submitted_at=Max('submission__submitted_at')
+                )
+            )
+
+            CodeSubmission.objects.filter(previous_version_id__in=submission_ids).exclude(
+                id__in=submission_ids
+            ).update(previous_version=None)
+
+            issue_count, _ = Issue.objects.filter(result_id__in=result_ids).delete()
+            compact_issues = CompactIssues.objects.filter(result_id__in=result_ids)
+            issue_count += compact_issues.aggregate(count=Sum('issue_count'))['count'] or 0
+            compact_issues.delete()
+            # Nothing references the results and submissions any more: their
+            # issues are gone and later versions were unlinked above. delete()
+            # would load them and let the result signals remove them from the
+            # stats and rollups, so they are deleted with raw DELETEs instead
+            # and the stats are updated below. Keep this in step with new
+            # relations to either model.
+            results = ReviewResult.objects.filter(id__in=result_ids)
+            result_count = results._raw_delete(results.db)
+            submissions = CodeSubmission.objects.filter(id__in=submission_ids)
+            submission_count = submissions._raw_delete(submissions.db)
+
+            for row in removed:
+                UserStats.remove_results(
+                    row['submission__user_id'],
+                    row['count'],
+                    row['score_sum'] or 0.0,
+                    row['issues'] or 0,
+                    row['last_submitted_at']
+                )
+
+        try:
+            get_response_cache().invalidate(submission_ids)
+        except Exception as exc:
+            # Deleted submissions stay visible until their payloads expire
+            logger.warning(f"Could not invalidate cached responses of deleted submissions: {str(exc)}")
+
+        return {'submissions': submission_count, 'results': result_count, 'issues': issue_count}
+
+    def _cutoff(self, now: datetime, days: Optional[int]) -> Optional[datetime]:
+        return None if days is None else now - timedelta(days=days)
+
+
+_engine = None
+
+
+def get_retention_engine() -> RetentionEngine:
+    """Get the process-wide retention engine configured from settings"""
+    global _engine
+    if _engine is None:
+        _engine = RetentionEngine(
+            default_days=getattr(settings, 'REVIEW_RETENTION_DAYS', 30),
+            chunk_size=getattr(settings, 'REVIEW_RETENTION_CHUNK_SIZE', 500),
+            chunk_delay=getattr(settings, 'REVIEW_RETENTION_CHUNK_DELAY', 0.1),
+            max_duration=getattr(settings, 'REVIEW_RETENTION_MAX_DURATION', None),
+        )
+    return _engine
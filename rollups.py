@@ -0,0 +1,293 @@
+"""
+Analytics rollups.
+
+Dashboard trends are read from per-period aggregates instead of the results
+and issues themselves. ResultRollup holds the result count, score sum and
+issue totals of a user and language per hour and per day; RuleRollup holds
+the issue count of every rule over the same keys. save_analysis_result adds
+each final result to the periods it was created in, and deleting a result
+(reanalysis) takes it out again, so a reanalyzed submission is not counted
+twice. Retention deletes bypass this on purpose: trends keep covering
+periods whose submissions have expired.
+
+Results saved before the rollups existed are added by the backfill_rollups
+task, which recomputes every period that still has results from those
+results. It writes absolute values, so it can be run again to correct
+drift, e.g. from results saved while it ran.
+
+Periods start on whole UTC hours and days. REVIEW_ROLLUP_GRANULARITIES
+limits which of them are maintained. The read functions at the bottom
+serve the analytics endpoints.
+"""
+from collections import Counter, defaultdict
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, List, Any, Tuple
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+from .models import CompactIssues, Issue, ReviewResult, ResultRollup, Rule, RuleRollup
+from .rules import get_rule_catalog
+
+GRANULARITIES = ('hour', 'day')
+
+# Per-severity issue counters shared by ReviewResult and ResultRollup
+SEVERITY_FIELDS = ('critical_issues', 'error_issues', 'warning_issues', 'info_issues')
+
+
+def period_start(moment: datetime, granularity: str) -> datetime:
+    """Start of the UTC hour or day a moment falls in"""
+    if timezone.is_aware(moment):
+        moment = moment.astimezone(dt_timezone.utc)
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        moment = moment.replace(hour=0)
+    return moment
+
+
+class RollupRecorder:
+    """Applies results to the hourly and daily rollups"""
+
+    def __init__(self, granularities: Tuple[str, ...] = GRANULARITIES):
+        unknown = set(granularities) - set(GRANULARITIES)
+        if unknown:
+            raise ValueError(f"Unknown rollup granularities: {', '.join(sorted(unknown))}")
+        self.granularities = tuple(granularities)
+
+    def add_result(self, result: ReviewResult, rules: List[Rule]) -> None:
+        """Count a saved result, given the rule of each of its issues"""
+        self._apply(result, Counter(rule.id for rule in rules), 1)
+
+    def remove_result(self, result: ReviewResult) -> None:
+        """Take a result that is about to be deleted out of its periods"""
+        if result.issue_storage == 'compact':
+            issues = result.compact_issues.unpack().issues()
+            rule_counts = Counter(rule.id for rule in get_rule_catalog().resolve(issues))
+        else:
+            rule_counts = {
+                row['rule_id']: row['count']
+                for row in result.issues.values('rule_id').annotate(count=Count('id'))
+            }
+        self._apply(result, rule_counts, -1)
+
+    def rebuild(self, user_ids: List[Any]) -> int:
+        """Recompute the rollups of some users from their final results
+
+        Periods with results are set to what their results add up to;
+        periods whose results have all expired keep their rows. Returns the
+        number of result rollup rows written.
+        """
+        results = ReviewResult.objects.filter(is_provisional=False, submission__user_id__in=user_ids)
+        rule_counts = defaultdict(Counter)
+        issue_rows = (
+            Issue.objects.filter(result__in=results)
+            .values('result_id', 'rule_id')
+            .annotate(count=Count('id'))
+        )
+        for row in issue_rows.iterator():
+            rule_counts[row['result_id']][row['rule_id']] = row['count']
+        catalog = get_rule_catalog()
+        for compact_issues in CompactIssues.objects.filter(result__in=results).iterator():
+            issues = compact_issues.unpack().issues()
+            rule_counts[compact_issues.result_id] = Counter(rule.id for rule in catalog.resolve(issues))
+
+        # (user, language, granularity, period start) -> field totals
+        totals = {}
+        rule_totals = Counter()
+        values = results.values(
+            'id', 'created_at', 'submission__user_id', 'submission__language_id', 'overall_score',
+            'total_issues', 'analysis_duration', *SEVERITY_FIELDS
+        )
+        for result in values.iterator():
+            for granularity in self.granularities:
+                key = (
+                    result['submission__user_id'],
+                    result['submission__language_id'],
+                    granularity,
+                    period_start(result['created_at'], granularity),
+                )
+                row = totals.setdefault(key, Counter())
+                row['results'] += 1
+                row['score_sum'] += result['overall_score']
+                row['total_issues'] += result['total_issues']
+                row['analysis_duration_sum'] += result['analysis_duration']
+                for field in SEVERITY_FIELDS:
+                    row[field] += result[field]
+                for rule_id, count in rule_counts[result['id']].items():
+                    rule_totals[key + (rule_id,)] += count
+
+        periods = defaultdict(list)
+        for user_id, language_id, granularity, start in totals:
+            periods[(user_id, language_id, granularity)].append(start)
+
+        with transaction.atomic():
+            ResultRollup.objects.bulk_create(
+                [ResultRollup(**self._key_fields(key)) for key in sorted(totals)],
+                ignore_conflicts=True
+            )
+            for key in sorted(totals):
+                ResultRollup.objects.filter(**self._key_fields(key)).update(
+                    updated_at=timezone.now(), **totals[key]
+                )
+
+            # Rules no longer found in a recomputed period drop to zero
+            for (user_id, language_id, granularity), starts in periods.items():
+                RuleRollup.objects.filter(
+                    user_id=user_id, language_id=language_id, granularity=granularity, period_start__in=starts
+                ).update(issues=0)
+            RuleRollup.objects.bulk_create(
+                [RuleRollup(rule_id=key[-1], **self._key_fields(key[:-1])) for key in sorted(rule_totals)],
+                ignore_conflicts=True
+            )
+            for key in sorted(rule_totals):
+                RuleRollup.objects.filter(rule_id=key[-1], **self._key_fields(key[:-1])).update(
+                    issues=rule_totals[key]
+                )
+        return len(totals)
+
+    def _key_fields(self, key: Tuple[Any, Any, str, datetime]) -> Dict[str, Any]:
+        user_id, language_id, granularity, start = key
+        return {'user_id': user_id, 'language_id': language_id, 'granularity': granularity, 'period_start': start}
+
+    def _apply(self, result: ReviewResult, rule_counts: Dict[int, int], sign: int) -> None:
+        submission = result.submission
+        changes = {
+            'results': F('results') + sign,
+            'score_sum': F('score_sum') + sign * result.overall_score,
+            'total_issues': F('total_issues') + sign * result.total_issues,
+            'analysis_duration_sum': F('analysis_duration_sum') + sign * result.analysis_duration,
+            'updated_at': timezone.now(),
+        }
+        for field in SEVERITY_FIELDS:
+            changes[field] = F(field) + sign * getattr(result, field)
+
+        keys = [
+            {
+                'user_id': submission.user_id,
+                'language_id': submission.language_id,
+                'granularity': granularity,
+                'period_start': period_start(result.created_at, granularity),
+            }
+            for granularity in self.granularities
+        ]
+        # Rows are locked in one order, rule rollups by rule id before the
+        # result rollups, so concurrent saves can't deadlock. Every result of
+        # a user and language in a period updates the same result rollup
+        # row, so it comes last and stays locked only until the commit.
+        with transaction.atomic():
+            if rule_counts:
+                for key in keys:
+                    self._apply_rules(key, rule_counts, sign)
+            for key in keys:
+                # Create missing rows without failing on concurrent inserts
+                if sign > 0:
+                    ResultRollup.objects.bulk_create([ResultRollup(**key)], ignore_conflicts=True)
+                ResultRollup.objects.filter(**key).update(**changes)
+
+    def _apply_rules(self, key: Dict[str, Any], rule_counts: Dict[int, int], sign: int) -> None:
+        rule_ids = sorted(rule_counts)
+        if sign > 0:
+            RuleRollup.objects.bulk_create(
+                [RuleRollup(rule_id=rule_id, **key) for rule_id in rule_ids],
+                ignore_conflicts=True
+            )
+        list(
+            RuleRollup.objects.select_for_update()
+            .filter(rule_id__in=rule_ids, **key)
+            .order_by('rule_id')
+            .values_list('id', flat=True)
+        )
+        # One UPDATE per distinct count rather than one per rule
+        by_count = {}
+        for rule_id in rule_ids:
+            by_count.setdefault(rule_counts[rule_id], []).append(rule_id)
+        for count, counted_ids in by_count.items():
+            RuleRollup.objects.filter(rule_id__in=counted_ids, **key).update(issues=F('issues') + sign * count)
+
+
+def _rollups(model, user_id, granularity: str, since: datetime, language: str = None):
+    rollups = model.objects.filter(user_id=user_id, granularity=granularity, period_start__gte=since)
+    if language:
+        rollups = rollups.filter(language__name__iexact=language)
+    return rollups
+
+
+def _totals(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Averages and counts from the sums of _sums()"""
+    count = row['result_count']
+    return {
+        'results': count,
+        'average_score': row['score_sum'] / count,
+        'average_duration': row['duration_sum'] / count,
+        'total_issues': row['issue_count'],
+        **{field: row[f"{field}_count"] for field in SEVERITY_FIELDS},
+    }
+
+
+def _sums() -> Dict[str, Sum]:
+    return {
+        'result_count': Sum('results'),
+        'score_sum': Sum('score_sum'),
+        'duration_sum': Sum('analysis_duration_sum'),
+        'issue_count': Sum('total_issues'),
+        **{f"{field}_count": Sum(field) for field in SEVERITY_FIELDS},
+    }
+
+
+def score_trend(user_id, granularity: str, since: datetime, language: str = None) -> List[Dict[str, Any]]:
+    """Results, average score and issues by severity per period"""
+    rows = (
+        _rollups(ResultRollup, user_id, granularity, since, language)
+        .values('period_start')
+        .annotate(**_sums())
+        .filter(result_count__gt=0)
+        .order_by('period_start')
+    )
+    return [{'period_start': row['period_start'].isoformat(), **_totals(row)} for row in rows]
+
+
+def language_totals(user_id, granularity: str, since: datetime) -> List[Dict[str, Any]]:
+    """Results, average score and issues by severity per language"""
+    rows = (
+        _rollups(ResultRollup, user_id, granularity, since)
+        .values('language__name')
+        .annotate(**_sums())
+        .filter(result_count__gt=0)
+        .order_by('-result_count', 'language__name')
+    )
+    return [{'language': row['language__name'], **_totals(row)} for row in rows]
+
+
+def top_rules(user_id, granularity: str, since: datetime, language: str = None,
+              limit: int = 10) -> List[Dict[str, Any]]:
+    """Rules with the most issues, most frequent first"""
+    rows = list(
+        _rollups(RuleRollup, user_id, granularity, since, language)
+        .values('rule_id')
+        .annotate(issue_count=Sum('issues'))
+        .filter(issue_count__gt=0)
+        .order_by('-issue_count', 'rule_id')[:limit]
+    )
+    rules = Rule.objects.in_bulk([row['rule_id'] for row in rows])
+    top = []
+    for row in rows:
+        rule = rules[row['rule_id']]
+        top.append({
+            'tool': rule.tool,
+            'rule_id': rule.rule_id,
+            'rule_name': rule.name,
+            'docs_url': rule.docs_url,
+            'issues': row['issue_count'],
+        })
+    return top
+
+
+_recorder = None
+
+
+def get_rollup_recorder() -> RollupRecorder:
+    """Get the process-wide rollup recorder configured from settings"""
+    global _recorder
+    if _recorder is None:
+        _recorder = RollupRecorder(getattr(settings, 'REVIEW_ROLLUP_GRANULARITIES', GRANULARITIES))
+    return _recorder
@@ -0,0 +1,120 @@
+"""
+Rule catalog.
+
+Every (tool, rule id) pair a tool reports is stored once as a Rule, and
+issues reference it by its integer key. RuleCatalog maps analyzer issue
+dicts to their Rule rows through an in-process cache, so ingesting a result
+queries the database only for rules the worker hasn't seen yet and inserts
+only rules no worker has reported before. Rules are resolved outside the
+transaction that stores the issues, so a rolled back result never leaves
+uncommitted rules in the cache.
+"""
+import re
+import threading
+from typing import Dict, List, Any, Tuple
+from .models import Rule
+
+PYLINT_CATEGORIES = {
+    'C': 'convention',
+    'R': 'refactor',
+    'W': 'warning',
+    'E': 'error',
+    'F': 'fatal',
+    'I': 'info',
+}
+
+PYLINT_RULE = re.compile(r'^[CRWEFI]\d{4}$')
+BANDIT_RULE = re.compile(r'^B\d{3}$')
+FLAKE8_RULE = re.compile(r'^[A-Z]\d{3}$')
+
+
+def rule_key(issue: Dict[str, Any]) -> Tuple[str, str]:
+    """(tool, rule id) of an analyzer issue dict"""
+    return issue.get('tool') or '', issue.get('rule_id') or 'unknown'
+
+
+def docs_url(tool: str, rule_id: str, rule_name: str) -> str:
+    """Documentation page of a rule, or '' if the tool has none"""
+    if tool == 'bandit' or BANDIT_RULE.match(rule_id):
+        if rule_name:
+            return f"https://bandit.readthedocs.io/en/latest/plugins/{rule_id.lower()}_{rule_name}.html"
+        return ''
+    if tool in ('pylint', 'ast') and PYLINT_RULE.match(rule_id) and rule_name:
+        category = PYLINT_CATEGORIES[rule_id[0]]
+        return f"https://pylint.readthedocs.io/en/stable/user_guide/messages/{category}/{rule_name}.html"
+    if tool in ('flake8', 'ast') and FLAKE8_RULE.match(rule_id):
+        return f"https://www.flake8rules.com/rules/{rule_id}.html"
+    if tool == 'eslint' and re.match(r'^[a-z-]+$', rule_id):
+        # Core rules only; plugin rules are prefixed with the plugin name
+        return f"https://eslint.org/docs/latest/rules/{rule_id}"
+    return ''
+
+
+class RuleCatalog:
+    """Resolves issue dicts to Rule rows, creating the rules not seen before"""
+
+    def __init__(self):
+        self._rules = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, issues: List[Dict[str, Any]]) -> List[Rule]:
+        """Rule of each issue, in the order of the issues"""
+        keys = [rule_key(issue) for issue in issues]
+        missing = {}
+        for key, issue in zip(keys, issues):
+            if key not in self._rules and key not in missing:
+                missing[key] = issue
+        if missing:
+            self._load(missing)
+        return [self._rules[key] for key in keys]
+
+    def clear(self) -> None:
+        """Forget the cached rules"""
+        with self._lock:
+            self._rules = {}
+
+    def _load(self, missing: Dict[Tuple[str, str], Dict[str, Any]]) -> None:
+        found = self._fetch(missing)
+        new = [
+            self._new_rule(key, issue)
+            for key, issue in missing.items()
+            if key not in found
+        ]
+        if new:
+            # Another worker may insert the same rules meanwhile
+            Rule.objects.bulk_create(new, ignore_conflicts=True)
+            found.update(self._fetch({key: missing[key] for key in missing if key not in found}))
+        with self._lock:
+            self._rules.update(found)
+
+    def _fetch(self, keys) -> Dict[Tuple[str, str], Rule]:
+        by_tool = {}
+        for tool, rule_id in keys:
+            by_tool.setdefault(tool, []).append(rule_id)
+        found = {}
+        for tool, rule_ids in by_tool.items():
+            for rule in Rule.objects.filter(tool=tool, rule_id__in=rule_ids):
+                found[(rule.tool, rule.rule_id)] = rule
+        return found
+
+    def _new_rule(self, key: Tuple[str, str], issue: Dict[str, Any]) -> Rule:
+        tool, rule_id = key
+        name = issue.get('rule_name') or ''
+        return Rule(
+            tool=tool,
+            rule_id=rule_id,
+            name=name,
+            default_severity=issue['severity'],
+            docs_url=docs_url(tool, rule_id, name)
+        )
+
+
+_catalog = None
+
+
+def get_rule_catalog() -> RuleCatalog:
+    """Get the process-wide rule catalog"""
+    global _catalog
+    if _catalog is None:
+        _catalog = RuleCatalog()
+    return _catalog
@@ -0,0 +1,284 @@
+"""
+Routing of analysis tasks to separate Celery queues ("lanes").
+
+Every analysis is sent to one of four lanes:
+  interactive  single uploads from the web UI and the API
+  bulk         bulk uploads and project analysis
+  heavy        submissions whose estimated cost exceeds REVIEW_HEAVY_COST
+  reanalyze    reanalysis requested by the user
+Each lane is its own queue (REVIEW_QUEUES), so workers can be dedicated to
+lanes, e.g. `celery worker -Q review_interactive`, and a large upload never
+sits in front of interactive work. Within a lane the message priority drops
+as the submitting user's number of in-flight submissions grows, so one busy
+user can't starve the others. The scheduler passes the user to the task as
+user_id, and the task takes its submissions out of the count when it ends,
+whether it succeeded or not; counters expire after REVIEW_IN_FLIGHT_TIMEOUT
+seconds without new work, so a worker that died mid-task can't lower a
+user's priority for good.
+
+Lane depth and queue wait counters are kept in the Django cache and
+aggregated across workers.
+"""
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, List, Any
+from celery import group
+from django.conf import settings
+from django.core.cache import caches
+from .registry import get_registry
+
+logger = logging.getLogger(__name__)
+
+LANES = ('interactive', 'bulk', 'heavy', 'reanalyze')
+
+DEFAULT_QUEUES = {lane: f"review_{lane}" for lane in LANES}
+
+# Base message priority per lane (0-9, 9 is most urgent)
+LANE_PRIORITIES = {
+    'interactive': 9,
+    'reanalyze': 6,
+    'bulk': 4,
+    'heavy': 2,
+}
+
+# Estimated seconds per tool: (start-up, per KB of source)
+DEFAULT_COST_PROFILES = {
+    'python': (1.5, 0.15),
+    'javascript': (1.0, 0.05),
+    'typescript': (1.5, 0.08),
+}
+
+
+class Scheduler:
+    """Chooses a lane and priority for analysis tasks and tracks lane metrics"""
+
+    STATS_KEY_PREFIX = 'review_scheduler'
+
+    def __init__(self, alias: str = 'default', queues: Dict[str, str] = None,
+                 cost_profiles: Dict[str, Any] = None, heavy_cost: float = 30.0,
+                 fair_share_step: int = 10, priority_ascending: bool = True,
+                 in_flight_timeout: int = 6 * 3600):
+        self.alias = alias
+        self.queues = {**DEFAULT_QUEUES, **(queues or {})}
+        self.cost_profiles = {**DEFAULT_COST_PROFILES, **(cost_profiles or {})}
+        self.heavy_cost = heavy_cost
+        self.fair_share_step = fair_share_step
+        # Redis treats 0 as the highest priority, AMQP brokers treat 9 as highest
+        self.priority_ascending = priority_ascending
+        self.in_flight_timeout = in_flight_timeout
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def estimate_cost(self, file_size: int, language: str) -> float:
+        """Estimated analysis time in seconds for one source"""
+        language = language.lower()
+        startup, per_kb = self.cost_profiles.get(language, (1.0, 0.1))
+        try:
+            tools = len(get_registry().tool_names(language)) or 1
+        except ValueError:
+            tools = 1
+        return tools * (startup + per_kb * file_size / 1024)
+
+    def route(self, file_size: int, language: str, origin: str) -> str:
+        """Lane for a submission from the given origin"""
+        if self.estimate_cost(file_size, language) > self.heavy_cost:
+            return 'heavy'
+        if origin in LANES:
+            return origin
+        return 'bulk'
+
+    def priority(self, lane: str, user_id) -> int:
+        """Message priority, lowered by the user's in-flight submissions"""
+        try:
+            in_flight = self.backend.get(self._user_key(user_id)) or 0
+        except Exception as exc:
+            logger.warning(f"Could not read in-flight counter: {str(exc)}")
+            in_flight = 0
+        penalty = in_flight // self.fair_share_step if self.fair_share_step else 0
+        priority = max(0, LANE_PRIORITIES[lane] - penalty)
+        return priority if self.priority_ascending else 9 - priority
+
+    def signature(self, task, args: List[Any], lane: str, user_id, count: int = 1, **kwargs):
+        """Task signature for a lane, counting count submissions as queued
+
+        The task must call task_finished(user_id, count) once it ends.
+        """
+        priority = self.priority(lane, user_id)
+        self._incr(self._user_key(user_id), count, self.in_flight_timeout)
+        self._incr(self._lane_key(lane, 'enqueued'), count)
+        return task.signature(
+            args,
+            {**kwargs, 'lane': lane, 'enqueued_at': time.time(), 'user_id': user_id},
+            queue=self.queues[lane],
+            priority=priority
+        )
+
+    def task_started(self, lane: str, enqueued_at: float, count: int = 1) -> None:
+        """Record that a worker picked up count submissions from a lane"""
+        if lane not in LANES or enqueued_at is None:
+            return
+        wait_ms = int(max(0.0, time.time() - enqueued_at) * 1000)
+        self._incr(self._lane_key(lane, 'started'), count)
+        self._incr(self._lane_key(lane, 'wait_ms_sum'), wait_ms * count)
+        try:
+            max_key = self._lane_key(lane, 'wait_ms_max')
+            if wait_ms > (self.backend.get(max_key) or 0):
+                self.backend.set(max_key, wait_ms, None)
+        except Exception as exc:
+            logger.warning(f"Could not record lane wait time: {str(exc)}")
+
+    def task_finished(self, user_id, count: int = 1) -> None:
+        """Record that count of a user's submissions are no longer in flight"""
+        if user_id is None:
+            # Task not sent through signature(), so it was never counted
+            return
+        key = self._user_key(user_id)
+        self._incr(key, -count, self.in_flight_timeout)
+        try:
+            if (self.backend.get(key) or 0) < 0:
+                self.backend.set(key, 0, self.in_flight_timeout)
+        except Exception as exc:
+            logger.warning(f"Could not reset in-flight counter: {str(exc)}")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Depth and wait-time metrics per lane"""
+        fields = ('enqueued', 'started', 'wait_ms_sum', 'wait_ms_max')
+        keys = [self._lane_key(lane, field) for lane in LANES for field in fields]
+        values = self.backend.get_many(keys)
+
+        stats = {}
+        for lane in LANES:
+            counters = {field: values.get(self._lane_key(lane, field), 0) for field in fields}
+            started = counters['started']
+            stats[lane] = {
+                'queue': self.queues[lane],
+                'enqueued': counters['enqueued'],
+                'started': started,
+                'depth': max(0, counters['enqueued'] - started),
+                'broker_depth': self._broker_depth(self.queues[lane]),
+                'avg_wait_seconds': round(counters['wait_ms_sum'] / started / 1000, 3) if started else 0.0,
+                'max_wait_seconds': round(counters['wait_ms_max'] / 1000, 3),
+            }
+        return stats
+
+    def _broker_depth(self, queue: str):
+        """Messages waiting in the broker queue, if the broker can tell"""
+        try:
+            from celery import current_app
+            with current_app.connection_for_read() as connection:
+                channel = connection.default_channel
+                return channel.queue_declare(queue=queue, passive=True).message_count
+        except Exception:
+            return None
+
+    def _incr(self, key: str, delta: int, timeout: int = None) -> None:
+        # Metrics are best effort and must never block scheduling
+        try:
+            self.backend.add(key, 0, timeout)
+            self.backend.incr(key, delta)
+            if timeout is not None:
+                # incr() keeps the expiry of the first add()
+                self.backend.touch(key, timeout)
+        except ValueError:
+            self.backend.set(key, delta, timeout)
+        except Exception as exc:
+            logger.warning(f"Could not update scheduler counter {key}: {str(exc)}")
+
+    def _lane_key(self, lane: str, field: str) -> str:
+        return f"{self.STATS_KEY_PREFIX}:lane:{lane}:{field}"
+
+    def _user_key(self, user_id) -> str:
+        return f"{self.STATS_KEY_PREFIX}:user:{user_id}:in_flight"
+
+
+_scheduler = None
+
+
+def get_scheduler() -> Scheduler:
+    """Get the process-wide scheduler configured from settings"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = Scheduler(
+            alias=getattr(settings, 'REVIEW_SCHEDULER_CACHE_ALIAS', 'default'),
+            queues=getattr(settings, 'REVIEW_QUEUES', None),
+            cost_profiles=getattr(settings, 'REVIEW_COST_PROFILES', None),
+            heavy_cost=getattr(settings, 'REVIEW_HEAVY_COST', 30.0),
+            fair_share_step=getattr(settings, 'REVIEW_FAIR_SHARE_STEP', 10),
+            priority_ascending=getattr(settings, 'REVIEW_PRIORITY_ASCENDING', True),
+            in_flight_timeout=getattr(settings, 'REVIEW_IN_FLIGHT_TIMEOUT', 6 * 3600),
+        )
+    return _scheduler
+
+
+def schedule_submission(submission, origin: str = 'interactive', **kwargs) -> None:
+    """Queue the analysis of one submission in the lane for its origin and cost"""
+    from .tasks import analyze_code_submission
+
+    scheduler = get_scheduler()
+    lane = scheduler.route(submission.file_size, submission.language.name, origin)
+    scheduler.signature(
+        analyze_code_submission, [str(submission.id)], lane, submission.user_id, **kwargs
+    ).apply_async()
+
+
+def schedule_submissions(submissions, origin: str = 'bulk', **kwargs) -> None:
+    """Queue many submissions, batching them where possible
+
+    Heavy submissions get a task of their own in the heavy lane; the rest
+    are grouped per user into batches of REVIEW_BATCH_SIZE. All tasks are
+    sent as one Celery group, so a large upload costs a single publish call
+    instead of one broker round trip per file. kwargs are passed to every
+    task.
+    """
+    from .tasks import analyze_code_submission, analyze_submission_batch
+
+    scheduler = get_scheduler()
+    batch_size = getattr(settings, 'REVIEW_BATCH_SIZE', 20)
+    if len(submissions) == 1 or batch_size <= 1:
+        for submission in submissions:
+            schedule_submission(submission, origin, **kwargs)
+        return
+
+    signatures = []
+    batches = defaultdict(list)
+    for submission in submissions:
+        lane = scheduler.route(submission.file_size, submission.language.name, origin)
+        if lane == 'heavy':
+            signatures.append(scheduler.signature(
+                analyze_code_submission, [str(submission.id)], lane, submission.user_id, **kwargs
+            ))
+        else:
+            batches[(lane, submission.user_id)].append(str(submission.id))
+
+    for (lane, user_id), submission_ids in batches.items():
+        for i in range(0, len(submission_ids), batch_size):
+            chunk = submission_ids[i:i + batch_size]
+            signatures.append(scheduler.signature(
+                analyze_submission_batch, [chunk], lane, user_id, count=len(chunk), **kwargs
+            ))
+
+    if signatures:
+        group(signatures).apply_async()
+
+
+def schedule_project(project) -> None:
+    """Queue the planning task of a project analysis in the bulk lane"""
+    from .tasks import analyze_project
+
+    get_scheduler().signature(analyze_project, [str(project.id)], 'bulk', project.user_id).apply_async()
+
+
+def schedule_project_shards(project, shards: List[List[str]]) -> None:
+    """Queue the shards of a project analysis as one group in the bulk lane"""
+    from .tasks import analyze_project_shard
+
+    scheduler = get_scheduler()
+    group(
+        scheduler.signature(
+            analyze_project_shard, [str(project.id), shard], 'bulk', project.user_id, count=len(shard)
+        )
+        for shard in shards
+    ).apply_async()
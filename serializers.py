@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import CodeSubmission, ReviewResult, Issue, SupportedLanguage
+from .models import CodeSubmission, ReviewResult, Issue, SupportedLanguage, SubmissionBatch, ProjectSubmission
 
 class SupportedLanguageSerializer(serializers.ModelSerializer):
     class Meta:
@@ -7,24 +7,42 @@ class SupportedLanguageSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'extension', 'is_active')
 
 class IssueSerializer(serializers.ModelSerializer):
+    tool = serializers.CharField(source='rule.tool', read_only=True)
+    rule_id = serializers.CharField(source='rule.rule_id', read_only=True)
+    rule_name = serializers.CharField(source='rule.name', read_only=True)
+    docs_url = serializers.CharField(source='rule.docs_url', read_only=True)
+    
     class Meta:
         model = Issue
         fields = (
-            'id', 'rule_id', 'rule_name', 'severity', 'message',
+            'id', 'tool', 'rule_id', 'rule_name', 'docs_url', 'severity', 'message',
             'line_number', 'column_number', 'suggestion'
         )
 
 class ReviewResultSerializer(serializers.ModelSerializer):
-    issues = IssueSerializer(many=True, read_only=True)
+    """Result totals; issues are listed by the paginated issues endpoint"""
     
     class Meta:
         model = ReviewResult
         fields = (
             'id', 'overall_score', 'total_issues', 'critical_issues',
             'error_issues', 'warning_issues', 'info_issues',
-            'analysis_duration', 'created_at', 'issues'
+            'analysis_duration', 'tools', 'is_provisional', 'created_at'
         )
 
+class CodeSubmissionSummarySerializer(serializers.ModelSerializer):
+    """Submission listing entry without the code content"""
+    result = ReviewResultSerializer(read_only=True)
+    language_name = serializers.CharField(source='language.name', read_only=True)
+    
+    class Meta:
+        model = CodeSubmission
+        fields = (
+            'id', 'filename', 'language', 'language_name', 'file_size',
+            'status', 'submitted_at', 'processed_at', 'result'
+        )
+        read_only_fields = fields
+
 class CodeSubmissionSerializer(serializers.ModelSerializer):
     result = ReviewResultSerializer(read_only=True)
     language_name = serializers.CharField(source='language.name', read_only=True)
@@ -37,8 +55,7 @@ class CodeSubmissionSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('id', 'file_size', 'status', 'submitted_at', 'processed_at')
     
-    def validate_code_content(self):
-        code_content = self.validated_data.get('code_content', '')
+    def validate_code_content(self, code_content):
         if len(code_content.encode('utf-8')) > 1024 * 1024:  # 1MB limit
             raise serializers.ValidationError("File size exceeds 1MB limit")
         return code_content
@@ -49,10 +66,8 @@ class CodeSubmissionSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 class BulkSubmissionSerializer(serializers.Serializer):
-    files = serializers.ListField(
-        child=serializers.DictField(),
-        max_length=10  # Limit bulk uploads to 10 files
-    )
+    # The number of files is limited by REVIEW_BULK_MAX_FILES
+    files = serializers.ListField(child=serializers.DictField())
     
     def validate_files(self, value):
         for file_data in value:
@@ -60,9 +75,37 @@ class BulkSubmissionSerializer(serializers.Serializer):
                 raise serializers.ValidationError(
                     "Each file must have 'filename', 'language', and 'code_content'"
                 )
+            # DictField accepts values of any JSON type
+            if not all(isinstance(file_data[key], str) for key in ['filename', 'language', 'code_content']):
+                raise serializers.ValidationError(
+                    "Each file's 'filename', 'language', and 'code_content' must be strings"
+                )
         return value
 
 class SubmissionStatusSerializer(serializers.ModelSerializer):
     class Meta:
         model = CodeSubmission
         fields = ('id', 'filename', 'status', 'submitted_at', 'processed_at')
+
+class SubmissionBatchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SubmissionBatch
+        fields = (
+            'id', 'source', 'status', 'analysis_mode', 'total_files', 'skipped_files',
+            'created_at', 'completed_at'
+        )
+
+class ProjectSubmissionSerializer(serializers.ModelSerializer):
+    config_files = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ProjectSubmission
+        fields = (
+            'id', 'name', 'status', 'total_files', 'failed_files', 'config_files',
+            'overall_score', 'total_issues', 'critical_issues', 'error_issues',
+            'warning_issues', 'info_issues', 'submitted_at', 'processed_at'
+        )
+        read_only_fields = fields
+    
+    def get_config_files(self, obj):
+        return sorted(obj.config_files)
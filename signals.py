@@ -0,0 +1,48 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from .models import ReviewResult, SupportedLanguage, UserStats
+from .registry import get_registry
+from .rollups import get_rollup_recorder
+
+@receiver(post_save, sender=ReviewResult)
+def add_result_to_user_stats(sender, instance, created, **kwargs):
+    """Count a new result in its owner's running totals"""
+    # Provisional results are replaced by the final one and never counted
+    if not created or instance.is_provisional:
+        return
+    submission = instance.submission
+    UserStats.apply_result_delta(
+        submission.user_id,
+        1,
+        instance.overall_score,
+        instance.total_issues,
+        submission.submitted_at
+    )
+
+@receiver(pre_delete, sender=ReviewResult)
+def remove_result_from_user_stats(sender, instance, **kwargs):
+    """Take a deleted result (reanalysis, cleanup) out of the running totals"""
+    if instance.is_provisional:
+        return
+    submission = instance.submission
+    UserStats.apply_result_delta(
+        submission.user_id,
+        -1,
+        instance.overall_score,
+        instance.total_issues,
+        submission.submitted_at,
+        submission.id
+    )
+
+@receiver(pre_delete, sender=ReviewResult)
+def remove_result_from_rollups(sender, instance, **kwargs):
+    """Take a deleted result out of the analytics rollups it was added to"""
+    if instance.is_provisional:
+        return
+    get_rollup_recorder().remove_result(instance)
+
+@receiver(post_save, sender=SupportedLanguage)
+@receiver(post_delete, sender=SupportedLanguage)
+def invalidate_analyzer_registry(sender, instance, **kwargs):
+    """Let workers pick up a changed analyzer_class without a restart"""
+    get_registry().invalidate()
@@ -1,61 +1,237 @@
 from celery import shared_task
+from celery.signals import worker_ready
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
 from django.utils import timezone
-from .models import CodeSubmission, ReviewResult, Issue
-from .analyzers import get_analyzer
+from .models import CodeSubmission, ProjectSubmission, ReviewResult, Issue, CompactIssues
+from .analyzers import FAST_ANALYZERS, sweep_temp_files
+from .issue_storage import pack_issues
+from .response_cache import get_response_cache
+from .result_cache import get_result_cache, get_tool_checkpoints
+from .events import get_event_log
+from .metrics import StageTimer, get_metrics
+from .registry import get_analyzer, get_temp_dir
+from .retention import get_retention_engine
+from .rollups import get_rollup_recorder
+from .rules import get_rule_catalog
+from .scheduling import get_scheduler, schedule_submission, schedule_project_shards
 import time
 import logging
 
 logger = logging.getLogger(__name__)
 
+class ToolFailure(Exception):
+    """Raised to retry an analysis in which some tools failed to run"""
+
+def reset_events(submission_id):
+    """Start a fresh event stream for a new analysis run"""
+    try:
+        get_event_log().reset(str(submission_id))
+    except Exception as exc:
+        # Streaming is best effort and must never fail the analysis
+        logger.warning(f"Could not reset events for submission {submission_id}: {str(exc)}")
+
+def publish_status(submission_id, status, **data):
+    """Report a status change to the submission's event stream"""
+    try:
+        get_event_log().publish_status(str(submission_id), status, **data)
+    except Exception as exc:
+        logger.warning(f"Could not publish status for submission {submission_id}: {str(exc)}")
+
+def invalidate_responses(submission_ids):
+    """Stop serving cached API payloads of submissions that changed"""
+    try:
+        get_response_cache().invalidate(submission_ids)
+    except Exception as exc:
+        # Stale payloads still expire with the cache timeout
+        logger.warning(f"Could not invalidate cached responses of {len(submission_ids)} submissions: {str(exc)}")
+
+def fail_submission(submission_id, exc):
+    """Mark a submission of a batch failed after an error of its own"""
+    logger.error(f"Analysis failed for submission {submission_id}: {str(exc)}")
+    try:
+        CodeSubmission.objects.filter(id=submission_id).update(status='failed', processed_at=timezone.now())
+    except Exception as update_exc:
+        logger.warning(f"Could not mark submission {submission_id} failed: {str(update_exc)}")
+    invalidate_responses([submission_id])
+    publish_status(submission_id, 'failed', error=str(exc), retrying=False)
+
+def publish_issues(submission_id, tool, issues):
+    """Report issues found by a tool to the submission's event stream"""
+    try:
+        get_event_log().publish_issues(str(submission_id), tool, issues)
+    except Exception as exc:
+        logger.warning(f"Could not publish issues for submission {submission_id}: {str(exc)}")
+
+def load_checkpoints(cache_key, tools):
+    """Issues of tools that succeeded in an earlier attempt at the same analysis"""
+    try:
+        return get_tool_checkpoints().get(cache_key, tools)
+    except Exception as exc:
+        logger.warning(f"Could not load tool checkpoints: {str(exc)}")
+        return {}
+
+def save_checkpoint(cache_key, tool, issues):
+    """Keep a tool's issues so a retry doesn't have to run it again"""
+    try:
+        get_tool_checkpoints().set(cache_key, tool, issues)
+    except Exception as exc:
+        logger.warning(f"Could not save checkpoint for {tool}: {str(exc)}")
+
+def clear_checkpoints(cache_key, tools):
+    """Drop the checkpoints of an analysis once its result is saved"""
+    try:
+        get_tool_checkpoints().clear(cache_key, tools)
+    except Exception as exc:
+        logger.warning(f"Could not clear tool checkpoints: {str(exc)}")
+
+def record_metrics(language_name, stages, spans):
+    """Add an analysis's stage durations and tool spans to the pipeline metrics"""
+    try:
+        metrics = get_metrics()
+        metrics.observe_stages(language_name, stages)
+        metrics.observe_tools(language_name, spans)
+    except Exception as exc:
+        logger.warning(f"Could not record metrics: {str(exc)}")
+
+def save_provisional_result(submission, language_name):
+    """Store a first-pass result of the language's fast analyzer, if it has one
+    
+    The result is visible within milliseconds while the full tools run and
+    is replaced when the final result is saved.
+    """
+    if language_name not in FAST_ANALYZERS or not getattr(settings, 'REVIEW_PROVISIONAL_RESULTS', True):
+        return None
+    try:
+        analyzer = get_analyzer(language_name, fast=True)
+        start_time = time.time()
+        analysis_result = analyzer.analyze(submission.code_content, submission.filename)
+        publish_issues(submission.id, 'ast', analysis_result['issues'])
+        return save_analysis_result(
+            submission,
+            analysis_result,
+            time.time() - start_time,
+            tools=analyzer.completed_tools,
+            provisional=True
+        )
+    except Exception as exc:
+        # The full analysis goes ahead without a provisional result
+        logger.warning(f"Could not save provisional result for submission {submission.id}: {str(exc)}")
+        return None
+
 @shared_task(bind=True, max_retries=3)
-def analyze_code_submission(self, submission_id):
-    """Celery task to analyze code submission"""
+def analyze_code_submission(self, submission_id, incremental=True, lane=None, enqueued_at=None, fast=False,
+                            user_id=None):
+    """Celery task to analyze code submission
+    
+    lane, enqueued_at and user_id are set by the scheduler and feed the lane
+    metrics and the user's in-flight count.
+    Each tool's issues are checkpointed as soon as it succeeds; when a tool
+    fails the task is retried shortly and only the failed tools run again.
+    After the last retry the result is saved without the failed tools.
+    Before the tools run on the first attempt, a provisional result of the
+    fast analyzer is saved; with fast, the fast analyzer's result is the
+    final one.
+    """
+    scheduler = get_scheduler()
+    if self.request.retries == 0:
+        scheduler.task_started(lane, enqueued_at)
+    timer = StageTimer()
+    # A retry keeps the submission in flight
+    finished = True
+    
     try:
-        submission = CodeSubmission.objects.get(id=submission_id)
-        submission.status = 'processing'
-        submission.save()
+        with timer.stage('load'):
+            submission = CodeSubmission.objects.get(id=submission_id)
+            submission.status = 'processing'
+            if submission.previous_version_id is None:
+                submission.previous_version = submission.find_previous_version()
+            submission.save()
+        
+        reset_events(submission_id)
+        invalidate_responses([submission_id])
+        publish_status(submission_id, 'processing')
         
         logger.info(f"Starting analysis for submission {submission_id}")
         start_time = time.time()
         
         # Get analyzer for the language
-        analyzer = get_analyzer(submission.language.name.lower())
+        language_name = submission.language.name.lower()
+        analyzer = get_analyzer(language_name, fast=fast)
         
-        # Perform analysis
-        analysis_result = analyzer.analyze(
-            submission.code_content,
-            submission.filename
-        )
+        # Reuse the result of an identical earlier analysis if possible
+        with timer.stage('cache_lookup'):
+            result_cache = get_result_cache()
+            cache_key = result_cache.make_key(submission.code_content, language_name, analyzer)
+            analysis_result = result_cache.get(cache_key)
         
-        end_time = time.time()
-        analysis_duration = end_time - start_time
+        if analysis_result is not None:
+            logger.info(f"Using cached analysis for submission {submission_id}")
+            publish_issues(submission_id, 'cache', analysis_result['issues'])
         
-        # Create review result
-        review_result = ReviewResult.objects.create(
-            submission=submission,
-            overall_score=analysis_result['overall_score'],
-            total_issues=analysis_result['total_issues'],
-            critical_issues=analysis_result['critical_issues'],
-            error_issues=analysis_result['error_issues'],
-            warning_issues=analysis_result['warning_issues'],
-            info_issues=analysis_result['info_issues'],
-            analysis_duration=analysis_duration
-        )
+        # Try a diff-aware analysis against the previous version of the file
+        if analysis_result is None and incremental and not fast:
+            with timer.stage('incremental'):
+                analysis_result = analyze_incrementally(submission, analyzer)
+            timer.split('incremental', analyzer.stage_timings)
+            if analysis_result is not None:
+                logger.info(f"Incremental analysis for submission {submission_id}")
+                publish_issues(submission_id, 'incremental', analysis_result['issues'])
         
-        # Create individual issues
-        for issue_data in analysis_result['issues']:
-            Issue.objects.create(
-                result=review_result,
-                **issue_data
-            )
+        checkpointed = analysis_result is None
+        if analysis_result is None:
+            # Retries keep the provisional result of the first attempt
+            if not fast and self.request.retries == 0:
+                save_provisional_result(submission, language_name)
+            
+            # Tools that succeeded in an earlier attempt are not run again
+            analyzer.checkpoints = load_checkpoints(cache_key, analyzer.tool_versions)
+            
+            def tool_complete(tool, issues):
+                # Stream each tool's issues as soon as that tool finishes
+                publish_issues(submission_id, tool, issues)
+                if tool in analyzer.completed_tools and tool not in analyzer.checkpoints:
+                    save_checkpoint(cache_key, tool, issues)
+            
+            analyzer.on_tool_complete = tool_complete
+            
+            # Perform analysis
+            with timer.stage('tools'):
+                analysis_result = analyzer.analyze(
+                    submission.code_content,
+                    submission.filename
+                )
+            timer.split('tools', analyzer.stage_timings)
+            
+            if analyzer.failed_tools and self.request.retries < self.max_retries:
+                raise ToolFailure(f"Tools failed: {analyzer.tool_errors}")
+            
+            # Don't cache results of tools that failed to run
+            if not analyzer.tool_errors:
+                result_cache.set(cache_key, analysis_result)
+            else:
+                # Keep what the other tools found rather than failing the submission
+                logger.warning(
+                    f"Partial results for submission {submission_id}, "
+                    f"missing tools: {analyzer.stopped_tools + analyzer.failed_tools}"
+                )
         
-        # Update submission status
-        submission.status = 'completed'
-        submission.processed_at = timezone.now()
-        submission.save()
+        end_time = time.time()
+        analysis_duration = end_time - start_time
         
-        # Update user stats
-        update_user_stats.delay(submission.user.id)
+        # User stats are updated incrementally when the result is saved
+        with timer.stage('persist'):
+            save_analysis_result(
+                submission,
+                analysis_result,
+                analysis_duration,
+                stage_timings={'stages': timer.as_dict(), 'tools': analyzer.spans},
+                tools=analyzer.completed_tools
+            )
+        record_metrics(language_name, timer.stages, analyzer.spans)
+        if checkpointed:
+            clear_checkpoints(cache_key, analyzer.tool_versions)
         
         logger.info(f"Analysis completed for submission {submission_id}")
         
@@ -63,7 +239,8 @@ def analyze_code_submission(self, submission_id):
             'submission_id': str(submission_id),
             'status': 'completed',
             'score': analysis_result['overall_score'],
-            'issues_count': analysis_result['total_issues']
+            'issues_count': analysis_result['total_issues'],
+            'stopped_tools': analyzer.stopped_tools
         }
         
     except CodeSubmission.DoesNotExist:
@@ -74,6 +251,7 @@ def analyze_code_submission(self, submission_id):
         logger.error(f"Analysis failed for submission {submission_id}: {str(exc)}")
         
         # Update submission status to failed
+        submission = None
         try:
             submission = CodeSubmission.objects.get(id=submission_id)
             submission.status = 'failed'
@@ -82,48 +260,494 @@ def analyze_code_submission(self, submission_id):
         except CodeSubmission.DoesNotExist:
             pass
         
-        # Retry the task
-        if self.request.retries < self.max_retries:
-            raise self.retry(countdown=60 * (self.request.retries + 1))
+        retrying = self.request.retries < self.max_retries
+        invalidate_responses([submission_id])
+        publish_status(submission_id, 'failed', error=str(exc), retrying=retrying)
+        
+        # Retry the task; after a tool failure only the failed tools run
+        # again, so there is no need to back off for long
+        if retrying:
+            if isinstance(exc, ToolFailure):
+                countdown = getattr(settings, 'REVIEW_TOOL_RETRY_DELAY', 5) * (self.request.retries + 1)
+            else:
+                countdown = 60 * (self.request.retries + 1)
+            finished = False
+            raise self.retry(countdown=countdown)
         
         return {'error': str(exc)}
+    
+    finally:
+        if finished:
+            scheduler.task_finished(user_id)
 
-@shared_task
-def update_user_stats(user_id):
-    """Update user statistics after analysis completion"""
-    from django.contrib.auth import get_user_model
-    from .models import UserStats
-    from django.db.models import Avg, Count, Max
+def analyze_incrementally(submission, analyzer):
+    """Diff-aware analysis against the previous version of the same file
     
-    User = get_user_model()
+    Returns None when a full analysis is needed: there is no analyzed
+    previous version, too many incremental runs have happened in a row, or
+    the analyzer declines (too much changed, unparsable source, tool errors).
+    """
+    max_depth = getattr(settings, 'REVIEW_INCREMENTAL_MAX_DEPTH', 5)
+    previous = submission.previous_version
+    if previous is None or max_depth <= 0:
+        return None
     
     try:
-        user = User.objects.get(id=user_id)
+        previous_result = previous.result
+    except ReviewResult.DoesNotExist:
+        return None
+    if previous_result.incremental_depth >= max_depth:
+        return None
+    # Results of fast mode or with missing tools can't be carried forward
+    if previous_result.tools and not set(analyzer.tool_versions) <= set(previous_result.tools):
+        return None
+    
+    analysis_result = analyzer.analyze_incremental(
+        submission.code_content,
+        submission.filename,
+        previous.code_content,
+        previous_result.get_issue_dicts(),
+        max_changed_ratio=getattr(settings, 'REVIEW_INCREMENTAL_MAX_CHANGED_RATIO', 0.5)
+    )
+    if analysis_result is not None:
+        analysis_result['incremental_depth'] = previous_result.incremental_depth + 1
+    return analysis_result
+
+def save_analysis_result(submission, analysis_result, analysis_duration, stage_timings=None, tools=None,
+                         provisional=False):
+    """Store an analysis result and mark the submission completed
+    
+    The result, its issues and the status change are written in a single
+    transaction, with issues inserted in batches of REVIEW_ISSUE_BATCH_SIZE.
+    stage_timings holds the stages timed so far; the time spent here only
+    goes into the pipeline metrics. tools lists the tools whose issues the
+    result includes. A provisional result leaves the submission's status
+    alone; any earlier provisional result is replaced. Results with at
+    least REVIEW_COMPACT_ISSUES_THRESHOLD issues store them packed in one
+    CompactIssues blob instead of Issue rows. Issue rows reference their
+    rule in the Rule catalog. Final results are added to the analytics
+    rollups.
+    """
+    batch_size = getattr(settings, 'REVIEW_ISSUE_BATCH_SIZE', 1000)
+    compact_threshold = getattr(settings, 'REVIEW_COMPACT_ISSUES_THRESHOLD', None)
+    issues = analysis_result['issues']
+    compact = compact_threshold is not None and len(issues) >= compact_threshold
+    # Registers rules first reported here, compact results included
+    rules = get_rule_catalog().resolve(issues)
+    
+    with transaction.atomic():
+        ReviewResult.objects.filter(submission=submission, is_provisional=True).delete()
         
-        # Calculate stats
-        submissions = CodeSubmission.objects.filter(
-            user=user,
-            status='completed'
+        # Create review result
+        review_result = ReviewResult.objects.create(
+            submission=submission,
+            overall_score=analysis_result['overall_score'],
+            total_issues=analysis_result['total_issues'],
+            critical_issues=analysis_result['critical_issues'],
+            error_issues=analysis_result['error_issues'],
+            warning_issues=analysis_result['warning_issues'],
+            info_issues=analysis_result['info_issues'],
+            analysis_duration=analysis_duration,
+            incremental_depth=analysis_result.get('incremental_depth', 0),
+            stage_timings=stage_timings or {},
+            tools=tools or [],
+            is_provisional=provisional,
+            issue_storage='compact' if compact else 'relational'
         )
         
-        stats_data = submissions.aggregate(
-            total_submissions=Count('id'),
-            average_score=Avg('result__overall_score'),
-            total_issues=Count('result__issues'),
-            last_submission=Max('submitted_at')
+        # Create individual issues
+        if compact:
+            CompactIssues.objects.create(result=review_result, data=pack_issues(issues), issue_count=len(issues))
+        else:
+            Issue.objects.bulk_create(
+                [Issue.from_dict(review_result, issue_data, rule) for issue_data, rule in zip(issues, rules)],
+                batch_size=batch_size
+            )
+        
+        # Update submission status and the analytics rollups
+        if not provisional:
+            submission.status = 'completed'
+            submission.processed_at = timezone.now()
+            submission.save(update_fields=['status', 'processed_at'])
+            # Last, so the shared rollup rows stay locked as briefly as possible
+            get_rollup_recorder().add_result(review_result, rules)
+    
+    invalidate_responses([submission.id])
+    publish_status(
+        submission.id,
+        'provisional' if provisional else 'completed',
+        overall_score=review_result.overall_score,
+        total_issues=review_result.total_issues
+    )
+    
+    return review_result
+
+@shared_task
+def analyze_submission_batch(submission_ids, lane=None, enqueued_at=None, fast=False, user_id=None):
+    """Celery task to analyze a group of submissions with one run per tool
+    
+    With fast, languages that have a fast analyzer are analyzed with it only.
+    """
+    scheduler = get_scheduler()
+    scheduler.task_started(lane, enqueued_at, count=len(submission_ids))
+    
+    try:
+        submissions = list(
+            CodeSubmission.objects.filter(id__in=submission_ids, status='pending')
+            .select_related('language')
         )
+        CodeSubmission.objects.filter(
+            id__in=[submission.id for submission in submissions]
+        ).update(status='processing')
+        invalidate_responses([submission.id for submission in submissions])
+        for submission in submissions:
+            reset_events(submission.id)
+            publish_status(submission.id, 'processing')
+        
+        logger.info(f"Starting batch analysis of {len(submissions)} submissions")
+        
+        by_language = {}
+        for submission in submissions:
+            by_language.setdefault(submission.language.name.lower(), []).append(submission)
+        
+        result_cache = get_result_cache()
+        completed = []
+        failed = []
+        fallback = []
+        
+        for language_name, language_submissions in by_language.items():
+            try:
+                analyzer = get_analyzer(language_name, fast=fast)
+            except ValueError as exc:
+                logger.error(f"Batch analysis skipped for {language_name}: {str(exc)}")
+                fallback.extend(language_submissions)
+                continue
+            
+            # Serve identical sources from the result cache
+            pending = {}
+            for submission in language_submissions:
+                try:
+                    cache_key = result_cache.make_key(submission.code_content, language_name, analyzer)
+                    analysis_result = result_cache.get(cache_key)
+                    if analysis_result is not None:
+                        publish_issues(submission.id, 'cache', analysis_result['issues'])
+                        save_analysis_result(submission, analysis_result, 0.0, tools=analyzer.completed_tools)
+                        completed.append(submission)
+                    else:
+                        pending[str(submission.id)] = (submission, cache_key)
+                except Exception as exc:
+                    fail_submission(submission.id, exc)
+                    failed.append(submission)
+            
+            if not pending:
+                continue
+            
+            if not analyzer.supports_batch:
+                logger.info(f"No batch analysis for {language_name}, analyzing submissions one by one")
+                fallback.extend(submission for submission, _ in pending.values())
+                continue
+            
+            start_time = time.time()
+            try:
+                batch_results = analyzer.analyze_batch({
+                    key: (submission.code_content, submission.filename)
+                    for key, (submission, _) in pending.items()
+                })
+            except Exception as exc:
+                logger.error(f"Batch analysis failed for {language_name}: {str(exc)}")
+                fallback.extend(submission for submission, _ in pending.values())
+                continue
+            
+            # A failed tool run affects the whole batch; analyze those one by one
+            if analyzer.tool_errors:
+                logger.warning(
+                    f"Batch analysis for {language_name} had tool errors, "
+                    f"falling back to single analysis: {analyzer.tool_errors}"
+                )
+                fallback.extend(submission for submission, _ in pending.values())
+                continue
+            
+            # Startup cost is shared, so attribute an equal share of the wall time
+            analysis_duration = (time.time() - start_time) / len(pending)
+            for key, (submission, cache_key) in pending.items():
+                # One submission that can't be saved must not hold up the others
+                try:
+                    result_cache.set(cache_key, batch_results[key])
+                    publish_issues(submission.id, 'batch', batch_results[key]['issues'])
+                    save_analysis_result(
+                        submission, batch_results[key], analysis_duration, tools=analyzer.completed_tools
+                    )
+                    completed.append(submission)
+                except Exception as exc:
+                    fail_submission(submission.id, exc)
+                    failed.append(submission)
+        
+        for submission in fallback:
+            CodeSubmission.objects.filter(id=submission.id).update(status='pending')
+            invalidate_responses([submission.id])
+            publish_status(submission.id, 'pending')
+            schedule_submission(submission, 'bulk', fast=fast)
         
-        # Update or create user stats
-        user_stats, created = UserStats.objects.get_or_create(
-            user=user,
-            defaults=stats_data
+        logger.info(f"Batch analysis completed for {len(completed)} submissions")
+        
+        return {
+            'completed': [str(submission.id) for submission in completed],
+            'failed': [str(submission.id) for submission in failed],
+            'requeued': [str(submission.id) for submission in fallback]
+        }
+    
+    finally:
+        # The scheduler batches per user; requeued submissions were counted again
+        scheduler.task_finished(user_id, count=len(submission_ids))
+
+def plan_project_shards(files, shard_size):
+    """Split project files into shards of at most shard_size files
+    
+    files are (submission id, filename, language name) tuples. A shard holds
+    one language and keeps the files of a directory together where it can,
+    so related modules are linted together: a directory with more files
+    than shard_size is split by its subdirectories, and the files directly
+    in it are cut into chunks. Small directories are packed into shared
+    shards in path order.
+    """
+    by_language = {}
+    for submission_id, filename, language_name in files:
+        by_language.setdefault(language_name, []).append((filename.split('/'), str(submission_id)))
+    
+    shards = []
+    for language_name in sorted(by_language):
+        shard = []
+        for group in _package_groups(sorted(by_language[language_name]), 0, shard_size):
+            if shard and len(shard) + len(group) > shard_size:
+                shards.append(shard)
+                shard = []
+            shard.extend(group)
+        if shard:
+            shards.append(shard)
+    return shards
+
+def _package_groups(files, depth, shard_size):
+    """Groups of at most shard_size submission ids, split at directory depth and below"""
+    if len(files) <= shard_size:
+        return [[submission_id for _, submission_id in files]]
+    
+    modules = []
+    packages = {}
+    for parts, submission_id in files:
+        if len(parts) > depth + 1:
+            packages.setdefault(parts[depth], []).append((parts, submission_id))
+        else:
+            modules.append(submission_id)
+    
+    groups = [modules[i:i + shard_size] for i in range(0, len(modules), shard_size)]
+    for package in sorted(packages):
+        groups.extend(_package_groups(packages[package], depth + 1, shard_size))
+    return groups
+
+@shared_task
+def analyze_project(project_id, lane=None, enqueued_at=None, user_id=None):
+    """Celery task to split a project into shards and queue them"""
+    scheduler = get_scheduler()
+    scheduler.task_started(lane, enqueued_at)
+    
+    try:
+        project = ProjectSubmission.objects.get(id=project_id)
+    except ProjectSubmission.DoesNotExist:
+        logger.error(f"Project {project_id} not found")
+        return {'error': 'Project not found'}
+    finally:
+        # The shards are counted on their own
+        scheduler.task_finished(user_id)
+    
+    files = project.files.values_list('id', 'filename', 'language__name')
+    shards = plan_project_shards(files, getattr(settings, 'REVIEW_PROJECT_SHARD_SIZE', 200))
+    
+    project.status = 'processing'
+    project.shard_count = len(shards)
+    project.shards_done = 0
+    project.save(update_fields=['status', 'shard_count', 'shards_done'])
+    
+    logger.info(f"Analyzing project {project_id} in {len(shards)} shards")
+    if not shards:
+        finalize_project(project)
+        return {'project_id': str(project_id), 'shards': 0}
+    
+    schedule_project_shards(project, shards)
+    return {'project_id': str(project_id), 'shards': len(shards)}
+
+@shared_task(bind=True, max_retries=2)
+def analyze_project_shard(self, project_id, submission_ids, lane=None, enqueued_at=None, user_id=None):
+    """Celery task to analyze one shard of a project with shared tool context
+    
+    All project files of the shard's language are written out so imports
+    resolve across the whole tree, but only the shard's files are linted.
+    """
+    scheduler = get_scheduler()
+    if self.request.retries == 0:
+        scheduler.task_started(lane, enqueued_at, count=len(submission_ids))
+    # A retry keeps the shard in flight
+    finished = True
+    
+    try:
+        submissions = list(
+            CodeSubmission.objects.filter(id__in=submission_ids, status__in=['pending', 'processing'])
+            .select_related('language', 'project')
         )
+        if not submissions:
+            # Already done by an earlier delivery of this task
+            return {'project_id': project_id, 'completed': 0}
+        
+        project = submissions[0].project
+        language = submissions[0].language
+        CodeSubmission.objects.filter(id__in=submission_ids).update(status='processing')
+        invalidate_responses(submission_ids)
+        
+        try:
+            language_name = language.name.lower()
+            analyzer = get_analyzer(language_name)
+            # Streamed, so the context isn't also held in the queryset cache
+            context = (
+                project.files.filter(language=language)
+                .values_list('id', 'filename', 'code_content')
+                .iterator()
+            )
+            
+            start_time = time.time()
+            results = analyzer.analyze_project(
+                {str(submission_id): (code_content, filename) for submission_id, filename, code_content in context},
+                config_files=project.config_files,
+                lint_keys=[str(submission.id) for submission in submissions]
+            )
+            # Tools stopped by the resource limits would be stopped again on a
+            # retry, so their files keep the other tools' results
+            if analyzer.failed_tools:
+                raise RuntimeError(f"Tool errors: {analyzer.tool_errors}")
+        except Exception as exc:
+            logger.error(f"Analysis of project {project_id} shard failed: {str(exc)}")
+            if self.request.retries < self.max_retries:
+                finished = False
+                raise self.retry(exc=exc, countdown=60 * (self.request.retries + 1))
+            
+            CodeSubmission.objects.filter(id__in=submission_ids).update(
+                status='failed',
+                processed_at=timezone.now()
+            )
+            invalidate_responses(submission_ids)
+            finish_project_shard(project_id)
+            return {'project_id': project_id, 'error': str(exc)}
         
-        if not created:
-            for key, value in stats_data.items():
-                setattr(user_stats, key, value or 0)
-            user_stats.save()
+        # Startup cost is shared, so attribute an equal share of the wall time
+        analysis_duration = (time.time() - start_time) / len(submissions)
+        completed = []
+        failed = []
+        try:
+            for submission in submissions:
+                # One file that can't be saved must not hold up the project
+                try:
+                    save_analysis_result(
+                        submission, results[str(submission.id)], analysis_duration, tools=analyzer.completed_tools
+                    )
+                    completed.append(submission)
+                except Exception as exc:
+                    fail_submission(submission.id, exc)
+                    failed.append(submission)
+        finally:
+            finish_project_shard(project_id)
         
+        return {
+            'project_id': project_id,
+            'completed': len(completed),
+            'failed': [str(submission.id) for submission in failed]
+        }
+    
+    finally:
+        if finished:
+            scheduler.task_finished(user_id, count=len(submission_ids))
+
+def finish_project_shard(project_id):
+    """Count a finished shard and finalize the project after the last one"""
+    with transaction.atomic():
+        project = ProjectSubmission.objects.select_for_update().get(id=project_id)
+        project.shards_done = F('shards_done') + 1
+        project.save(update_fields=['shards_done'])
+        project.refresh_from_db(fields=['shards_done'])
+        if project.shards_done < project.shard_count:
+            return
+    
+    finalize_project(project)
+
+def finalize_project(project):
+    """Aggregate the per-file results into the project totals
+    
+    The project score is the mean of the file scores weighted by file size,
+    so a large file with many issues weighs more than a small one.
+    """
+    totals = ReviewResult.objects.filter(submission__project=project).aggregate(
+        total_issues=Sum('total_issues'),
+        critical_issues=Sum('critical_issues'),
+        error_issues=Sum('error_issues'),
+        warning_issues=Sum('warning_issues'),
+        info_issues=Sum('info_issues'),
+        weighted_score=Sum(F('overall_score') * F('submission__file_size')),
+        total_size=Sum('submission__file_size')
+    )
+    
+    if totals['total_size']:
+        project.overall_score = totals['weighted_score'] / totals['total_size']
+    else:
+        project.overall_score = None
+    for field in ('total_issues', 'critical_issues', 'error_issues', 'warning_issues', 'info_issues'):
+        setattr(project, field, totals[field] or 0)
+    project.failed_files = project.files.filter(status='failed').count()
+    project.status = 'failed' if project.total_files and project.failed_files == project.total_files else 'completed'
+    project.processed_at = timezone.now()
+    project.save()
+    
+    logger.info(f"Project {project.id} analysis completed with score {project.overall_score}")
+
+def calculate_user_stats(user_ids):
+    """Recompute stats from scratch for the given users"""
+    from django.db.models import Count, Max, Sum
+    
+    rows = CodeSubmission.objects.filter(
+        user_id__in=user_ids,
+        status='completed',
+        result__isnull=False
+    ).values('user_id').annotate(
+        total_submissions=Count('id'),
+        score_sum=Sum('result__overall_score'),
+        total_issues_found=Sum('result__total_issues'),
+        last_submission=Max('submitted_at')
+    )
+    
+    stats = {
+        user_id: {
+            'total_submissions': 0,
+            'score_sum': 0.0,
+            'total_issues_found': 0,
+            'average_score': 0.0,
+            'last_submission': None
+        }
+        for user_id in user_ids
+    }
+    for row in rows:
+        user_stats = stats[row.pop('user_id')]
+        user_stats.update(row)
+        user_stats['average_score'] = row['score_sum'] / row['total_submissions']
+    return stats
+
+@shared_task
+def update_user_stats(user_id):
+    """Recompute one user's statistics, replacing the running totals"""
+    from django.contrib.auth import get_user_model
+    from .models import UserStats
+    
+    User = get_user_model()
+    
+    try:
+        user = User.objects.get(id=user_id)
+        stats_data = calculate_user_stats([user.id])[user.id]
+        UserStats.objects.update_or_create(user=user, defaults=stats_data)
         logger.info(f"Updated stats for user {user_id}")
         
     except User.DoesNotExist:
@@ -132,21 +756,113 @@ def update_user_stats(user_id):
         logger.error(f"Failed to update stats for user {user_id}: {str(exc)}")
 
 @shared_task
-def cleanup_old_submissions():
-    """Clean up old submissions and results"""
-    from datetime import timedelta
+def reconcile_user_stats(chunk_size=500):
+    """Periodic job correcting drift in the incrementally maintained stats"""
+    from django.contrib.auth import get_user_model
+    from .models import UserStats
+    
+    User = get_user_model()
+    last_id = None
+    checked = 0
+    corrected = 0
+    
+    while True:
+        users = User.objects.order_by('id')
+        if last_id is not None:
+            users = users.filter(id__gt=last_id)
+        user_ids = list(users.values_list('id', flat=True)[:chunk_size])
+        if not user_ids:
+            break
+        last_id = user_ids[-1]
+        
+        expected = calculate_user_stats(user_ids)
+        current = {
+            stats.user_id: stats
+            for stats in UserStats.objects.filter(user_id__in=user_ids)
+        }
+        
+        for user_id, stats_data in expected.items():
+            user_stats = current.get(user_id)
+            if user_stats is None and not stats_data['total_submissions']:
+                continue
+            checked += 1
+            
+            if user_stats is not None and all(
+                _stat_matches(getattr(user_stats, key), value)
+                for key, value in stats_data.items()
+            ):
+                continue
+            
+            UserStats.objects.update_or_create(user_id=user_id, defaults=stats_data)
+            corrected += 1
+    
+    logger.info(f"Reconciled stats for {checked} users, corrected {corrected}")
+    
+    return {'checked_users': checked, 'corrected_users': corrected}
+
+@shared_task
+def backfill_rollups(chunk_size=100):
+    """Rebuild the analytics rollups from the stored results
+    
+    Adds results saved before the rollups existed; running it again
+    corrects any drift.
+    """
+    from django.contrib.auth import get_user_model
+    
+    User = get_user_model()
+    recorder = get_rollup_recorder()
+    last_id = None
+    users = 0
+    rows = 0
+    
+    while True:
+        chunk = User.objects.order_by('id')
+        if last_id is not None:
+            chunk = chunk.filter(id__gt=last_id)
+        user_ids = list(chunk.values_list('id', flat=True)[:chunk_size])
+        if not user_ids:
+            break
+        last_id = user_ids[-1]
+        
+        rows += recorder.rebuild(user_ids)
+        users += len(user_ids)
+    
+    logger.info(f"Rebuilt {rows} rollup rows for {users} users")
     
-    cutoff_date = timezone.now() - timedelta(days=30)
+    return {'users': users, 'rollups': rows}
+
+def _stat_matches(current, expected):
+    if isinstance(expected, float):
+        return abs((current or 0.0) - expected) < 1e-6
+    return current == expected
+
+@shared_task
+def cleanup_old_submissions():
+    """Delete finished submissions past their retention period, in chunks"""
+    totals = get_retention_engine().run()
     
-    # Delete old submissions
-    old_submissions = CodeSubmission.objects.filter(
-        submitted_at__lt=cutoff_date,
-        status__in=['completed', 'failed']
+    logger.info(
+        f"Cleaned up {totals['submissions']} old submissions in {totals['chunks']} chunks"
+        + ('' if totals['finished'] else ', stopped at the time limit')
     )
     
-    count = old_submissions.count()
-    old_submissions.delete()
+    return {'cleaned_submissions': totals['submissions'], **totals}
+
+@shared_task
+def cleanup_temp_files(max_age=None):
+    """Remove analysis temp files left behind by killed workers"""
+    if max_age is None:
+        max_age = getattr(settings, 'REVIEW_TEMP_FILE_MAX_AGE', 3600)
     
-    logger.info(f"Cleaned up {count} old submissions")
+    removed = sweep_temp_files(get_temp_dir(), max_age)
+    logger.info(f"Removed {removed} stale analysis temp files")
     
-    return {'cleaned_submissions': count}
+    return {'removed_temp_files': removed}
+
+@worker_ready.connect
+def sweep_temp_files_on_startup(**kwargs):
+    """A restarted worker cleans up after its killed predecessor"""
+    try:
+        cleanup_temp_files()
+    except Exception as exc:
+        logger.warning(f"Temp file cleanup failed: {str(exc)}")
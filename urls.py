@@ -9,11 +9,25 @@ urlpatterns = [
     path('submissions/', views.CodeSubmissionListCreateView.as_view(), name='submissions'),
     path('submissions/<uuid:pk>/', views.CodeSubmissionDetailView.as_view(), name='submission_detail'),
     path('submissions/<uuid:pk>/status/', views.SubmissionStatusView.as_view(), name='submission_status'),
+    path('submissions/<uuid:pk>/issues/', views.SubmissionIssueListView.as_view(), name='submission_issues'),
+    path('submissions/<uuid:pk>/stream/', views.submission_stream_view, name='submission_stream'),
     path('submissions/<uuid:pk>/reanalyze/', views.reanalyze_submission_view, name='reanalyze_submission'),
     
+    # Projects
+    path('projects/', views.ProjectSubmissionListCreateView.as_view(), name='projects'),
+    path('projects/<uuid:pk>/', views.ProjectSubmissionDetailView.as_view(), name='project_detail'),
+    
     # Bulk operations
     path('bulk-upload/', views.bulk_upload_view, name='bulk_upload'),
+    path('batches/<uuid:pk>/', views.SubmissionBatchDetailView.as_view(), name='batch_detail'),
+    
+    # Analytics
+    path('analytics/trends/', views.analytics_trends_view, name='analytics_trends'),
+    path('analytics/languages/', views.analytics_languages_view, name='analytics_languages'),
+    path('analytics/rules/', views.analytics_rules_view, name='analytics_rules'),
     
     # Health check
     path('health/', views.health_check_view, name='health_check'),
+    path('queues/', views.queue_stats_view, name='queue_stats'),
+    path('metrics/', views.metrics_view, name='metrics'),
 ]
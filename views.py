@@ -1,16 +1,39 @@
 from rest_framework import generics, status, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.response import Response
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.db.models import Q
-from .models import CodeSubmission, SupportedLanguage, ReviewResult
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from .models import CodeSubmission, SupportedLanguage, ReviewResult, Issue, SubmissionBatch, ProjectSubmission
 from .serializers import (
     CodeSubmissionSerializer,
+    CodeSubmissionSummarySerializer,
+    IssueSerializer,
     SupportedLanguageSerializer,
     BulkSubmissionSerializer,
+    SubmissionBatchSerializer,
+    ProjectSubmissionSerializer,
     SubmissionStatusSerializer
 )
-from .tasks import analyze_code_submission
+from .ingestion import BulkUpload, ProjectUpload, IngestionError
+from .tasks import invalidate_responses, reset_events
+from .scheduling import get_scheduler, schedule_submission
+from .response_cache import get_response_cache, payload_etag
+from .result_cache import get_result_cache
+from .events import get_event_log
+from .metrics import get_metrics
+from .rollups import get_rollup_recorder, language_totals, period_start, score_trend, top_rules
+from .rules import get_rule_catalog
+from .renderers import EventStreamRenderer, NDJSONRenderer, PrometheusRenderer
+from datetime import timedelta
+import time
 import uuid
 
 class SupportedLanguageListView(generics.ListAPIView):
@@ -21,11 +44,18 @@ class SupportedLanguageListView(generics.ListAPIView):
 
 class CodeSubmissionListCreateView(generics.ListCreateAPIView):
     """List user's submissions and create new submissions"""
-    serializer_class = CodeSubmissionSerializer
     permission_classes = [permissions.IsAuthenticated]
     
+    def get_serializer_class(self):
+        # Listings are summaries; code and issues are served per submission
+        if self.request.method == 'GET':
+            return CodeSubmissionSummarySerializer
+        return CodeSubmissionSerializer
+    
     def get_queryset(self):
-        queryset = CodeSubmission.objects.filter(user=self.request.user)
+        queryset = CodeSubmission.objects.filter(
+            user=self.request.user
+        ).select_related('language', 'result').defer('code_content')
         
         # Filter by status
         status_filter = self.request.query_params.get('status')
@@ -37,6 +67,16 @@ class CodeSubmissionListCreateView(generics.ListCreateAPIView):
         if language_filter:
             queryset = queryset.filter(language__name__icontains=language_filter)
         
+        # Filter by bulk upload batch
+        batch_filter = self.request.query_params.get('batch')
+        if batch_filter:
+            queryset = queryset.filter(batch_id=batch_filter)
+        
+        # Filter by project
+        project_filter = self.request.query_params.get('project')
+        if project_filter:
+            queryset = queryset.filter(project_id=project_filter)
+        
         # Search by filename
         search = self.request.query_params.get('search')
         if search:
@@ -46,64 +86,415 @@ class CodeSubmissionListCreateView(generics.ListCreateAPIView):
     
     def perform_create(self, serializer):
         submission = serializer.save()
-        # Queue analysis task
-        analyze_code_submission.delay(str(submission.id))
+        # Queue analysis task in the interactive lane
+        schedule_submission(submission, 'interactive')
+
+class CachedSubmissionMixin:
+    """Serves a submission's payload from the response cache, with ETags
+    
+    A poll of an unchanged submission costs cache reads and no query, and
+    clients that send the payload's ETag in If-None-Match get a 304. The
+    analysis tasks and reanalysis invalidate the payloads when the
+    submission changes.
+    """
+    # Name of the payload in the response cache
+    cache_view = None
+    
+    def retrieve(self, request, *args, **kwargs):
+        response_cache = get_response_cache()
+        submission_id = self.kwargs['pk']
+        entry, version = response_cache.get(submission_id, self.cache_view)
+        if entry is None or entry['user_id'] != request.user.id:
+            submission = self.get_object()
+            entry = response_cache.set(
+                submission_id,
+                self.cache_view,
+                version,
+                request.user.id,
+                self.get_serializer(submission).data,
+                final=submission.status in ('completed', 'failed')
+            )
+        return etag_response(request, entry['data'], etag=entry['etag'])
 
-class CodeSubmissionDetailView(generics.RetrieveAPIView):
+class CodeSubmissionDetailView(CachedSubmissionMixin, generics.RetrieveAPIView):
     """Retrieve specific submission with results"""
     serializer_class = CodeSubmissionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cache_view = 'detail'
     
     def get_queryset(self):
-        return CodeSubmission.objects.filter(user=self.request.user)
+        return CodeSubmission.objects.filter(user=self.request.user).select_related('language', 'result')
+
+class IssueCursorPagination(CursorPagination):
+    """Stable pages over a result's issues in source order"""
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = ('line_number', 'id')
+    
+    def paginate_positions(self, positions, request):
+        """Page over the issue positions of a packed result
+        
+        The blob never changes, so the cursor position is simply an index
+        into positions; links look like those of queryset pages.
+        """
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        
+        start = 0
+        if cursor is not None and cursor.position is not None:
+            try:
+                start = max(int(cursor.position), 0)
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+            if cursor.reverse:
+                start = max(start - page_size, 0)
+        end = start + page_size
+        
+        self.packed_links = (
+            self.encode_cursor(Cursor(offset=0, reverse=False, position=str(end))) if end < len(positions) else None,
+            self.encode_cursor(Cursor(offset=0, reverse=True, position=str(start))) if start > 0 else None,
+        )
+        return positions[start:end]
+    
+    def get_positions_response(self, data):
+        next_link, previous_link = self.packed_links
+        return Response({'next': next_link, 'previous': previous_link, 'results': data})
 
-class SubmissionStatusView(generics.RetrieveAPIView):
+class SubmissionIssueListView(generics.ListAPIView):
+    """List the issues of a submission, filtered by severity or rule"""
+    serializer_class = IssueSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = IssueCursorPagination
+    
+    def get_result(self):
+        """The submission's result, or None if it has none yet"""
+        if not hasattr(self, '_result'):
+            submission = get_object_or_404(
+                CodeSubmission.objects.select_related('result'),
+                id=self.kwargs['pk'],
+                user=self.request.user
+            )
+            try:
+                self._result = submission.result
+            except ReviewResult.DoesNotExist:
+                self._result = None
+        return self._result
+    
+    def get_queryset(self):
+        result = self.get_result()
+        if result is None:
+            return Issue.objects.none()
+        
+        # Filtering on the result id uses the (result, severity) index
+        queryset = Issue.objects.filter(result_id=result.id).select_related('rule')
+        
+        # Filter by severity, e.g. ?severity=error,critical
+        severity_filter = self.get_filter('severity')
+        if severity_filter:
+            queryset = queryset.filter(severity__in=severity_filter)
+        
+        # Filter by rule, e.g. ?rule_id=W0611
+        rule_filter = self.get_filter('rule_id')
+        if rule_filter:
+            queryset = queryset.filter(rule__rule_id__in=rule_filter)
+        
+        return queryset
+    
+    def get_filter(self, name):
+        value = self.request.query_params.get(name)
+        return value.split(',') if value else None
+    
+    def list(self, request, *args, **kwargs):
+        result = self.get_result()
+        if result is None or result.issue_storage != 'compact':
+            return super().list(request, *args, **kwargs)
+        
+        # Decode only the issues of the requested page
+        packed = result.compact_issues.unpack()
+        positions = packed.positions(severities=self.get_filter('severity'), rule_ids=self.get_filter('rule_id'))
+        page = self.paginator.paginate_positions(positions, request)
+        issues = packed.issues(page)
+        rules = get_rule_catalog().resolve(issues)
+        for position, issue, rule in zip(page, issues, rules):
+            # Stable ids for issues that have no row of their own
+            issue['id'] = uuid.uuid5(result.id, str(position))
+            issue['rule'] = rule
+        return self.paginator.get_positions_response(self.get_serializer(issues, many=True).data)
+
+class SubmissionStatusView(CachedSubmissionMixin, generics.RetrieveAPIView):
     """Get submission status without full details"""
     serializer_class = SubmissionStatusSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cache_view = 'status'
     
     def get_queryset(self):
         return CodeSubmission.objects.filter(user=self.request.user)
 
+def stored_result_events(submission):
+    """Events replaying the stored outcome of a finished analysis"""
+    batch_size = getattr(settings, 'REVIEW_EVENTS_BATCH_SIZE', 200)
+    try:
+        result = submission.result
+    except ReviewResult.DoesNotExist:
+        yield {'event': 'status', 'data': {'status': submission.status}}
+        return
+    
+    issues = result.get_issue_dicts()
+    for i in range(0, len(issues), batch_size):
+        yield {'event': 'issues', 'data': {'tool': 'stored', 'issues': issues[i:i + batch_size]}}
+    yield {'event': 'status', 'data': {
+        'status': submission.status,
+        'overall_score': result.overall_score,
+        'total_issues': result.total_issues
+    }}
+
+def is_final_event(event):
+    """Whether no further events will follow this one"""
+    if event['event'] != 'status':
+        return False
+    data = event['data']
+    return data['status'] == 'completed' or (data['status'] == 'failed' and not data.get('retrying'))
+
+def submission_event_stream(submission, renderer, after=0):
+    """Follow a submission's event log until its analysis finishes
+    
+    Finished submissions are replayed from the database. Otherwise the
+    current status is sent first, followed by the live events after the
+    given sequence number. If the log stays silent, the database is checked
+    in case the worker could not publish its final events.
+    
+    The stream polls the event log and holds its server worker for its
+    whole length, so it ends after REVIEW_STREAM_TIMEOUT seconds and clients
+    reconnect with the last event id; EventSource does this by itself.
+    Sync WSGI servers should keep the timeout short, or serve the stream
+    from gevent or an async worker to follow analyses for longer.
+    """
+    poll_interval = getattr(settings, 'REVIEW_STREAM_POLL_INTERVAL', 0.5)
+    keepalive_interval = getattr(settings, 'REVIEW_STREAM_KEEPALIVE', 15)
+    recheck_interval = getattr(settings, 'REVIEW_STREAM_RECHECK_INTERVAL', 10)
+    deadline = time.monotonic() + getattr(settings, 'REVIEW_STREAM_TIMEOUT', 25)
+    event_log = get_event_log()
+    
+    if submission.status == 'completed':
+        for event in stored_result_events(submission):
+            yield renderer.frame(event)
+        return
+    
+    yield renderer.frame({'event': 'status', 'data': {'status': submission.status}})
+    
+    last_sent = last_event = time.monotonic()
+    while time.monotonic() < deadline:
+        events, after = event_log.read(submission.id, after)
+        for event in events:
+            yield renderer.frame(event)
+            if is_final_event(event):
+                return
+        
+        now = time.monotonic()
+        if events:
+            last_sent = last_event = now
+        elif now - last_event >= recheck_interval:
+            last_event = now
+            submission.refresh_from_db(fields=['status'])
+            if submission.status == 'completed' or (submission.status == 'failed' and not after):
+                for event in stored_result_events(submission):
+                    yield renderer.frame(event)
+                return
+        
+        if now - last_sent >= keepalive_interval:
+            last_sent = now
+            yield renderer.keepalive()
+        time.sleep(poll_interval)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@renderer_classes([EventStreamRenderer, NDJSONRenderer])
+def submission_stream_view(request, pk):
+    """Stream status changes and issues of a submission as SSE or NDJSON"""
+    submission = get_object_or_404(
+        CodeSubmission.objects.select_related('result'),
+        id=pk,
+        user=request.user
+    )
+    
+    # Resume after the last event the client saw
+    last_event_id = request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id')
+    try:
+        after = max(int(last_event_id or 0), 0)
+    except ValueError:
+        after = 0
+    
+    renderer = request.accepted_renderer
+    response = StreamingHttpResponse(
+        submission_event_stream(submission, renderer, after),
+        content_type=f"{renderer.media_type}; charset={renderer.charset}"
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def bulk_upload_view(request):
-    """Handle bulk file uploads"""
-    serializer = BulkSubmissionSerializer(data=request.data)
-    serializer.is_valid(raise_exception=True)
+    """Handle bulk uploads of many files
+    
+    Accepts a JSON body {"files": [{filename, language, code_content}]},
+    multipart "files" fields or a zip/tar multipart "archive". Nothing is
+    stored unless every file is valid. Analysis runs in the background;
+    the response carries the batch to follow.
+    """
+    try:
+        # Adding raises as soon as a file count or size limit is exceeded
+        if 'archive' in request.FILES:
+            upload = BulkUpload('archive')
+            upload.add_archive(request.FILES['archive'])
+        elif 'files' in request.FILES:
+            upload = BulkUpload('multipart')
+            for uploaded_file in request.FILES.getlist('files'):
+                upload.add_uploaded_file(uploaded_file, request.data.get('language'))
+        else:
+            serializer = BulkSubmissionSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            upload = BulkUpload('json')
+            for file_data in serializer.validated_data['files']:
+                upload.add(file_data['filename'], file_data['code_content'], file_data['language'])
+        
+        batch = upload.save(request.user)
+    except IngestionError as e:
+        return Response({'errors': e.errors}, status=status.HTTP_400_BAD_REQUEST)
     
-    files_data = serializer.validated_data['files']
-    created_submissions = []
+    response_data = SubmissionBatchSerializer(batch).data
+    response_data['status_url'] = request.build_absolute_uri(
+        reverse('batch_detail', kwargs={'pk': batch.id})
+    )
+    return Response(response_data, status=status.HTTP_202_ACCEPTED)
+
+class SubmissionBatchDetailView(generics.RetrieveAPIView):
+    """Progress of a bulk upload"""
+    serializer_class = SubmissionBatchSerializer
+    permission_classes = [permissions.IsAuthenticated]
     
-    for file_data in files_data:
-        # Get or create language
-        try:
-            language = SupportedLanguage.objects.get(
-                name__iexact=file_data['language'],
-                is_active=True
-            )
-        except SupportedLanguage.DoesNotExist:
+    def get_queryset(self):
+        return SubmissionBatch.objects.filter(user=self.request.user)
+    
+    def retrieve(self, request, *args, **kwargs):
+        batch = self.get_object()
+        counts = batch.get_status_counts()
+        batch.update_status(counts)
+        
+        data = self.get_serializer(batch).data
+        data['counts'] = counts
+        return Response(data)
+
+class ProjectSubmissionListCreateView(generics.ListCreateAPIView):
+    """List user's projects and upload a source tree for project analysis"""
+    serializer_class = ProjectSubmissionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return ProjectSubmission.objects.filter(user=self.request.user).order_by('-submitted_at')
+    
+    def create(self, request, *args, **kwargs):
+        archive = request.FILES.get('archive')
+        if archive is None:
             return Response(
-                {'error': f"Unsupported language: {file_data['language']}"},
+                {'errors': ["A zip or tar 'archive' file is required"]},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Create submission
-        submission = CodeSubmission.objects.create(
-            user=request.user,
-            filename=file_data['filename'],
-            language=language,
-            code_content=file_data['code_content'],
-            file_size=len(file_data['code_content'].encode('utf-8'))
-        )
+        upload = ProjectUpload(request.data.get('name') or archive.name)
+        try:
+            upload.add_archive(archive)
+            project = upload.save(request.user)
+        except IngestionError as e:
+            return Response({'errors': e.errors}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Queue analysis
-        analyze_code_submission.delay(str(submission.id))
-        created_submissions.append(submission)
+        return Response(self.get_serializer(project).data, status=status.HTTP_202_ACCEPTED)
+
+class ProjectSubmissionDetailView(generics.RetrieveAPIView):
+    """Project status and totals; files are listed by submissions/?project=<id>"""
+    serializer_class = ProjectSubmissionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return ProjectSubmission.objects.filter(user=self.request.user)
+
+def etag_response(request, data, max_age=0, etag=None):
+    """Response with a strong ETag of its data, or 304 if the client has it
     
-    # Serialize response
-    serializer = CodeSubmissionSerializer(created_submissions, many=True)
-    return Response(serializer.data, status=status.HTTP_201_CREATED)
+    The payload is private to the user, so shared caches must not store it.
+    """
+    etag = etag or payload_etag(data)
+    response = get_conditional_response(request, etag=etag) or Response(data)
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=max_age)
+    patch_vary_headers(response, ['Authorization', 'Cookie'])
+    return response
+
+def analytics_window(request):
+    """(granularity, start of the first period) of an analytics request
+    
+    ?granularity=hour|day picks the rollups, ?days=N how far back to look.
+    """
+    granularity = request.query_params.get('granularity', 'day')
+    if granularity not in get_rollup_recorder().granularities:
+        raise ValidationError({'granularity': f"Unsupported granularity: {granularity}"})
+    
+    max_days = getattr(settings, 'REVIEW_ANALYTICS_MAX_DAYS', 365)
+    try:
+        days = int(request.query_params.get('days', 30))
+    except ValueError:
+        raise ValidationError({'days': "Must be a whole number of days"})
+    if not 1 <= days <= max_days:
+        raise ValidationError({'days': f"Must be between 1 and {max_days}"})
+    
+    return granularity, period_start(timezone.now() - timedelta(days=days), granularity)
+
+def analytics_response(request, data):
+    """Analytics payload, cacheable by the client for REVIEW_ANALYTICS_MAX_AGE seconds"""
+    return etag_response(request, data, max_age=getattr(settings, 'REVIEW_ANALYTICS_MAX_AGE', 60))
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def analytics_trends_view(request):
+    """Results, average score and issues by severity per hour or day"""
+    granularity, since = analytics_window(request)
+    language = request.query_params.get('language')
+    return analytics_response(request, {
+        'granularity': granularity,
+        'since': since.isoformat(),
+        'language': language,
+        'periods': score_trend(request.user.id, granularity, since, language)
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def analytics_languages_view(request):
+    """Results, average score and issues by severity per language"""
+    granularity, since = analytics_window(request)
+    return analytics_response(request, {
+        'since': since.isoformat(),
+        'languages': language_totals(request.user.id, granularity, since)
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def analytics_rules_view(request):
+    """Rules with the most issues, e.g. ?language=python&limit=10"""
+    granularity, since = analytics_window(request)
+    language = request.query_params.get('language')
+    try:
+        limit = min(max(int(request.query_params.get('limit', 10)), 1), 100)
+    except ValueError:
+        raise ValidationError({'limit': "Must be a whole number"})
+    return analytics_response(request, {
+        'since': since.isoformat(),
+        'language': language,
+        'rules': top_rules(request.user.id, granularity, since, language, limit)
+    })
 
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
@@ -150,6 +541,18 @@ def health_check_view(request):
         health_status['services']['celery'] = f'unhealthy: {str(e)}'
         health_status['status'] = 'unhealthy'
     
+    # Result cache counters
+    try:
+        health_status['result_cache'] = get_result_cache().stats()
+    except Exception as e:
+        health_status['result_cache'] = {'error': str(e)}
+    
+    # Queue depth and wait time per scheduling lane
+    try:
+        health_status['queues'] = get_scheduler().stats()
+    except Exception as e:
+        health_status['queues'] = {'error': str(e)}
+    
     status_code = status.HTTP_200_OK
     if health_status['status'] == 'unhealthy':
         status_code = status.HTTP_503_SERVICE_UNAVAILABLE
@@ -158,6 +561,35 @@ def health_check_view(request):
     
     return Response(health_status, status=status_code)
 
+class MetricsAccess(permissions.BasePermission):
+    """The REVIEW_METRICS_TOKEN bearer token if one is set, otherwise an admin user"""
+    
+    message = 'Invalid metrics token'
+    
+    def has_permission(self, request, view):
+        token = getattr(settings, 'REVIEW_METRICS_TOKEN', None)
+        if token:
+            return constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f"Bearer {token}")
+        # Same audience as the lane stats of queue_stats_view
+        return permissions.IsAdminUser().has_permission(request, view)
+
+@api_view(['GET'])
+@permission_classes([MetricsAccess])
+@renderer_classes([PrometheusRenderer])
+def metrics_view(request):
+    """Pipeline timing histograms and lane metrics for Prometheus
+    
+    When REVIEW_METRICS_TOKEN is set, scrapers must send it as a bearer
+    token; otherwise the metrics are served to admin users only.
+    """
+    return Response(get_metrics().render(), content_type=f"{PrometheusRenderer.media_type}; version=0.0.4")
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def queue_stats_view(request):
+    """Depth and wait-time metrics of the analysis lanes"""
+    return Response(get_scheduler().stats())
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def reanalyze_submission_view(request, pk):
@@ -177,8 +609,12 @@ def reanalyze_submission_view(request, pk):
     if hasattr(submission, 'result'):
         submission.result.delete()
     
-    # Queue new analysis
-    analyze_code_submission.delay(str(submission.id))
+    # Streams must not replay events of the previous analysis
+    reset_events(submission.id)
+    invalidate_responses([submission.id])
+    
+    # Queue a full (non-incremental) analysis
+    schedule_submission(submission, 'reanalyze', incremental=False)
     
     return Response({
         'message': 'Reanalysis queued',